@@ -0,0 +1,74 @@
+# /// script
+# requires-python = ">=3.12"
+# dependencies = [
+#     "beautifulsoup4",
+# ]
+# ///
+"""
+Compare the regex-based paper level parser with the former BeautifulSoup implementation on the recorded fixtures.
+
+Run from the repository root:
+    SETTINGS_PATH=settings.yaml python scripts/benchmark_paper_parser.py
+"""
+
+import re
+import sys
+import timeit
+from pathlib import Path
+
+import bs4
+
+# add parent dir to sys.path
+sys.path.append(str(Path(__file__).parents[1]))
+from src.modules.printing.tools.paper_status import parse_paper_percentage  # noqa: E402
+
+FIXTURES = Path(__file__).parents[1] / "tests" / "fixtures"
+
+
+def parse_paper_percentage_bs4(html: str) -> int | None:
+    soup = bs4.BeautifulSoup(html, "html.parser")
+    printer_input_tray = soup.find("font", string="printer-input-tray:")
+    if printer_input_tray:
+        previous_br = printer_input_tray.find_previous("br")
+        if previous_br is None:
+            return None
+        next_br = printer_input_tray.find_next("br")
+        if next_br is None:
+            return None
+
+        font_elements = []
+        for element in previous_br.find_all_next():
+            if element == next_br:
+                break
+            if isinstance(element, bs4.element.Tag) and element.name == "font":
+                font_elements.append(element)
+
+        for font in font_elements:
+            if "Cassette" in font.text:
+                level_match = re.search(r"level=(\d+)", font.text)
+                maxcapacity_match = re.search(r"maxcapacity=(\d+)", font.text)
+                if level_match and maxcapacity_match:
+                    level = int(level_match.group(1))
+                    maxcapacity = int(maxcapacity_match.group(1))
+                    if maxcapacity > 0:
+                        return int((level / maxcapacity) * 100)
+    return None
+
+
+def main(number: int = 200):
+    for fixture in sorted(FIXTURES.glob("printer_status_*.html")):
+        html = fixture.read_text()
+        expected = parse_paper_percentage_bs4(html)
+        actual = parse_paper_percentage(html)
+        assert actual == expected, f"{fixture.name}: {actual} != {expected}"
+
+        bs4_time = timeit.timeit(lambda: parse_paper_percentage_bs4(html), number=number) / number
+        regex_time = timeit.timeit(lambda: parse_paper_percentage(html), number=number) / number
+        print(
+            f"{fixture.name}: result={actual}, "
+            f"bs4={bs4_time * 1e6:.0f}us, regex={regex_time * 1e6:.0f}us, speedup={bs4_time / regex_time:.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
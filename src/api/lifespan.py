@@ -1,9 +1,7 @@
 __all__ = ["lifespan"]
 
 import asyncio
-import glob
 import json
-import os
 from contextlib import asynccontextmanager
 
 from beanie import init_beanie
@@ -50,11 +48,26 @@ async def lifespan(_app: FastAPI):
 
     await innohassle_accounts.update_key_set()
 
-    for rubbish in glob.glob("tmp/*"):
-        if "gitkeep" not in rubbish:
-            os.remove(rubbish)
+    from src.modules.tempfiles.repository import tempfile_repository  # noqa: E402
+    from src.modules.tempfiles.scheduler import expiry_scheduler  # noqa: E402
+
+    await tempfile_repository.restore()
+    tempfile_repository.start_sweeper(settings.api.tempfiles_sweep_interval)
+
+    from src.modules.printing.repository import printing_repository  # noqa: E402
+
+    printing_repository.start_status_poller()
+    printing_repository.start_job_events()
+
+    from src.modules.converting.repository import converting_repository  # noqa: E402
+
+    converting_repository.pool.start()
 
     yield
 
     # -- Application shutdown --
+    await printing_repository.close()
+    converting_repository.pool.close()
+    tempfile_repository.stop_sweeper()
+    await expiry_scheduler.stop()
     motor_client.close()
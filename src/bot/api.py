@@ -1,11 +1,22 @@
+import asyncio
 import io
+import os
+import pathlib
+from collections.abc import AsyncIterator
 
 import httpx
+from cachetools import LRUCache
 from pydantic import TypeAdapter
 
 from src.config import settings
 from src.config_schema import Printer, Scanner
-from src.modules.printing.entity_models import JobAttributes, PreparePrintingResponse, PrinterStatus, PrintingOptions
+from src.modules.printing.entity_models import (
+    JobAttributes,
+    PreparePrintingResponse,
+    PrinterStatus,
+    PrintingOptions,
+    PrintLayout,
+)
 from src.modules.scanning.entity_models import ScannerStatus, ScanningOptions, ScanningResult
 
 
@@ -14,6 +25,10 @@ class InNoHasslePrintAPI:
 
     def __init__(self, api_url):
         self.api_root_path = api_url
+        # Recently downloaded files with their ETags, revalidated with If-None-Match instead of downloading again
+        self._files: LRUCache[tuple[int, str, str], tuple[str, bytes]] = LRUCache(
+            maxsize=64 * 1024 * 1024, getsizeof=lambda item: len(item[1])
+        )
 
     def _create_client(self, telegram_id, timeout: float | None = 10) -> httpx.AsyncClient:
         client = httpx.AsyncClient(
@@ -23,14 +38,38 @@ class InNoHasslePrintAPI:
         )
         return client
 
+    async def _get_file(self, telegram_id: int, url: str, filename: str, timeout: float | None = 10) -> bytes:
+        key = (telegram_id, url, filename)
+        cached = self._files.get(key)
+        headers = {"If-None-Match": cached[0]} if cached is not None else {}
+        async with self._create_client(telegram_id, timeout) as client:
+            response = await client.get(url, params={"filename": filename}, headers=headers)
+            if cached is not None and response.status_code == 304:
+                return cached[1]
+            response.raise_for_status()
+            if "ETag" in response.headers:
+                self._files[key] = (response.headers["ETag"], response.content)
+            return response.content
+
     async def prepare_document(
         self, telegram_id: int, document_name: str, document: io.BytesIO
-    ) -> PreparePrintingResponse:
+    ) -> tuple[PreparePrintingResponse, bytes]:
+        """
+        Convert the document and get the converted PDF. The PDF comes in the same response, unless the bot can read it
+        from the temp directory of the API (see `shared_temp_dir`)
+        """
+        inline = settings.bot.shared_temp_dir is None
         files = {"file": (document_name, document, "application/octet-stream")}
         async with self._create_client(telegram_id, 60 * 5) as client:
-            response = await client.post("/print/prepare", files=files)
+            response = await client.post("/print/prepare", params={"inline": inline}, files=files)
             response.raise_for_status()
-            return PreparePrintingResponse.model_validate(response.json())
+            if inline:
+                result = PreparePrintingResponse(
+                    filename=response.headers["X-Filename"], pages=int(response.headers["X-Pages"])
+                )
+                return result, response.content
+            result = PreparePrintingResponse.model_validate(response.json())
+        return result, await self.get_prepared_document(telegram_id, result.filename)
 
     async def begin_job(
         self, telegram_id: int, filename: str, printer_cups_name: str, printing_options: PrintingOptions
@@ -44,6 +83,19 @@ class InNoHasslePrintAPI:
             response.raise_for_status()
             return response.json()
 
+    async def get_print_layout(
+        self, telegram_id: int, filename: str, printing_options: PrintingOptions
+    ) -> PrintLayout | None:
+        params = {"filename": filename}
+        data = {"printing_options": printing_options.model_dump(by_alias=True)}
+        try:
+            async with self._create_client(telegram_id) as client:
+                response = await client.post("/print/layout", params=params, json=data)
+                response.raise_for_status()
+                return PrintLayout.model_validate(response.json())
+        except httpx.HTTPError:
+            return None  # the caller estimates the layout itself then
+
     async def check_job(self, telegram_id: int, job_id: int) -> JobAttributes:
         params = {"job_id": job_id}
         async with self._create_client(telegram_id) as client:
@@ -51,6 +103,17 @@ class InNoHasslePrintAPI:
             response.raise_for_status()
             return JobAttributes.model_validate(response.json())
 
+    async def watch_job(self, telegram_id: int, job_id: int) -> AsyncIterator[JobAttributes]:
+        """Yields job attributes every time the job state changes, until the job is finished"""
+        params = {"job_id": job_id}
+        # The server sends a keep-alive comment at least every 15 seconds
+        async with self._create_client(telegram_id, 60) as client:
+            async with client.stream("GET", "/print/job_events", params=params) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line.startswith("data:"):
+                        yield JobAttributes.model_validate_json(line.removeprefix("data:"))
+
     async def cancel_job(self, telegram_id: int, job_id: int) -> None:
         params = {"job_id": job_id}
         async with self._create_client(telegram_id) as client:
@@ -64,11 +127,22 @@ class InNoHasslePrintAPI:
             response.raise_for_status()
 
     async def get_prepared_document(self, telegram_id: int, document_name: str) -> bytes:
-        params = {"filename": document_name}
-        async with self._create_client(telegram_id, 60 * 5) as client:
-            response = await client.get("/print/get_file", params=params)
-            response.raise_for_status()
-            return response.content
+        if settings.bot.shared_temp_dir is not None:
+            path = os.path.join(settings.bot.shared_temp_dir, os.path.basename(document_name))
+            try:
+                return await asyncio.to_thread(pathlib.Path(path).read_bytes)
+            except FileNotFoundError:
+                pass  # e.g. the volume is not shared after all, download it then
+        return await self._get_file(telegram_id, "/print/get_file", document_name, 60 * 5)
+
+    async def get_prepared_preview(self, telegram_id: int, document_name: str) -> bytes | None:
+        """
+        JPEG thumbnail of the first page, fits into 320×320 as Telegram requires for document thumbnails
+        """
+        try:
+            return await self._get_file(telegram_id, "/print/preview", document_name)
+        except httpx.HTTPError:
+            return None  # the preview is optional
 
     async def get_innohassle_user_id(self, telegram_id: int) -> str | None:
         async with self._create_client(telegram_id) as client:
@@ -167,11 +241,16 @@ class InNoHasslePrintAPI:
             return ScanningResult.model_validate(response.json())
 
     async def get_scanned_file(self, telegram_id: int, filename: str) -> bytes:
-        params = {"filename": filename}
-        async with self._create_client(telegram_id) as client:
-            response = await client.get("/scan/get_file", params=params)
-            response.raise_for_status()
-            return response.content
+        return await self._get_file(telegram_id, "/scan/get_file", filename)
+
+    async def get_scanned_preview(self, telegram_id: int, filename: str) -> bytes | None:
+        """
+        JPEG thumbnail of the last scanned page, fits into 320×320 as Telegram requires for document thumbnails
+        """
+        try:
+            return await self._get_file(telegram_id, "/scan/preview", filename)
+        except httpx.HTTPError:
+            return None  # the preview is optional
 
     async def delete_scanned_file(self, telegram_id: int, filename: str) -> None:
         params = {"filename": filename}
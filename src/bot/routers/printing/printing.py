@@ -1,6 +1,5 @@
 import asyncio
 import io
-import time
 from typing import get_args
 
 import aiogram.exceptions
@@ -40,7 +39,7 @@ from src.bot.routers.printing.printing_tools import (
     retrieve_sent_file_properties,
 )
 from src.bot.routers.tools import cancel_expiring, ensure_same_structural_message, make_expiring
-from src.modules.printing.entity_models import JobStateEnum, PrintingOptions
+from src.modules.printing.entity_models import JobAttributes, PrintingOptions
 
 router = Router(name="printing")
 
@@ -69,19 +68,36 @@ async def document_handler(message: Message, state: FSMContext, bot: Bot):
 
     await ensure_same_structural_message(msg, "confirmation_message_id", state)
     await msg.edit_text("Converting document to PDF...")
+    # Conversion jobs of /print/prepare_async live in the memory of one API worker, so the synchronous endpoint is used
+    error_code, error = None, None
     try:
-        result = await api_client.prepare_document(message.chat.id, file_telegram_name, file)
+        result, document = await api_client.prepare_document(message.chat.id, file_telegram_name, file)
     except httpx.HTTPStatusError as e:
-        if e.response.status_code not in (400, 500):
+        if e.response.status_code not in (400, 413, 422, 500, 503, 504):
             raise
+        error_code, error = e.response.status_code, e.response.json()["detail"]
+    except httpx.TransportError as e:
+        logger.warning(f"Failed to prepare the document: {e!r}")
+        error_code, error = 503, "the server is unavailable"
+
+    if error_code == 413:
+        # The API states the limit, e.g. "File is larger than 20 MB"
+        await ensure_same_structural_message(msg, "confirmation_message_id", state)
+        await msg.edit_text(
+            f"Unfortunately, this file is too large to print:\n"
+            f"{html.bold(html.quote(error))}\n\n"
+            f"Please compress the file or split it into parts and try again."
+        )
+        return
+    if error_code is not None:
         await ensure_same_structural_message(msg, "confirmation_message_id", state)
         await msg.edit_text(
             f"Unfortunately, we cannot print this file yet\n"
-            f"because of {html.bold(html.quote(e.response.json()['detail']))}\n\n"
+            f"because of {html.bold(html.quote(error))}\n\n"
             f"Please, send a file of a supported type:\n"
             f"{html.blockquote('.doc\n.docx\n.png\n.txt\n.jpg\n.md\n.bmp\n.xlsx\n.xls\n.odt\n.ods')}\n"
             f"or convert the file to PDF manually and try again."
-            if e.response.status_code == 400
+            if error_code == 400
             else "An error occurred while converting the file.\n"
             "The file may be corrupted or too large,"
             " or the server may be overloaded.\n"
@@ -106,13 +122,14 @@ async def document_handler(message: Message, state: FSMContext, bot: Bot):
         await start_printer_setup(message, state, bot)
 
     # Attach document to the message
-    document = await api_client.get_prepared_document(message.chat.id, data["filename"])
+    preview = await api_client.get_prepared_preview(message.chat.id, data["filename"])
     input_file = BufferedInputFile(document, filename=file_telegram_name[: file_telegram_name.rfind(".")] + ".pdf")
+    thumbnail = BufferedInputFile(preview, filename="preview.jpg") if preview else None
     caption, markup = format_configure_message(data, printer_status)
     await ensure_same_structural_message(msg, "confirmation_message_id", state)
     try:
         msg = await msg.edit_media(
-            aiogram.types.InputMediaDocument(media=input_file, caption=caption),
+            aiogram.types.InputMediaDocument(media=input_file, caption=caption, thumbnail=thumbnail),
             reply_markup=markup if data.get("printer") is not None else None,
         )
     except Exception as e:
@@ -176,6 +193,19 @@ async def start_print_handler(callback: CallbackQuery, state: FSMContext, bot: B
     printing_options.page_ranges = data["page_ranges"]
     printing_options.number_up = data["number_up"]
 
+    # The file may be removed once it is printed, so ask for the exact number of papers beforehand
+    layout = await api_client.get_print_layout(callback.message.chat.id, data["filename"], printing_options)
+    if layout is not None:
+        papers = layout.sheets
+    else:
+        papers = count_of_papers_to_print(
+            pages=data["pages"],
+            page_ranges=data["page_ranges"],
+            number_up=data["number_up"],
+            sides=data["sides"],
+            copies=data["copies"],
+        )
+
     # Start the print job
     job_id = await api_client.begin_job(
         callback.message.chat.id,
@@ -199,62 +229,69 @@ async def start_print_handler(callback: CallbackQuery, state: FSMContext, bot: B
 
     # Calculate maximum wait time
     max_sec_per_paper = 60
-    max_wait_time = max_sec_per_paper * count_of_papers_to_print(
-        pages=data["pages"],
-        page_ranges=data["page_ranges"],
-        number_up=data["number_up"],
-        sides=data["sides"],
-        copies=data["copies"],
-    )
+    max_wait_time = max_sec_per_paper * papers
+
+    # Status monitoring: the API pushes job attributes every time the job state changes
+    latest_attributes: JobAttributes | None = None
+    job_changed = asyncio.Event()
+
+    async def watch_job():
+        nonlocal latest_attributes
+        while True:
+            try:
+                async for job_attributes in api_client.watch_job(callback.message.chat.id, job_id):
+                    latest_attributes = job_attributes
+                    job_changed.set()
+                    if job_attributes.job_state.is_terminal:
+                        return
+            except httpx.HTTPError as e:
+                logger.warning(f"Failed to watch job {job_id}: {e}")
+            await asyncio.sleep(1)
 
-    # Status monitoring loop
+    watcher = asyncio.create_task(watch_job())
     iteration = 0
-    start_time = time.monotonic()
-
-    while time.monotonic() - start_time < max_wait_time:
-        iteration += 1
-
-        # Return if the job was changed (user sent a new document or /scan)
-        await ensure_same_structural_message(callback.message, "confirmation_message_id", state)
-        # Exit if state changed (user clicked cancel)
-        if (await state.get_state()) == default_state:
-            break
-
-        # Get job attributes
-        try:
-            job_attributes = await api_client.check_job(callback.message.chat.id, job_id)
-        except httpx.HTTPStatusError as e:
-            logger.warning(f"Failed to get job attributes for job {job_id}: {e}")
-            await asyncio.sleep(1)
-            continue
-
-        # Update the message
-        caption = format_printing_message(data, printer, job_attributes, iteration)
-        is_job_finished = job_attributes.job_state in [
-            JobStateEnum.completed,
-            JobStateEnum.canceled,
-            JobStateEnum.aborted,
-        ]
-        await callback.message.edit_caption(
-            caption=caption, reply_markup=cancel_keyboard if not is_job_finished else None
-        )
 
-        # Handle ended job
-        if is_job_finished:
-            if (await state.get_state()) == PrintWork.printing:
-                await shared_messages.go_to_default_state(callback, state)
-            break
+    try:
+        async with asyncio.timeout(max_wait_time):
+            while True:
+                # Wake up on job events, and at least every second to notice a cancellation and move the throbber
+                try:
+                    await asyncio.wait_for(job_changed.wait(), 1)
+                except TimeoutError:
+                    pass
+                job_changed.clear()
+                iteration += 1
+
+                # Return if the job was changed (user sent a new document or /scan)
+                await ensure_same_structural_message(callback.message, "confirmation_message_id", state)
+                # Exit if state changed (user clicked cancel)
+                if (await state.get_state()) == default_state:
+                    break
+                if latest_attributes is None:
+                    continue
+
+                # Update the message
+                caption = format_printing_message(data, printer, latest_attributes, iteration)
+                is_job_finished = latest_attributes.job_state.is_terminal
+                await callback.message.edit_caption(
+                    caption=caption, reply_markup=cancel_keyboard if not is_job_finished else None
+                )
 
-        # Sleep for one second before next check
-        await asyncio.sleep(1)
+                # Handle ended job
+                if is_job_finished:
+                    if (await state.get_state()) == PrintWork.printing:
+                        await shared_messages.go_to_default_state(callback, state)
+                    break
 
     # Handle timeout case
-    else:
+    except TimeoutError:
         await api_client.cancel_job(callback.message.chat.id, job_id)
         job_attributes = await api_client.check_job(callback.message.chat.id, job_id)
         caption = format_printing_message(data, printer, job_attributes, timed_out=True)
         await shared_messages.go_to_default_state(callback, state)
         await callback.message.edit_caption(caption=caption)
+    finally:
+        watcher.cancel()
 
 
 @router.callback_query(
@@ -166,6 +166,8 @@ def format_printing_message(
             throbber = "✅ Completed"
         else:
             assert_never(job_attributes.job_state)
+        if job_attributes.upload_progress is not None and not job_attributes.job_state.is_terminal:
+            throbber = "⤹⤿⤻⤺"[iteration % 4] + f" Sending to the printer: {job_attributes.upload_progress:.0%}"
     else:
         throbber = ""
     caption += f"{throbber}\n"
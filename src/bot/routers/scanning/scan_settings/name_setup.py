@@ -1,3 +1,5 @@
+import asyncio
+
 from aiogram import Bot, F, Router, html
 from aiogram.fsm.context import FSMContext
 from aiogram.types import BufferedInputFile, CallbackQuery, InputMediaDocument, Message
@@ -57,14 +59,18 @@ async def apply_settings_name(message: Message, state: FSMContext, bot: Bot):
     assert "confirmation_message_id" in data
     assert "scan_server_name" in data
 
-    file = await api_client.get_scanned_file(message.chat.id, data["scan_server_name"])
+    file, preview = await asyncio.gather(
+        api_client.get_scanned_file(message.chat.id, data["scan_server_name"]),
+        api_client.get_scanned_preview(message.chat.id, data["scan_server_name"]),
+    )
     input_file = BufferedInputFile(file, filename=new_scan_name)
+    thumbnail = BufferedInputFile(preview, filename="preview.jpg") if preview else None
     scanner_status = await api_client.get_scanner_status(message.chat.id, data.get("scanner"))
     text, markup = format_scanning_paused_message(data, scanner_status)
 
     await state.set_state(ScanWork.pause_menu)
     await bot.edit_message_media(
-        media=InputMediaDocument(media=input_file, caption=text),
+        media=InputMediaDocument(media=input_file, caption=text, thumbnail=thumbnail),
         chat_id=message.chat.id,
         message_id=data["confirmation_message_id"],
         reply_markup=markup,
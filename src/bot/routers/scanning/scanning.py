@@ -185,12 +185,18 @@ async def continue_scan_handler(callback: CallbackQuery, state: FSMContext, pret
     )
 
     # update the confirmation message
-    file = await api_client.get_scanned_file(message.chat.id, scanning_result.filename)
+    file, preview = await asyncio.gather(
+        api_client.get_scanned_file(message.chat.id, scanning_result.filename),
+        api_client.get_scanned_preview(message.chat.id, scanning_result.filename),
+    )
     display_filename = data.get("scan_name") or "scan.pdf"
     input_file = BufferedInputFile(file, filename=display_filename)
+    thumbnail = BufferedInputFile(preview, filename="preview.jpg") if preview else None
     text, markup = format_scanning_paused_message(data, scanner_status)
     await make_expiring(message)
-    await message.edit_media(media=InputMediaDocument(media=input_file, caption=text), reply_markup=markup)
+    await message.edit_media(
+        media=InputMediaDocument(media=input_file, caption=text, thumbnail=thumbnail), reply_markup=markup
+    )
     await state.set_state(ScanWork.pause_menu)
 
 
@@ -231,13 +237,19 @@ async def scanning_paused_remove_last_handler(
     assert "confirmation_message_id" in data
 
     # Send file
-    file = await api_client.get_scanned_file(callback.message.chat.id, scanning_result.filename)
+    file, preview = await asyncio.gather(
+        api_client.get_scanned_file(callback.message.chat.id, scanning_result.filename),
+        api_client.get_scanned_preview(callback.message.chat.id, scanning_result.filename),
+    )
     display_filename = data.get("scan_name") or "scan.pdf"
     input_file = BufferedInputFile(file, filename=display_filename)
+    thumbnail = BufferedInputFile(preview, filename="preview.jpg") if preview else None
     scanner_status = await api_client.get_scanner_status(callback.message.chat.id, data.get("scanner"))
     text, markup = format_scanning_paused_message(data, scanner_status)
     await make_expiring(callback.message)
-    await callback.message.edit_media(media=InputMediaDocument(media=input_file, caption=text), reply_markup=markup)
+    await callback.message.edit_media(
+        media=InputMediaDocument(media=input_file, caption=text, thumbnail=thumbnail), reply_markup=markup
+    )
     await state.set_state(ScanWork.pause_menu)
 
 
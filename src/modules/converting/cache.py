@@ -0,0 +1,94 @@
+__all__ = ["ConversionCache"]
+
+import os
+import shutil
+import threading
+from pathlib import Path
+
+from src.api.logging_ import logger
+from src.modules.documents.entity_models import DocumentMetadata
+
+
+def _link_or_copy(src: Path, dst: Path):
+    """
+    Put a hard link to `src` at `dst` atomically, copying if hard links are not possible
+    """
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        os.link(src, tmp)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        # e.g. the files are on different filesystems
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+class ConversionCache:
+    """
+    Content-addressed cache of converted PDFs on disk, shared by all workers.
+
+    Entries are keyed by SHA-256 of the input file and its extension, or another suffix for documents derived from
+    PDFs (see `Prepress`). Every entry is a PDF and a JSON file with its
+    metadata. Modification time of the PDF is bumped on every hit, and the least recently used entries are evicted
+    when the total size of the PDFs exceeds `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def _paths(self, sha256: str, ext: str) -> tuple[Path, Path]:
+        stem = f"{sha256}{ext}"
+        return self.directory / f"{stem}.pdf", self.directory / f"{stem}.json"
+
+    def get(self, sha256: str, ext: str, outpath: str) -> DocumentMetadata | None:
+        """
+        Put the cached PDF at `outpath` and return its metadata, or return None if the input is not cached
+        """
+        pdf_path, metadata_path = self._paths(sha256, ext)
+        try:
+            metadata = DocumentMetadata.model_validate_json(metadata_path.read_bytes())
+            _link_or_copy(pdf_path, Path(outpath))
+            os.utime(pdf_path)
+        except FileNotFoundError:
+            return None  # not cached, or evicted by another worker just now
+        except ValueError as e:
+            logger.warning(f"Broken conversion cache entry {metadata_path}: {e}")
+            return None
+        return metadata
+
+    def put(self, sha256: str, ext: str, pdf: str, metadata: DocumentMetadata):
+        """
+        Store the converted PDF, then evict old entries if the cache is over budget
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        pdf_path, metadata_path = self._paths(sha256, ext)
+        # Metadata first, so that an entry with a PDF always has metadata
+        tmp = metadata_path.with_name(f".{metadata_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(metadata.model_dump_json())
+        os.replace(tmp, metadata_path)
+        _link_or_copy(Path(pdf), pdf_path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for pdf_path in self.directory.glob("*.pdf"):
+            try:
+                stat = pdf_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, pdf_path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, pdf_path in entries:
+            if total <= self.max_bytes:
+                break
+            pdf_path.unlink(missing_ok=True)
+            pdf_path.with_suffix(".json").unlink(missing_ok=True)
+            total -= size
+        logger.info(f"Conversion cache is evicted down to {total} bytes")
@@ -0,0 +1,16 @@
+from src.pydantic_base import BaseSchema
+
+
+class ConversionMetrics(BaseSchema):
+    count: int = 0
+    "Number of conversions, including cache hits"
+    cache_hits: int = 0
+    "Number of conversions served from the conversion cache"
+    errors: int = 0
+    "Number of conversions which have failed, including timeouts"
+    timeouts: int = 0
+    "Number of conversions which did not finish in time"
+    total_ms: float = 0
+    "Total time spent in conversions, in milliseconds"
+    max_ms: float = 0
+    "The longest conversion, in milliseconds"
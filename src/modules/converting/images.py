@@ -0,0 +1,44 @@
+__all__ = ["IMAGE_EXTENSIONS", "image_to_pdf"]
+
+import pymupdf
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".bmp")
+
+A4 = pymupdf.paper_rect("a4")
+MARGIN = 20
+"Margin in points around the image, printers cannot print at the very edge of the sheet anyway"
+
+
+def image_to_pdf(inpath: str, outpath: str, max_dpi: int = 0):
+    """
+    Put the image on a single A4 page, scaled to fit the page with the aspect ratio kept. The page is landscape
+    if the image is wider than tall. EXIF orientation is applied by MuPDF when the image is opened.
+
+    :param max_dpi: downsample the image if its resolution on the page is higher, 0 keeps the original image
+    """
+    with pymupdf.open(inpath) as image:
+        # The page of an image document has the image in its original orientation, in points at the image DPI
+        src_rect = image[0].rect
+        page_rect = A4 if src_rect.height >= src_rect.width else pymupdf.Rect(0, 0, A4.height, A4.width)
+        area = page_rect + (MARGIN, MARGIN, -MARGIN, -MARGIN)
+        scale = min(area.width / src_rect.width, area.height / src_rect.height)
+        width, height = src_rect.width * scale, src_rect.height * scale
+        x0, y0 = (page_rect.width - width) / 2, (page_rect.height - height) / 2  # center on the page
+        target = pymupdf.Rect(x0, y0, x0 + width, y0 + height)
+
+        with pymupdf.open() as pdf:
+            page = pdf.new_page(width=page_rect.width, height=page_rect.height)
+            info = image[0].get_image_info()[0]
+            # Pixel dimensions are before the orientation is applied, the longer side stays the longer one though
+            dpi = max(info["width"], info["height"]) / (max(target.width, target.height) / 72)
+            if max_dpi and dpi > max_dpi:
+                # Render the oriented image at the required resolution, a photo does not need 600 DPI on paper
+                zoom = max_dpi / 72 * target.width / src_rect.width
+                small = image[0].get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+                stream = small.tobytes("jpg", jpg_quality=90) if inpath.lower().endswith(".jpg") else small.tobytes()
+                page.insert_image(target, stream=stream)
+            else:
+                # Keep the original image data, MuPDF wraps it without recompressing when possible
+                with pymupdf.open("pdf", image.convert_to_pdf()) as wrapped:
+                    page.show_pdf_page(target, wrapped, 0)
+            pdf.save(outpath, garbage=3, deflate=True)
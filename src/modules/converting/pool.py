@@ -0,0 +1,269 @@
+__all__ = ["ConversionTimeoutError", "ConverterPool", "ConverterPoolSaturatedError", "UnoserverEndpoint"]
+
+import asyncio
+import math
+import os
+import threading
+import time
+import xmlrpc.client
+from concurrent.futures import ThreadPoolExecutor
+
+import unoserver.client
+
+from src.api.logging_ import logger
+
+RECOVERY_INTERVAL = 5.0
+"Interval in seconds between pings of an unavailable instance when periodic health checks are disabled"
+
+
+class _TimeoutTransport(xmlrpc.client.Transport):
+    def __init__(self, timeout: float):
+        super().__init__()
+        self._timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self._timeout
+        return connection
+
+
+class ConverterPoolSaturatedError(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"All converters are busy, retry after {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class ConversionTimeoutError(Exception):
+    def __init__(self, timeout: float):
+        super().__init__(f"Conversion did not finish in {timeout} seconds")
+        self.timeout = timeout
+
+
+class UnoserverEndpoint:
+    def __init__(self, server: str, port: int):
+        self.server = server
+        self.port = port
+        self.client = unoserver.client.UnoClient(server, str(port), host_location="remote")
+        self.outstanding = 0
+        "Number of conversions sent to the instance and not finished yet"
+        self.healthy = True
+        self.quarantined_until = 0.0
+        "Monotonic time until which the instance gets no conversions, after a conversion on it has timed out"
+        self.abandoned = 0
+        "Number of timed out conversions which are still running on the instance"
+
+    def __repr__(self):
+        return f"unoserver {self.server}:{self.port}"
+
+    def ping(self, timeout: float):
+        with xmlrpc.client.ServerProxy(
+            f"http://{self.server}:{self.port}", transport=_TimeoutTransport(timeout), allow_none=True
+        ) as proxy:
+            proxy.info()
+
+
+class ConverterPool:
+    """
+    Spreads conversions over several unoserver instances.
+
+    Every conversion goes to the healthy instance with the fewest outstanding requests, each instance takes at most
+    `max_concurrency` conversions at a time (LibreOffice converts one document at a time anyway). Other requests wait
+    in a bounded queue for up to `max_wait` seconds, and `ConverterPoolSaturatedError` is raised when the queue is full
+    or the wait is over.
+
+    Idle instances are pinged in the background, the ones which do not answer within `health_check_timeout` are taken
+    out of rotation until they answer again. Busy instances are not pinged: unoserver serves one request at a time,
+    so the ping would wait for the conversion. An instance on which a conversion has timed out is quarantined until
+    LibreOffice actually finishes the conversion, but at most for `quarantine_time` seconds. The slot of the conversion
+    stays taken until it finishes anyway.
+    """
+
+    def __init__(
+        self,
+        endpoints: list[UnoserverEndpoint],
+        max_concurrency: int,
+        max_queue: int,
+        max_wait: float,
+        health_check_interval: float,
+        health_check_timeout: float,
+        quarantine_time: float = 0,
+    ):
+        self.endpoints = endpoints
+        self._max_concurrency = max_concurrency
+        self._max_queue = max_queue
+        self._max_wait = max_wait
+        self._health_check_interval = health_check_interval
+        self._health_check_timeout = health_check_timeout
+        self._quarantine_time = quarantine_time
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(endpoints) * max_concurrency, thread_name_prefix="unoserver"
+        )
+        self._slot_released = asyncio.Condition()
+        # Tickets of conversions waiting for a free instance, in order of arrival
+        self._queue: list[object] = []
+        # Moving average of conversion time, to estimate Retry-After
+        self._average_duration = 5.0
+        self._health_checker: asyncio.Task[None] | None = None
+        # Releases of slots held by abandoned conversions, and recoveries of unavailable instances
+        self._release_tasks: set[asyncio.Task] = set()
+
+    def start(self):
+        if self._health_checker is None and self._health_check_interval > 0:
+            self._health_checker = asyncio.create_task(self._check_health_forever())
+
+    def close(self):
+        if self._health_checker is not None:
+            self._health_checker.cancel()
+            self._health_checker = None
+        for task in self._release_tasks:
+            task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _retry_after(self) -> int:
+        capacity = max(1, sum(self._max_concurrency for endpoint in self.endpoints if endpoint.healthy))
+        return max(1, math.ceil(self._average_duration * (len(self._queue) + 1) / capacity))
+
+    def _pick_endpoint(self) -> UnoserverEndpoint | None:
+        now = time.monotonic()
+        available = [
+            e
+            for e in self.endpoints
+            if e.healthy and e.outstanding < self._max_concurrency and e.quarantined_until <= now
+        ]
+        return min(available, key=lambda e: e.outstanding, default=None)
+
+    def queue_position(self, ticket: object) -> int | None:
+        """
+        Returns the position of the conversion in the queue starting from 1, or None if it is not waiting
+        """
+        try:
+            return self._queue.index(ticket) + 1
+        except ValueError:
+            return None
+
+    async def _acquire(self, ticket: object) -> UnoserverEndpoint:
+        # A free slot goes to the queue first, so that requests are served in the order of arrival
+        if not self._queue:
+            endpoint = self._pick_endpoint()
+            if endpoint is not None:
+                endpoint.outstanding += 1
+                return endpoint
+
+        if len(self._queue) >= self._max_queue:
+            raise ConverterPoolSaturatedError(self._retry_after())
+        self._queue.append(ticket)
+        try:
+            async with asyncio.timeout(self._max_wait), self._slot_released:
+                while self._queue[0] is not ticket or (endpoint := self._pick_endpoint()) is None:
+                    await self._slot_released.wait()
+        except TimeoutError:
+            raise ConverterPoolSaturatedError(self._retry_after())
+        finally:
+            self._queue.remove(ticket)
+            if self._queue:
+                # The next request may take another free slot, or the slot this one has given up waiting for
+                self._notify_waiters()
+        endpoint.outstanding += 1
+        return endpoint
+
+    def _notify_waiters(self):
+        task = asyncio.create_task(self._notify_released())
+        self._release_tasks.add(task)
+        task.add_done_callback(self._release_tasks.discard)
+
+    async def _notify_released(self):
+        # Only the head of the queue may take the slot, so every waiter checks whether it is the one
+        async with self._slot_released:
+            self._slot_released.notify_all()
+
+    def _release_when_done(self, endpoint: UnoserverEndpoint, future: asyncio.Future, abandoned: threading.Event):
+        def release(_):
+            endpoint.outstanding -= 1
+            if abandoned.is_set():
+                endpoint.abandoned -= 1
+                if endpoint.abandoned == 0 and endpoint.quarantined_until > 0:
+                    logger.info(f"Abandoned conversion on {endpoint} has finished, ending the quarantine")
+                    endpoint.quarantined_until = 0.0
+            if not future.cancelled():
+                future.exception()  # retrieved by the caller, unless the conversion was abandoned
+            self._notify_waiters()
+
+        future.add_done_callback(release)
+
+    @staticmethod
+    def _convert_in_thread(endpoint: UnoserverEndpoint, inpath: str, outpath: str, abandoned: threading.Event):
+        endpoint.client.convert(inpath=inpath, outpath=outpath)
+        if abandoned.is_set():
+            # Nobody waits for the result anymore, do not leave it in the temp directory
+            try:
+                os.unlink(outpath)
+            except FileNotFoundError:
+                pass
+
+    async def convert(self, inpath: str, outpath: str, ticket: object | None = None, timeout: float | None = None):
+        """
+        Convert the file on the least loaded instance, in a worker thread
+
+        :param ticket: any object to identify the conversion in `queue_position`
+        :param timeout: deadline of the conversion in seconds, not counting the wait in the queue
+        :raises ConversionTimeoutError: if the conversion has not finished in `timeout` seconds, the instance is
+            quarantined then
+        """
+        endpoint = await self._acquire(ticket if ticket is not None else object())
+        abandoned = threading.Event()
+        loop = asyncio.get_running_loop()
+        t1 = time.monotonic()
+        future = loop.run_in_executor(self._executor, self._convert_in_thread, endpoint, inpath, outpath, abandoned)
+        # The worker thread cannot be interrupted, so the slot is released only when it returns
+        self._release_when_done(endpoint, future, abandoned)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+            self._average_duration = 0.8 * self._average_duration + 0.2 * (time.monotonic() - t1)
+        except TimeoutError:
+            abandoned.set()
+            endpoint.abandoned += 1
+            endpoint.quarantined_until = time.monotonic() + self._quarantine_time
+            logger.warning(
+                f"Conversion of {inpath} on {endpoint} has timed out after {timeout} seconds,"
+                f" quarantining the instance until it finishes, at most for {self._quarantine_time} seconds"
+            )
+            raise ConversionTimeoutError(timeout)
+        except asyncio.CancelledError:
+            abandoned.set()
+            endpoint.abandoned += 1
+            raise
+        except ConnectionError as e:
+            logger.warning(f"{endpoint} is unavailable, taking it out of rotation: {e!r}")
+            endpoint.healthy = False
+            if self._health_checker is None:
+                # Without periodic health checks nothing else would bring the instance back
+                task = asyncio.create_task(self._recover(endpoint))
+                self._release_tasks.add(task)
+                task.add_done_callback(self._release_tasks.discard)
+            raise
+
+    async def _check_health(self, endpoint: UnoserverEndpoint):
+        if endpoint.outstanding > 0:
+            return  # the ping would wait for the conversion, which is watched by its own deadline
+        try:
+            await asyncio.to_thread(endpoint.ping, self._health_check_timeout)
+        except (OSError, xmlrpc.client.Error) as e:
+            if endpoint.healthy:
+                logger.warning(f"{endpoint} does not respond, taking it out of rotation: {e!r}")
+            endpoint.healthy = False
+        else:
+            if not endpoint.healthy or 0 < endpoint.quarantined_until <= time.monotonic():
+                logger.info(f"{endpoint} is back in rotation")
+                endpoint.healthy = True
+                endpoint.quarantined_until = 0.0
+                await self._notify_released()
+
+    async def _recover(self, endpoint: UnoserverEndpoint):
+        while not endpoint.healthy:
+            await asyncio.sleep(RECOVERY_INTERVAL)
+            await self._check_health(endpoint)
+
+    async def _check_health_forever(self):
+        while True:
+            await asyncio.gather(*(self._check_health(endpoint) for endpoint in self.endpoints))
+            await asyncio.sleep(self._health_check_interval)
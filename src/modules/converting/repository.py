@@ -1,16 +1,164 @@
-__all__ = ["Converting", "converting_repository"]
+__all__ = ["ConversionFailedError", "Converting", "converting_repository"]
 
-import unoserver.client
+import asyncio
+import contextlib
+import os
+import time
+import xmlrpc.client
+from collections.abc import Callable, Iterator
 
+from src.api.logging_ import logger
 from src.config import settings
+from src.modules.converting.cache import ConversionCache
+from src.modules.converting.entity_models import ConversionMetrics
+from src.modules.converting.images import image_to_pdf
+from src.modules.converting.pool import ConversionTimeoutError, ConverterPool, UnoserverEndpoint
+from src.modules.converting.text import text_to_pdf
+from src.modules.documents.entity_models import DocumentMetadata
+from src.modules.documents.repository import DocumentReadError, documents_repository
+from src.modules.documents.workers import MuPDFError, WorkerCrashedError, WorkerPool
+
+
+class ConversionFailedError(Exception):
+    """
+    The document cannot be converted, e.g. it is corrupted
+    """
 
 
 class Converting:
-    def __init__(self, server: str, port: int):
-        self.client = unoserver.client.UnoClient(server, str(port), host_location="remote")
+    def __init__(
+        self,
+        pool: ConverterPool,
+        cache: ConversionCache | None,
+        image_max_dpi: int = 0,
+        text_monospace: bool = True,
+        timeout: float | None = None,
+        timeouts: dict[str, float] | None = None,
+        max_workers: int = 2,
+    ):
+        self.pool = pool
+        self.workers = WorkerPool(max_workers)
+        "Worker processes for conversions with MuPDF"
+        self.cache = cache
+        self.image_max_dpi = image_max_dpi
+        self.text_monospace = text_monospace
+        self.timeout = timeout
+        "Deadline in seconds of a conversion"
+        self.timeouts = timeouts or {}
+        "Deadlines for specific extensions, overriding `timeout`"
+        self.metrics: dict[str, ConversionMetrics] = {}
+        "Metrics of conversions by extension"
+
+    @contextlib.contextmanager
+    def _measure(self, ext: str) -> Iterator[ConversionMetrics]:
+        metrics = self.metrics.setdefault(ext, ConversionMetrics())
+        t1 = time.perf_counter()
+        try:
+            yield metrics
+        except ConversionTimeoutError:
+            metrics.errors += 1
+            metrics.timeouts += 1
+            raise
+        except (
+            xmlrpc.client.Fault,
+            DocumentReadError,
+            MuPDFError,
+            WorkerCrashedError,
+        ) as e:
+            metrics.errors += 1
+            logger.warning(f"Cannot convert a {ext} document: {e!r}")
+            raise ConversionFailedError(str(e)) from e
+        except Exception:
+            metrics.errors += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - t1) * 1000
+            metrics.count += 1
+            metrics.total_ms += elapsed_ms
+            metrics.max_ms = max(metrics.max_ms, elapsed_ms)
+
+    async def convert(
+        self, inpath: str, sha256: str, ext: str, outpath: str, ticket: object | None = None
+    ) -> DocumentMetadata:
+        """
+        Convert the file to PDF with unoserver, or take the PDF from the cache if the same content was converted before
+
+        :param ticket: identifies the conversion in `ConverterPool.queue_position`
+        :raises ConverterPoolSaturatedError: if all unoserver instances are busy for too long
+        :raises ConversionTimeoutError: if the conversion takes longer than the deadline for the extension
+        :raises ConversionFailedError: if unoserver cannot convert the document
+        """
+        with self._measure(ext) as metrics:
+            if self.cache is not None:
+                metadata = await asyncio.to_thread(self.cache.get, sha256, ext, outpath)
+                if metadata is not None:
+                    logger.info(f"Conversion cache hit for {sha256}{ext}")
+                    metrics.cache_hits += 1
+                    return metadata
+
+            await self.pool.convert(inpath, outpath, ticket, timeout=self.timeouts.get(ext, self.timeout))
+            metadata = await documents_repository.get_metadata(outpath)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, sha256, ext, outpath, metadata)
+        return metadata
+
+    async def _run_worker(self, ext: str, fn: Callable[..., None], *args):
+        timeout = self.timeouts.get(ext, self.timeout)
+        try:
+            await self.workers.run(fn, *args, timeout=timeout)
+        except TimeoutError:
+            raise ConversionTimeoutError(timeout)
+
+    async def convert_image(self, inpath: str, ext: str, outpath: str) -> DocumentMetadata:
+        """
+        Put the image on an A4 page in a worker process, without unoserver
+
+        :raises ConversionTimeoutError: if the conversion takes longer than the deadline for the extension
+        :raises ConversionFailedError: if the image is corrupted
+        """
+        with self._measure(ext):
+            await self._run_worker(ext, image_to_pdf, inpath, outpath, self.image_max_dpi)
+            return await documents_repository.get_metadata(outpath)
+
+    async def convert_text(self, inpath: str, ext: str, outpath: str) -> DocumentMetadata:
+        """
+        Typeset the plain text or Markdown file in a worker process, without unoserver. MuPDF holds the GIL while
+        laying out text, so a thread would block the event loop.
+
+        :raises ConversionTimeoutError: if the conversion takes longer than the deadline for the extension
+        :raises ConversionFailedError: if the file cannot be typeset
+        """
+        with self._measure(ext):
+            await self._run_worker(ext, text_to_pdf, inpath, outpath, ext, self.text_monospace)
+            return await documents_repository.get_metadata(outpath)
+
 
-    def any2pdf(self, inpath: str, outpath: str):
-        self.client.convert(inpath=inpath, outpath=outpath)
+def _unoserver_endpoints() -> list[UnoserverEndpoint]:
+    if settings.api.unoserver_servers is None:
+        return [UnoserverEndpoint(settings.api.unoserver_server, settings.api.unoserver_port)]
+    endpoints = []
+    for address in settings.api.unoserver_servers:
+        host, _, port = address.rpartition(":")
+        endpoints.append(UnoserverEndpoint(host, int(port)))
+    return endpoints
 
 
-converting_repository: Converting = Converting(settings.api.unoserver_server, settings.api.unoserver_port)
+converting_repository: Converting = Converting(
+    ConverterPool(
+        _unoserver_endpoints(),
+        max_concurrency=settings.api.unoserver_max_concurrency,
+        max_queue=settings.api.converter_max_queue,
+        max_wait=settings.api.converter_max_wait,
+        health_check_interval=settings.api.converter_health_check_interval,
+        health_check_timeout=settings.api.converter_health_check_timeout,
+        quarantine_time=settings.api.converter_quarantine_time,
+    ),
+    ConversionCache(os.path.join(settings.api.temp_dir, "conversion_cache"), settings.api.conversion_cache_max_bytes)
+    if settings.api.conversion_cache_max_bytes > 0
+    else None,
+    image_max_dpi=settings.api.image_max_dpi,
+    text_monospace=settings.api.text_monospace,
+    timeout=settings.api.conversion_timeout,
+    timeouts=settings.api.conversion_timeouts,
+    max_workers=settings.api.conversion_max_workers,
+)
@@ -0,0 +1,188 @@
+__all__ = ["TEXT_EXTENSIONS", "markdown_to_html", "text_to_pdf"]
+
+import html
+import re
+
+import pymupdf
+
+TEXT_EXTENSIONS = (".txt", ".md")
+
+A4 = pymupdf.paper_rect("a4")
+MARGIN = 50
+
+MAX_WORD_LENGTH = 80
+"Longer words are broken into lines of this length, MuPDF lays out an unbreakable word in quadratic time"
+
+CSS = """
+body { font-family: serif; font-size: 11pt; }
+pre, code { font-family: monospace; font-size: 10pt; }
+pre { white-space: pre-wrap; }
+pre.text { font-family: sans-serif; font-size: 11pt; }
+pre.monospace { font-family: monospace; font-size: 10pt; }
+blockquote { margin-left: 20pt; font-style: italic; }
+"""
+
+
+def _decode(data: bytes) -> str:
+    if data.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return data.decode("utf-16", errors="replace")
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        # Old Windows text files from Russian-speaking users
+        return data.decode("cp1251", errors="replace")
+
+
+_CODE_SPAN = re.compile(r"(`[^`]+`)")
+_IMAGE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_LINK = re.compile(r"\[([^\]]+)\]\(([^)\s]+)[^)]*\)")
+_BOLD = re.compile(r"\*\*(.+?)\*\*|__(.+?)__")
+_ITALIC = re.compile(r"(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])|(?<![\w_])_(?!\s)(.+?)(?<!\s)_(?![\w_])")
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_BULLET = re.compile(r"^\s*[-*+]\s+(.*)$")
+_NUMBERED = re.compile(r"^\s*\d+[.)]\s+(.*)$")
+_RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+
+
+_LONG_WORD = re.compile(rf"\S{{{MAX_WORD_LENGTH + 1},}}")
+_TAG = re.compile(r"(<[^>]*>)")
+# A character of HTML text, an entity counts as one
+_HTML_CHAR = re.compile(r"&#?\w+;|.", re.DOTALL)
+
+
+def _break_long_words(text: str) -> str:
+    def split(match: re.Match) -> str:
+        word = match[0]
+        return "\n".join(word[i : i + MAX_WORD_LENGTH] for i in range(0, len(word), MAX_WORD_LENGTH))
+
+    return _LONG_WORD.sub(split, text)
+
+
+def _break_long_words_in_html(markup: str) -> str:
+    """
+    Break long words in the text of the markup, leaving tags and their attributes (e.g. link URLs) as they are
+    """
+
+    def split(match: re.Match) -> str:
+        chars = _HTML_CHAR.findall(match[0])
+        return "\n".join("".join(chars[i : i + MAX_WORD_LENGTH]) for i in range(0, len(chars), MAX_WORD_LENGTH))
+
+    parts = _TAG.split(markup)
+    # Text and tags alternate, starting with text
+    parts[::2] = [_LONG_WORD.sub(split, text) for text in parts[::2]]
+    return "".join(parts)
+
+
+def _inline(text: str) -> str:
+    parts = _CODE_SPAN.split(text)
+    for i, part in enumerate(parts):
+        if i % 2:
+            parts[i] = f"<code>{html.escape(part[1:-1])}</code>"
+            continue
+        escaped = html.escape(part)
+        escaped = _IMAGE.sub(r"\1", escaped)
+        escaped = _LINK.sub(r'<a href="\2">\1</a>', escaped)
+        escaped = _BOLD.sub(lambda m: f"<b>{m[1] or m[2]}</b>", escaped)
+        parts[i] = _ITALIC.sub(lambda m: f"<i>{m[1] or m[2]}</i>", escaped)
+    return "".join(parts)
+
+
+def markdown_to_html(text: str) -> str:
+    """
+    Convert the common subset of Markdown to HTML: headings, paragraphs, lists, quotes, code blocks,
+    horizontal rules, emphasis, inline code and links. Everything else is kept as text.
+    """
+    blocks = []
+    paragraph: list[str] = []
+    list_tag = None
+    code: list[str] | None = None
+
+    def close_paragraph():
+        if paragraph:
+            blocks.append(f"<p>{_inline(' '.join(paragraph))}</p>")
+            paragraph.clear()
+
+    def close_list():
+        nonlocal list_tag
+        if list_tag is not None:
+            blocks.append(f"</{list_tag}>")
+            list_tag = None
+
+    for line in text.splitlines():
+        if code is not None:
+            if line.lstrip().startswith("```"):
+                blocks.append(f"<pre>{html.escape(chr(10).join(code))}</pre>")
+                code = None
+            else:
+                code.append(line)
+            continue
+        if line.lstrip().startswith("```"):
+            close_paragraph()
+            close_list()
+            code = []
+        elif not line.strip():
+            close_paragraph()
+            close_list()
+        elif match := _HEADING.match(line):
+            close_paragraph()
+            close_list()
+            level = len(match[1])
+            blocks.append(f"<h{level}>{_inline(match[2])}</h{level}>")
+        elif _RULE.match(line):
+            close_paragraph()
+            close_list()
+            blocks.append("<hr>")
+        elif (match := _BULLET.match(line)) or (match := _NUMBERED.match(line)):
+            close_paragraph()
+            tag = "ul" if match.re is _BULLET else "ol"
+            if list_tag != tag:
+                close_list()
+                blocks.append(f"<{tag}>")
+                list_tag = tag
+            blocks.append(f"<li>{_inline(match[1])}</li>")
+        elif line.startswith(">"):
+            close_paragraph()
+            close_list()
+            blocks.append(f"<blockquote>{_inline(line.lstrip('> '))}</blockquote>")
+        elif list_tag is not None and line.startswith((" ", "\t")):
+            # Continuation of the previous list item
+            blocks[-1] = blocks[-1].removesuffix("</li>") + f" {_inline(line.strip())}</li>"
+        else:
+            close_list()
+            paragraph.append(line.strip())
+
+    if code is not None:
+        blocks.append(f"<pre>{html.escape(chr(10).join(code))}</pre>")
+    close_paragraph()
+    close_list()
+    return "\n".join(blocks)
+
+
+def text_to_pdf(inpath: str, outpath: str, ext: str, monospace: bool = True):
+    """
+    Typeset a plain text or Markdown file on A4 pages with MuPDF.
+
+    Plain text keeps its line breaks and spaces, `monospace` chooses between a monospace font (for code, tables drawn
+    with spaces, etc.) and a proportional one. Lines longer than the page are wrapped, and words longer than
+    `MAX_WORD_LENGTH` are broken.
+    """
+    with open(inpath, "rb") as f:
+        text = _decode(f.read())
+    if ext == ".md":
+        # Only after inline Markdown is processed, so that link URLs stay whole
+        body = _break_long_words_in_html(markdown_to_html(text))
+    else:
+        css_class = "monospace" if monospace else "text"
+        body = f'<pre class="{css_class}">{html.escape(_break_long_words(text).expandtabs(4))}</pre>'
+
+    story = pymupdf.Story(html=body, user_css=CSS)
+    writer = pymupdf.DocumentWriter(outpath)
+    try:
+        more = True
+        while more:
+            device = writer.begin_page(A4)
+            more, _ = story.place(A4 + (MARGIN, MARGIN, -MARGIN, -MARGIN))
+            story.draw(device)
+            writer.end_page()
+    finally:
+        writer.close()
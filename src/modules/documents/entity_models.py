@@ -0,0 +1,14 @@
+from src.pydantic_base import BaseSchema
+
+
+class DocumentMetadata(BaseSchema):
+    sha256: str
+    "SHA-256 of the file content, hex encoded"
+    pages: int
+    "Number of pages"
+    page_sizes: list[tuple[float, float]]
+    "Width and height of every page in points (1/72 inch), empty if the document needs a password"
+    encrypted: bool
+    "Whether the document is encrypted"
+    needs_password: bool
+    "Whether the document cannot be opened without a password"
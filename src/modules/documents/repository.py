@@ -0,0 +1,109 @@
+__all__ = [
+    "DocumentReadError",
+    "DocumentsRepository",
+    "documents_repository",
+    "read_pdf_metadata",
+    "render_thumbnail",
+]
+
+import asyncio
+from collections.abc import Callable
+
+import pymupdf
+from cachetools import LRUCache
+
+from src.config import settings
+from src.modules.documents.entity_models import DocumentMetadata
+from src.modules.documents.workers import MuPDFError, WorkerCrashedError, WorkerPool
+from src.modules.tempfiles.repository import hash_file
+
+
+class DocumentReadError(Exception):
+    """
+    MuPDF cannot read the document, has crashed on it or has taken too long
+    """
+
+
+def read_pdf_metadata(path: str, sha256: str) -> DocumentMetadata:
+    """
+    Read metadata of a PDF with MuPDF, without parsing the content of the pages
+    """
+    with pymupdf.open(path, filetype="pdf") as doc:
+        page_sizes = [] if doc.needs_pass else [(page.rect.width, page.rect.height) for page in doc]
+        return DocumentMetadata(
+            sha256=sha256,
+            pages=doc.page_count,
+            page_sizes=page_sizes,
+            encrypted=doc.is_encrypted or doc.needs_pass,
+            needs_password=doc.needs_pass,
+        )
+
+
+def render_thumbnail(path: str, page: int, size: int) -> bytes:
+    """
+    Render the page as a JPEG which fits into `size`×`size` pixels
+
+    :param page: index of the page, negative to count from the end
+    :raises IndexError: if there is no such page
+    """
+    with pymupdf.open(path, filetype="pdf") as doc:
+        if not -doc.page_count <= page < doc.page_count:
+            raise IndexError(f"Page {page} is out of range")
+        pdf_page = doc[page]
+        zoom = size / max(pdf_page.rect.width, pdf_page.rect.height)
+        pixmap = pdf_page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+        return pixmap.tobytes("jpg", jpg_quality=80)
+
+
+class DocumentsRepository:
+    def __init__(self, max_workers: int = 2, timeout: float | None = None):
+        self.workers = WorkerPool(max_workers)
+        "Worker processes for MuPDF, which holds the GIL while loading pages and rendering"
+        self.timeout = timeout
+        "Deadline in seconds of a task in a worker"
+        # Metadata by SHA-256 of the content, the same files are uploaded over and over
+        self._metadata_cache: LRUCache[str, DocumentMetadata] = LRUCache(maxsize=1024)
+        # Thumbnails by SHA-256 of the content, page and size, limited by total size in bytes
+        self._thumbnail_cache: LRUCache[tuple[str, int, int], bytes] = LRUCache(maxsize=32 * 1024 * 1024, getsizeof=len)
+
+    async def get_metadata(self, path: str, sha256: str | None = None) -> DocumentMetadata:
+        """
+        Returns metadata of the PDF, reading it in a worker process. `sha256` is computed if not given.
+
+        :raises DocumentReadError: if the document cannot be read
+        """
+        if sha256 is None:
+            _, sha256 = await asyncio.to_thread(hash_file, path)
+        metadata = self._metadata_cache.get(sha256)
+        if metadata is None:
+            metadata = await self._run_worker(read_pdf_metadata, path, sha256)
+            self._metadata_cache[sha256] = metadata
+        return metadata
+
+    async def _run_worker[T](self, fn: Callable[..., T], *args) -> T:
+        try:
+            return await self.workers.run(fn, *args, timeout=self.timeout)
+        except TimeoutError:
+            raise DocumentReadError(f"{fn.__name__} has not finished in {self.timeout} seconds")
+        except (MuPDFError, WorkerCrashedError) as e:
+            raise DocumentReadError(f"{fn.__name__} has failed: {e}")
+
+    async def get_thumbnail(self, path: str, sha256: str, page: int = 0, size: int = 320) -> bytes:
+        """
+        Returns a JPEG thumbnail of the page, rendering it in a worker process
+
+        :param page: index of the page, negative to count from the end
+        :raises IndexError: if there is no such page
+        :raises DocumentReadError: if the page cannot be rendered
+        """
+        key = (sha256, page, size)
+        thumbnail = self._thumbnail_cache.get(key)
+        if thumbnail is None:
+            thumbnail = await self._run_worker(render_thumbnail, path, page, size)
+            self._thumbnail_cache[key] = thumbnail
+        return thumbnail
+
+
+documents_repository: DocumentsRepository = DocumentsRepository(
+    settings.api.documents_max_workers, timeout=settings.api.documents_timeout
+)
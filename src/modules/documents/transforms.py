@@ -0,0 +1,85 @@
+__all__ = ["NUMBER_UP_GRIDS", "extract_pages", "impose", "optimize"]
+
+import os
+import shutil
+
+import pymupdf
+
+A4 = pymupdf.paper_rect("a4")
+
+NUMBER_UP_GRIDS: dict[int, tuple[int, int]] = {1: (1, 1), 2: (2, 1), 4: (2, 2), 6: (3, 2), 9: (3, 3), 16: (4, 4)}
+"Columns and rows for every number-up, the same as in CUPS. The grid is transposed when it fits pages better"
+
+GAP = 4
+"Gap in points between pages on a sheet"
+
+
+def extract_pages(inpath: str, outpath: str, pages: list[int]):
+    """
+    Save a document with only the given pages (starting from 1) of the input. Fonts and images which are used
+    only on the other pages are dropped.
+    """
+    with pymupdf.open(inpath, filetype="pdf") as doc:
+        doc.select([page - 1 for page in pages])
+        doc.save(outpath, garbage=3, deflate=True)
+
+
+def _fill(sheet: pymupdf.Rect, columns: int, rows: int, page: pymupdf.Rect) -> float:
+    """
+    Share of the sheet covered by the pages when they are fitted into the cells of the grid
+    """
+    cell_width, cell_height = sheet.width / columns - GAP, sheet.height / rows - GAP
+    scale = min(cell_width / page.width, cell_height / page.height)
+    return columns * rows * page.width * page.height * scale**2 / (sheet.width * sheet.height)
+
+
+def _choose_layout(number_up: int, page: pymupdf.Rect) -> tuple[pymupdf.Rect, int, int]:
+    """
+    Returns the sheet and the grid in which pages of this shape are the largest, e.g. two landscape slides are
+    stacked on a portrait sheet, and two portrait pages are put side by side on a landscape sheet
+    """
+    columns, rows = NUMBER_UP_GRIDS[number_up]
+    layouts = [
+        (sheet, c, r)
+        for sheet in (A4, pymupdf.Rect(0, 0, A4.height, A4.width))
+        for c, r in ((columns, rows), (rows, columns))
+    ]
+    return max(layouts, key=lambda layout: _fill(*layout, page))
+
+
+def impose(inpath: str, outpath: str, pages: list[int], number_up: int):
+    """
+    Place the given pages (starting from 1) of the input on A4 sheets, `number_up` pages per sheet, left to right
+    and top to bottom. The orientation of the sheets and the grid are chosen by the shape of the first page, pages
+    keep their aspect ratio and are centered in their cells.
+    """
+    with pymupdf.open(inpath, filetype="pdf") as src, pymupdf.open() as doc:
+        sheet, columns, rows = _choose_layout(number_up, src[pages[0] - 1].rect)
+        cell_width, cell_height = sheet.width / columns, sheet.height / rows
+        for i, page in enumerate(pages):
+            if i % number_up == 0:
+                out_page = doc.new_page(width=sheet.width, height=sheet.height)
+            row, column = divmod(i % number_up, columns)
+            cell = pymupdf.Rect(
+                column * cell_width + GAP / 2,
+                row * cell_height + GAP / 2,
+                (column + 1) * cell_width - GAP / 2,
+                (row + 1) * cell_height - GAP / 2,
+            )
+            out_page.show_pdf_page(cell, src, page - 1)
+        doc.save(outpath, garbage=3, deflate=True)
+
+
+def optimize(inpath: str, outpath: str, max_dpi: int, quality: int = 85):
+    """
+    Save a lighter copy of the document for printing: images above `max_dpi` on the page are downsampled, images are
+    recompressed as JPEG with `quality` (bitonal ones with CCITT fax), fonts are subset to the used glyphs and unused
+    objects are dropped. If the result is not smaller, the input is copied as is.
+    """
+    with pymupdf.open(inpath, filetype="pdf") as doc:
+        # MuPDF halves images while they stay above the target, so they end up at `max_dpi` or a bit above it
+        doc.rewrite_images(dpi_threshold=max_dpi, dpi_target=max_dpi - 1, quality=quality)
+        doc.subset_fonts()
+        doc.save(outpath, garbage=4, deflate=True, use_objstms=True)
+    if os.path.getsize(outpath) >= os.path.getsize(inpath):
+        shutil.copyfile(inpath, outpath)
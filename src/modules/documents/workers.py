@@ -0,0 +1,94 @@
+__all__ = ["MuPDFError", "WorkerCrashedError", "WorkerPool"]
+
+import asyncio
+import multiprocessing
+import multiprocessing.connection
+from collections.abc import Callable
+from typing import Any
+
+import pymupdf
+
+
+class WorkerCrashedError(Exception):
+    """
+    The worker process has died without a result, e.g. MuPDF has crashed on a hostile document
+    """
+
+
+class MuPDFError(Exception):
+    """
+    MuPDF cannot process the document. MuPDF exceptions cannot be passed between processes, so they are replaced
+    with this one.
+    """
+
+
+def _run_in_child(connection: multiprocessing.connection.Connection, fn: Callable, args: tuple):
+    try:
+        result = ("ok", fn(*args))
+    except (pymupdf.FileDataError, pymupdf.mupdf.FzErrorBase) as e:
+        result = ("error", MuPDFError(str(e)))
+    except Exception as e:
+        result = ("error", e)
+    try:
+        connection.send(result)
+    except Exception as e:
+        # The exception may be not picklable
+        connection.send(("error", RuntimeError(repr(result[1]) if result[0] == "error" else repr(e))))
+    finally:
+        connection.close()
+
+
+class WorkerPool:
+    """
+    Runs CPU-bound MuPDF work in separate processes, so that it holds neither the GIL of the API process nor the event
+    loop. Every task gets its own process forked from a server process with MuPDF preloaded, so a task which exceeds
+    its deadline can be killed and a task which crashes its process does not affect the others.
+    """
+
+    def __init__(self, max_workers: int):
+        self._slots = asyncio.Semaphore(max_workers)
+        self._context = multiprocessing.get_context("forkserver")
+        self._context.set_forkserver_preload(["pymupdf"])
+
+    async def run(self, fn: Callable[..., Any], *args, timeout: float | None = None) -> Any:
+        """
+        Returns `fn(*args)`, which is called in a worker process. Both `fn` and the arguments should be picklable.
+
+        :param timeout: deadline in seconds, not counting the wait for a free worker
+        :raises TimeoutError: if the deadline is over, the worker is killed then
+        :raises MuPDFError: if MuPDF has raised an error in the worker
+        :raises WorkerCrashedError: if the worker has died without a result
+        """
+        async with self._slots:
+            receiver, sender = self._context.Pipe(duplex=False)
+            process = self._context.Process(target=_run_in_child, args=(sender, fn, args), daemon=True)
+            process.start()
+            sender.close()
+            try:
+                async with asyncio.timeout(timeout):
+                    await self._wait_readable(receiver)
+                try:
+                    status, value = receiver.recv()
+                except EOFError:
+                    await asyncio.to_thread(process.join)
+                    raise WorkerCrashedError(f"Worker process has exited with code {process.exitcode}")
+            finally:
+                if process.is_alive():
+                    process.kill()
+                await asyncio.to_thread(process.join)
+                process.close()
+                receiver.close()
+        if status == "error":
+            raise value
+        return value
+
+    @staticmethod
+    async def _wait_readable(connection: multiprocessing.connection.Connection):
+        # The pipe becomes readable when the result is sent, or at EOF when the process dies
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        loop.add_reader(connection.fileno(), lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            loop.remove_reader(connection.fileno())
@@ -0,0 +1,107 @@
+__all__ = ["ConversionJobs"]
+
+import asyncio
+import time
+import uuid
+from collections.abc import AsyncIterator, Awaitable, Callable
+from dataclasses import dataclass, field
+
+from cachetools import TTLCache
+from fastapi import HTTPException
+
+from src.api.logging_ import logger
+from src.modules.converting.pool import ConverterPool
+from src.modules.printing.entity_models import ConversionJob, ConversionJobStateEnum, PreparePrintingResponse
+
+
+@dataclass
+class _Job:
+    job_id: str
+    innohassle_user_id: str
+    task: asyncio.Task[PreparePrintingResponse] | None = None
+    ticket: object = field(default_factory=object)
+    "Identifies the job in the queue of the converter pool"
+
+
+class ConversionJobs:
+    """
+    Document preparations which run in the background, so that the client does not hold a request open
+    for the whole conversion.
+    """
+
+    def __init__(self, pool: ConverterPool, ttl: float):
+        self._pool = pool
+        self._jobs: TTLCache[str, _Job] = TTLCache(maxsize=10_000, ttl=ttl)
+
+    def submit(
+        self, innohassle_user_id: str, prepare: Callable[[object], Awaitable[PreparePrintingResponse]]
+    ) -> ConversionJob:
+        """
+        Start `prepare(ticket)` in the background, `ticket` should be passed to the converter pool
+        """
+        job = _Job(job_id=uuid.uuid4().hex, innohassle_user_id=innohassle_user_id)
+        job.task = asyncio.create_task(prepare(job.ticket))
+        job.task.add_done_callback(lambda task: self._log_failure(job, task))
+        self._jobs[job.job_id] = job
+        return self._describe(job)
+
+    def _log_failure(self, job: _Job, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            e = task.exception()
+            if not isinstance(e, HTTPException):
+                logger.error(f"Conversion job {job.job_id} has failed: {e!r}", exc_info=e)
+
+    def _describe(self, job: _Job) -> ConversionJob:
+        task = job.task
+        if task is None or not task.done():
+            position = self._pool.queue_position(job.ticket)
+            if position is not None:
+                return ConversionJob(job_id=job.job_id, state=ConversionJobStateEnum.queued, queue_position=position)
+            return ConversionJob(job_id=job.job_id, state=ConversionJobStateEnum.converting)
+        if task.cancelled():
+            return ConversionJob(
+                job_id=job.job_id, state=ConversionJobStateEnum.failed, error="Cancelled", error_code=500
+            )
+        e = task.exception()
+        if isinstance(e, HTTPException):
+            return ConversionJob(
+                job_id=job.job_id, state=ConversionJobStateEnum.failed, error=e.detail, error_code=e.status_code
+            )
+        if e is not None:
+            return ConversionJob(
+                job_id=job.job_id, state=ConversionJobStateEnum.failed, error="Conversion error", error_code=500
+            )
+        return ConversionJob(job_id=job.job_id, state=ConversionJobStateEnum.done, result=task.result())
+
+    def get(self, innohassle_user_id: str, job_id: str) -> ConversionJob | None:
+        job = self._jobs.get(job_id)
+        if job is None or job.innohassle_user_id != innohassle_user_id:
+            return None
+        return self._describe(job)
+
+    async def watch(
+        self, innohassle_user_id: str, job_id: str, poll_interval: float, heartbeat_interval: float
+    ) -> AsyncIterator[ConversionJob | None]:
+        """
+        Yields the job every time its state or queue position changes, and `None` if nothing has changed
+        for `heartbeat_interval` seconds. Ends when the job is done or failed.
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.innohassle_user_id != innohassle_user_id:
+            return
+        last_seen = None
+        last_yielded_at = time.monotonic()
+        while True:
+            described = self._describe(job)
+            seen = (described.state, described.queue_position)
+            if seen != last_seen:
+                last_seen = seen
+                last_yielded_at = time.monotonic()
+                yield described
+            elif time.monotonic() - last_yielded_at >= heartbeat_interval:
+                last_yielded_at = time.monotonic()
+                yield None
+            if described.state in (ConversionJobStateEnum.done, ConversionJobStateEnum.failed):
+                return
+            # Wake up as soon as the job finishes, or check the queue position from time to time
+            await asyncio.wait([job.task], timeout=poll_interval)
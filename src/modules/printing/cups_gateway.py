@@ -0,0 +1,133 @@
+__all__ = ["CupsGateway"]
+
+import asyncio
+import functools
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import cups
+
+from src.api.logging_ import logger
+from src.modules.printing.entity_models import CupsCallMetrics
+
+# IPP statuses which pycups reports when the connection to cupsd is lost
+_CONNECTION_LOST_STATUSES = (cups.IPP_SERVICE_UNAVAILABLE, cups.IPP_INTERNAL_ERROR)
+
+
+class CupsGateway:
+    """
+    Runs blocking pycups calls on a bounded thread pool, so that a slow CUPS response does not freeze the event loop.
+
+    Every worker thread keeps its own `cups.Connection`, which is recreated when the connection breaks.
+    Uploads of documents run on a separate pool of threads, so that they do not hold up short calls.
+    """
+
+    def __init__(
+        self,
+        server: str | None,
+        port: int | None,
+        user: str | None,
+        password: str | None,
+        max_workers: int,
+        upload_workers: int = 1,
+    ):
+        self._server = server
+        self._port = port
+        self._user = user
+        self._password = password
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cups")
+        self._upload_executor = ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix="cups-upload")
+        self._local = threading.local()
+        self.metrics: dict[str, CupsCallMetrics] = {}
+
+    def _connect(self) -> cups.Connection:
+        # libcups keeps the server, user and password callback per thread,
+        # so they should be set in every worker thread before calling cups.Connection()
+        if self._server is not None:
+            cups.setServer(self._server)
+        if self._port is not None:
+            cups.setPort(self._port)
+        if self._user is not None:
+            cups.setUser(self._user)
+        if self._password is not None:
+            password = self._password
+
+            def callback(prompt):
+                logger.info(prompt)
+                return password
+
+            cups.setPasswordCB(callback)
+
+        connection = cups.Connection()
+        logger.info(f"Connected to CUPS from thread {threading.current_thread().name}")
+        self._local.connection = connection
+        return connection
+
+    def _get_connection(self) -> cups.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._connect()
+        return connection
+
+    def _is_connection_lost(self, e: Exception) -> bool:
+        if isinstance(e, cups.HTTPError | RuntimeError):
+            return True
+        return isinstance(e, cups.IPPError) and bool(e.args) and e.args[0] in _CONNECTION_LOST_STATUSES
+
+    def _run_in_thread[T](
+        self, name: str, fn: Callable[..., T], retry: bool, args: tuple[Any, ...], kwargs: dict[str, Any]
+    ) -> T:
+        metrics = self.metrics.setdefault(name, CupsCallMetrics())
+        t1 = time.perf_counter()
+        try:
+            try:
+                return fn(self._get_connection(), *args, **kwargs)
+            except Exception as e:
+                if not self._is_connection_lost(e):
+                    raise
+                logger.warning(f"CUPS connection is lost during {name}: {e!r}, reconnecting")
+                self._local.connection = None
+                metrics.reconnects += 1
+                if not retry:
+                    raise
+                return fn(self._get_connection(), *args, **kwargs)
+        except Exception:
+            metrics.errors += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - t1) * 1000
+            metrics.count += 1
+            metrics.total_ms += elapsed_ms
+            metrics.max_ms = max(metrics.max_ms, elapsed_ms)
+
+    async def run[T](
+        self, name: str, fn: Callable[..., T], *args, retry: bool = True, upload: bool = False, **kwargs
+    ) -> T:
+        """
+        Run `fn(connection, *args, **kwargs)` on a worker thread with its CUPS connection.
+
+        Calls which are not safe to repeat (e.g. job submission) should pass `retry=False`.
+        Calls which send documents should pass `upload=True` to run on the upload threads.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._upload_executor if upload else self._executor,
+            functools.partial(self._run_in_thread, name, fn, retry, args, kwargs),
+        )
+
+    async def call(self, method: str, *args, retry: bool = True, **kwargs) -> Any:
+        """
+        Call a method of `cups.Connection` on a worker thread
+        """
+
+        def fn(connection: cups.Connection, *args, **kwargs):
+            return getattr(connection, method)(*args, **kwargs)
+
+        return await self.run(method, fn, *args, retry=retry, **kwargs)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._upload_executor.shutdown(wait=False, cancel_futures=True)
@@ -140,6 +140,11 @@ class JobStateEnum(IntEnum):
     aborted = 8
     completed = 9
 
+    @property
+    def is_terminal(self) -> bool:
+        "Jobs in 'canceled', 'aborted' or 'completed' state will not change anymore"
+        return self in (JobStateEnum.canceled, JobStateEnum.aborted, JobStateEnum.completed)
+
 
 class JobStateReasonEnum(StrEnum):
     """
@@ -451,6 +456,37 @@ class JobAttributes(BaseSchema):
     "The current state of printer"
     printer_state_message: str | None
     "Human readable message for the printer state, use for error messages"
+    upload_progress: float | None = None
+    "Share of the document which has been sent to CUPS, from 0 to 1, or None if CUPS has received the whole document"
+
+    @classmethod
+    def from_cups(cls, attributes: dict) -> "JobAttributes":
+        return cls(
+            job_state=attributes["job-state"],
+            job_state_reasons=cls.parse_job_state_reasons(attributes.get("job-state-reasons", "")),
+            job_state_message=attributes.get("job-state-message"),
+            printer_state_reasons=cls.parse_printer_state(attributes.get("job-printer-state-reasons", [])),
+            printer_state_message=attributes.get("job-printer-state-message"),
+        )
+
+    @classmethod
+    def from_cups_notification(cls, event: dict) -> "JobAttributes":
+        """
+        Notifications carry only the job state and the printer state reasons, so messages are left empty
+        """
+        job_state_reasons = event.get("job-state-reasons", "")
+        if isinstance(job_state_reasons, list):
+            job_state_reasons = job_state_reasons[0] if job_state_reasons else ""
+        printer_state_reasons = event.get("printer-state-reasons", [])
+        if isinstance(printer_state_reasons, str):
+            printer_state_reasons = [printer_state_reasons]
+        return cls(
+            job_state=event["job-state"],
+            job_state_reasons=cls.parse_job_state_reasons(job_state_reasons),
+            job_state_message=None,
+            printer_state_reasons=cls.parse_printer_state(printer_state_reasons),
+            printer_state_message=None,
+        )
 
     @classmethod
     def parse_job_state_reasons(cls, value: str) -> JobStateReasonEnum | str:
@@ -479,6 +515,17 @@ class JobAttributes(BaseSchema):
         return _result
 
 
+class JobEvent(BaseSchema):
+    event: str
+    "Subscribed CUPS event: 'job-created', 'job-state-changed' or 'job-completed'"
+    job_id: int
+    "ID of the job"
+    printer: str | None
+    "CUPS name of the printer"
+    job: JobAttributes
+    "Attributes of the job after the event"
+
+
 class PrinterStatus(BaseSchema):
     printer: Printer
     offline: bool
@@ -489,3 +536,65 @@ class PrinterStatus(BaseSchema):
 class PreparePrintingResponse(BaseSchema):
     filename: str
     pages: int
+
+
+class PrintLayout(BaseSchema):
+    sheet_sides: int
+    "Number of printed sides of sheets for one copy, after page ranges and number-up are applied"
+    sheets: int
+    "Number of sheets of paper for all copies"
+
+
+class ConversionJobStateEnum(StrEnum):
+    queued = "queued"
+    "Waiting for a free converter"
+    converting = "converting"
+    done = "done"
+    "`result` is ready"
+    failed = "failed"
+    "See `error` and `error_code`"
+
+
+class ConversionJob(BaseSchema):
+    job_id: str
+    "ID of the conversion job"
+    state: ConversionJobStateEnum
+    "State of the conversion"
+    queue_position: int | None = None
+    "Position in the queue of conversions starting from 1, while the job is queued"
+    result: PreparePrintingResponse | None = None
+    "The prepared document, when the job is done"
+    error: str | None = None
+    "Why the job has failed"
+    error_code: int | None = None
+    "HTTP status code which /print/prepare would return for the failure"
+
+
+class CupsCallMetrics(BaseSchema):
+    count: int = 0
+    "Number of calls"
+    errors: int = 0
+    "Number of calls which raised an error"
+    reconnects: int = 0
+    "Number of times the CUPS connection was lost and recreated"
+    total_ms: float = 0
+    "Total time spent in calls, in milliseconds"
+    max_ms: float = 0
+    "The longest call, in milliseconds"
+
+
+class OptimizationMetrics(BaseSchema):
+    count: int = 0
+    "Number of documents optimized before printing, including cache hits"
+    cache_hits: int = 0
+    "Number of optimized documents taken from the conversion cache"
+    errors: int = 0
+    "Number of optimizations which have failed, the original documents were printed then"
+    bytes_before: int = 0
+    "Total size of the documents before optimization, cache hits excluded"
+    bytes_after: int = 0
+    "Total size of the documents after optimization, cache hits excluded"
+    total_ms: float = 0
+    "Total time spent in optimizations, in milliseconds"
+    max_ms: float = 0
+    "The longest optimization, in milliseconds"
@@ -0,0 +1,207 @@
+__all__ = ["JOB_EVENTS", "JobEventBus", "CupsNotificationListener"]
+
+import asyncio
+import time
+from collections.abc import AsyncIterator, Iterable
+
+import cups
+
+from src.api.logging_ import logger
+from src.config_schema import Printer
+from src.modules.printing.cups_gateway import CupsGateway
+from src.modules.printing.entity_models import JobAttributes, JobEvent
+
+JOB_EVENTS = ["job-created", "job-state-changed", "job-completed"]
+
+MAX_RETRY_INTERVAL = 60.0
+"Maximum interval in seconds between attempts to subscribe to job events while CUPS keeps failing"
+
+
+class JobEventBus:
+    """
+    In-process fan-out of job events. Every subscriber gets its own queue, slow subscribers lose events instead of
+    blocking the publisher.
+    """
+
+    def __init__(self, queue_size: int = 1000):
+        self._queue_size = queue_size
+        self._subscribers: set[asyncio.Queue[JobEvent]] = set()
+        self.live_since: float | None = None
+        "Monotonic time since which the events are delivered without gaps, None if the source is not running"
+
+    @property
+    def is_live(self) -> bool:
+        return self.live_since is not None
+
+    def set_live(self, live: bool):
+        self.live_since = time.monotonic() if live else None
+
+    def publish(self, event: JobEvent):
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logger.warning(f"Job events subscriber is too slow, dropping {event.event} of job {event.job_id}")
+
+    async def subscribe(self) -> AsyncIterator[JobEvent]:
+        queue: asyncio.Queue[JobEvent] = asyncio.Queue(self._queue_size)
+        self._subscribers.add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers.discard(queue)
+
+
+class CupsNotificationListener:
+    """
+    Subscribes to job events of the printers with CUPS pull notifications (`notify-pull-method` is `ippget`) and
+    publishes them to the bus. Subscriptions are renewed before the lease runs out and recreated if CUPS forgets them.
+    """
+
+    def __init__(
+        self,
+        gateway: CupsGateway,
+        bus: JobEventBus,
+        printers: list[Printer],
+        poll_interval: float,
+        lease_duration: int,
+    ):
+        self._cups = gateway
+        self._bus = bus
+        self._printers = printers
+        self._poll_interval = poll_interval
+        self._lease_duration = lease_duration
+        # Subscription ID -> (CUPS name of the printer, next sequence number)
+        self._subscriptions: dict[int, tuple[str, int]] = {}
+        self._subscribed_at: float | None = None
+        "Monotonic time of the last subscription or renewal, None if not subscribed"
+        # Printers which CUPS does not know, they are skipped to not fail every subscription
+        self._unknown_printers: set[str] = set()
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            self._task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task[None]):
+        # Whatever stopped the listener, the events are not delivered anymore
+        self._bus.set_live(False)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"CUPS notification listener has crashed: {task.exception()!r}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._bus.set_live(False)
+        await self._unsubscribe()
+
+    async def _unsubscribe(self):
+        subscriptions, self._subscriptions = self._subscriptions, {}
+        self._subscribed_at = None
+        await self._cancel_subscriptions(subscriptions)
+
+    async def _cancel_subscriptions(self, subscription_ids: Iterable[int]):
+        for subscription_id in subscription_ids:
+            try:
+                await self._cups.call("cancelSubscription", subscription_id)
+            except Exception as e:
+                # E.g. CUPS has already forgotten it, otherwise it expires with the lease
+                logger.warning(f"Failed to cancel CUPS subscription {subscription_id}: {e!r}")
+
+    async def _subscribe(self):
+        """
+        Subscribe to events of every printer known to CUPS. If a subscription fails, the ones already created in
+        this pass are cancelled, so that retries do not pile up subscriptions in CUPS.
+        """
+        subscriptions: dict[int, tuple[str, int]] = {}
+        try:
+            for printer in self._printers:
+                if printer.cups_name in self._unknown_printers:
+                    continue
+                try:
+                    subscription_id = await self._cups.call(
+                        "createSubscription",
+                        f"ipp://localhost/printers/{printer.cups_name}",
+                        events=JOB_EVENTS,
+                        lease_duration=self._lease_duration,
+                    )
+                except cups.IPPError as e:
+                    if e.args[0] != cups.IPP_NOT_FOUND:
+                        raise
+                    logger.warning(f"Printer {printer.cups_name} is not known to CUPS, not following its job events")
+                    self._unknown_printers.add(printer.cups_name)
+                    continue
+                subscriptions[subscription_id] = (printer.cups_name, 1)
+        except BaseException:
+            await self._cancel_subscriptions(subscriptions)
+            raise
+        self._subscriptions = subscriptions
+        self._subscribed_at = time.monotonic()
+        logger.info(f"Subscribed to CUPS job events: {self._subscriptions}")
+
+    async def _renew(self):
+        for subscription_id in self._subscriptions:
+            await self._cups.call("renewSubscription", subscription_id, lease_duration=self._lease_duration)
+        self._subscribed_at = time.monotonic()
+
+    async def _pull(self):
+        subscription_ids = list(self._subscriptions)
+        if not subscription_ids:
+            return
+        notifications = await self._cups.call(
+            "getNotifications",
+            subscription_ids,
+            sequence_numbers=[self._subscriptions[subscription_id][1] for subscription_id in subscription_ids],
+        )
+        for event in notifications.get("events", []):
+            subscription_id = event["notify-subscription-id"]
+            printer, next_sequence_number = self._subscriptions[subscription_id]
+            sequence_number = event["notify-sequence-number"]
+            if sequence_number < next_sequence_number:
+                continue  # already seen
+            if sequence_number > next_sequence_number:
+                # CUPS keeps at most MaxEvents events per subscription, the older ones are lost. Starting the live
+                # period anew makes the job tracker ask CUPS for the states of all jobs once again.
+                logger.warning(
+                    f"Lost CUPS job events {next_sequence_number}-{sequence_number - 1} of subscription "
+                    f"{subscription_id}, refreshing job states"
+                )
+                self._bus.set_live(True)
+            self._subscriptions[subscription_id] = (printer, sequence_number + 1)
+            if "notify-job-id" not in event or "job-state" not in event:
+                continue
+            self._bus.publish(
+                JobEvent(
+                    event=event["notify-subscribed-event"],
+                    job_id=event["notify-job-id"],
+                    printer=event.get("printer-name", printer),
+                    job=JobAttributes.from_cups_notification(event),
+                )
+            )
+
+    async def _run(self):
+        failures = 0
+        while True:
+            try:
+                if self._subscribed_at is None:
+                    await self._subscribe()
+                    self._bus.set_live(True)
+                elif time.monotonic() - self._subscribed_at > self._lease_duration / 2:
+                    await self._renew()
+                await self._pull()
+                failures = 0
+            except Exception as e:
+                # The subscription could expire or vanish with a restart of cupsd, so events in between are lost.
+                # Unexpected notifications are handled the same way, so that the listener keeps running.
+                failures += 1
+                logger.warning(f"Failed to pull CUPS job events, resubscribing: {e!r}")
+                self._bus.set_live(False)
+                await self._unsubscribe()
+            if failures:
+                # Back off while CUPS keeps failing
+                await asyncio.sleep(min(self._poll_interval * 2 ** min(failures, 16), MAX_RETRY_INTERVAL))
+            else:
+                await asyncio.sleep(self._poll_interval)
@@ -0,0 +1,114 @@
+__all__ = ["JobSubmitter"]
+
+import asyncio
+import os
+import threading
+from collections.abc import Awaitable, Callable
+
+import cups
+
+from src.api.logging_ import logger
+from src.modules.printing.cups_gateway import CupsGateway
+from src.modules.printing.job_tracker import JobTracker
+
+
+class JobSubmitter:
+    """
+    Submits print jobs in two steps: the job is created in CUPS right away, and then the document is streamed to it
+    in chunks on an upload thread of the gateway. The caller gets the job id without waiting for the upload, and the
+    progress of the upload is reported through the job tracker.
+    """
+
+    def __init__(self, gateway: CupsGateway, tracker: JobTracker, chunk_size: int):
+        self._cups = gateway
+        self._tracker = tracker
+        self._chunk_size = chunk_size
+        self._uploads: set[asyncio.Task[None]] = set()
+        # Tells upload threads to stop between chunks
+        self._closing = threading.Event()
+
+    async def submit(
+        self,
+        printer_cups_name: str,
+        path: str,
+        title: str,
+        options: dict[str, str],
+        on_done: Callable[[bool], Awaitable[None]],
+    ) -> int:
+        """
+        Create the job and start sending the document in the background.
+
+        :param on_done: called with whether CUPS has received the whole document, once the file is not needed anymore
+        :returns: job identifier
+        :raises cups.IPPError: if the job cannot be created, `on_done` is not called then
+        """
+        job_id = await self._cups.call("createJob", printer_cups_name, title, options, retry=False)
+        self._tracker.set_upload_progress(job_id, 0.0)
+        task = asyncio.create_task(self._upload(printer_cups_name, job_id, path, on_done))
+        self._uploads.add(task)
+        task.add_done_callback(self._uploads.discard)
+        return job_id
+
+    async def _upload(
+        self, printer_cups_name: str, job_id: int, path: str, on_done: Callable[[bool], Awaitable[None]]
+    ) -> None:
+        loop = asyncio.get_running_loop()
+
+        def report(progress: float):
+            loop.call_soon_threadsafe(self._tracker.set_upload_progress, job_id, progress)
+
+        ok = False
+        try:
+            await self._cups.run(
+                "writeRequestData",
+                self._write_document,
+                printer_cups_name,
+                job_id,
+                path,
+                report,
+                retry=False,
+                upload=True,
+            )
+            ok = True
+            logger.info(f"Document of job {job_id} is sent to CUPS")
+        except Exception as e:
+            logger.warning(f"Failed to send the document of job {job_id}: {e!r}, cancelling the job")
+            try:
+                await self._cups.call("cancelJob", job_id, False)
+            except cups.IPPError as cancel_error:
+                logger.warning(f"Failed to cancel job {job_id}: {cancel_error}")  # e.g. it was cancelled by the user
+        finally:
+            self._tracker.set_upload_progress(job_id, None)
+            self._tracker.invalidate()
+            await on_done(ok)
+
+    def _write_document(
+        self,
+        connection: cups.Connection,
+        printer_cups_name: str,
+        job_id: int,
+        path: str,
+        report: Callable[[float], None],
+    ) -> None:
+        size = os.path.getsize(path)
+        status = connection.startDocument(printer_cups_name, job_id, os.path.basename(path), "application/pdf", 1)
+        if status != cups.HTTP_CONTINUE:
+            raise cups.HTTPError(status)
+        sent = 0
+        with open(path, "rb") as f:
+            while chunk := f.read(self._chunk_size):
+                if self._closing.is_set():
+                    raise RuntimeError("The server is shutting down")
+                status = connection.writeRequestData(chunk, len(chunk))
+                if status != cups.HTTP_CONTINUE:
+                    raise cups.HTTPError(status)
+                sent += len(chunk)
+                report(sent / size)
+        status = connection.finishDocument(printer_cups_name)
+        if status > cups.IPP_OK_CONFLICT:
+            raise cups.IPPError(status, f"The document of job {job_id} is rejected")
+
+    def close(self):
+        self._closing.set()
+        for task in self._uploads:
+            task.cancel()
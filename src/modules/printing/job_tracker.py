@@ -0,0 +1,235 @@
+__all__ = ["JobTracker"]
+
+import asyncio
+import math
+import time
+from collections.abc import AsyncIterator, Iterable
+
+import cups
+from cachetools import TTLCache
+
+from src.api.logging_ import logger
+from src.modules.printing.cups_gateway import CupsGateway
+from src.modules.printing.entity_models import JobAttributes, JobEvent
+from src.modules.printing.job_events import JobEventBus
+
+JOB_ATTRIBUTES = [
+    "job-id",
+    "job-state",
+    "job-state-reasons",
+    "job-state-message",
+    "job-printer-state-reasons",
+    "job-printer-state-message",
+]
+
+
+class JobTracker:
+    """
+    Table of job states shared by all callers.
+
+    While the event bus is live, the table is kept up to date by job events and CUPS is asked only once to fill it.
+    Otherwise the table of active jobs is refreshed by a single `getJobs` call at most once per `refresh_interval`,
+    no matter how many jobs are asked for. Jobs which are not active anymore are fetched one by one and then cached.
+
+    Progress of uploads of documents to CUPS is kept here too and merged into the job attributes.
+    """
+
+    def __init__(self, gateway: CupsGateway, bus: JobEventBus, refresh_interval: float):
+        self._cups = gateway
+        self._bus = bus
+        self._refresh_interval = refresh_interval
+        self._active_jobs: dict[int, JobAttributes] = {}
+        self._refreshed_at = -math.inf
+        self._refresh_lock = asyncio.Lock()
+        # Finished jobs do not change anymore, keep them for an hour
+        self._finished_jobs: TTLCache[int, JobAttributes] = TTLCache(maxsize=10_000, ttl=60 * 60)
+        # Requests for single jobs which are in progress, shared by concurrent callers
+        self._fetching: dict[int, asyncio.Task[JobAttributes | None]] = {}
+        # Jobs which got events while `getJobs` was in flight, these events are newer than the snapshot
+        self._changed_during_refresh: set[int] | None = None
+        # Share of the document sent to CUPS by job id, while the document is being sent
+        self._uploads: dict[int, float] = {}
+        # Set and replaced every time the table changes, to wake up watchers
+        self._changed = asyncio.Event()
+        self._consumer: asyncio.Task[None] | None = None
+
+    def start(self):
+        if self._consumer is None:
+            self._consumer = asyncio.create_task(self._consume_events())
+            self._consumer.add_done_callback(self._on_consumer_done)
+
+    def _on_consumer_done(self, task: asyncio.Task[None]):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Job events consumer has crashed: {task.exception()!r}")
+        if self._consumer is task:
+            self._consumer = None
+        self._notify_changed()
+
+    @property
+    def _events_live(self) -> bool:
+        """
+        Whether the table is kept up to date by events: the source publishes them and the consumer applies them
+        """
+        return self._bus.is_live and self._consumer is not None and not self._consumer.done()
+
+    def stop(self):
+        if self._consumer is not None:
+            self._consumer.cancel()
+            self._consumer = None
+
+    async def _consume_events(self):
+        async for event in self._bus.subscribe():
+            try:
+                self._apply_event(event)
+            except Exception as e:
+                logger.warning(f"Failed to apply {event.event} of job {event.job_id}: {e!r}")
+
+    def _apply_event(self, event: JobEvent):
+        if self._changed_during_refresh is not None:
+            self._changed_during_refresh.add(event.job_id)
+        previous = self._active_jobs.get(event.job_id)
+        job = event.job
+        if previous is not None:
+            # Notifications carry no messages, keep the ones from the last snapshot
+            job = job.model_copy(
+                update={
+                    "job_state_message": previous.job_state_message,
+                    "printer_state_message": previous.printer_state_message,
+                }
+            )
+        if job.job_state.is_terminal:
+            self._active_jobs.pop(event.job_id, None)
+            self._finished_jobs[event.job_id] = job
+        else:
+            self._active_jobs[event.job_id] = job
+        self._notify_changed()
+
+    def _notify_changed(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _is_fresh(self) -> bool:
+        if self._events_live:
+            # Events keep the table up to date once it is filled after the start of the live period
+            live_since = self._bus.live_since
+            return live_since is not None and self._refreshed_at >= live_since
+        return time.monotonic() - self._refreshed_at < self._refresh_interval
+
+    def invalidate(self):
+        """
+        Refresh the table on the next read, e.g. after a job was submitted or cancelled
+        """
+        self._refreshed_at = -math.inf
+
+    def set_upload_progress(self, job_id: int, progress: float | None):
+        """
+        Set the share of the document of the job which has been sent to CUPS, `None` once the upload is over
+        """
+        if progress is None:
+            self._uploads.pop(job_id, None)
+        else:
+            self._uploads[job_id] = progress
+        self._notify_changed()
+
+    async def _refresh(self):
+        async with self._refresh_lock:
+            if self._is_fresh():
+                return  # the table was refreshed while we were waiting for the lock
+            refreshed_at = time.monotonic()
+            changed: set[int] = set()
+            self._changed_during_refresh = changed
+            try:
+                jobs = await self._cups.call("getJobs", which_jobs="not-completed", requested_attributes=JOB_ATTRIBUTES)
+            finally:
+                self._changed_during_refresh = None
+            active_jobs = {job_id: JobAttributes.from_cups(attributes) for job_id, attributes in jobs.items()}
+            # The snapshot can be older than the events which arrived while it was taken, keep the states from them
+            for job_id in changed:
+                active_jobs.pop(job_id, None)
+                if job_id in self._active_jobs:
+                    active_jobs[job_id] = self._active_jobs[job_id]
+            self._active_jobs = active_jobs
+            self._refreshed_at = refreshed_at
+            self._notify_changed()
+
+    async def _fetch_job(self, job_id: int) -> JobAttributes | None:
+        task = self._fetching.get(job_id)
+        if task is None:
+            task = asyncio.create_task(self._do_fetch_job(job_id))
+            self._fetching[job_id] = task
+            task.add_done_callback(lambda _: self._fetching.pop(job_id, None))
+        return await asyncio.shield(task)
+
+    async def _do_fetch_job(self, job_id: int) -> JobAttributes | None:
+        try:
+            attributes = await self._cups.call("getJobAttributes", job_id, requested_attributes=JOB_ATTRIBUTES)
+        except cups.IPPError as e:
+            logger.warning(f"Failed to get attributes of job {job_id}: {e}")
+            return None
+        job = JobAttributes.from_cups(attributes)
+        if job.job_state.is_terminal:
+            self._finished_jobs[job_id] = job
+        return job
+
+    async def get_many(self, job_ids: Iterable[int]) -> dict[int, JobAttributes]:
+        """
+        Returns attributes of the given jobs, unknown jobs are omitted
+        """
+        if not self._is_fresh():
+            await self._refresh()
+
+        result: dict[int, JobAttributes] = {}
+        missing: list[int] = []
+        for job_id in job_ids:
+            # Finished jobs do not change anymore, so they take precedence over a possibly outdated active state
+            if job_id in self._finished_jobs:
+                result[job_id] = self._finished_jobs[job_id]
+            elif job_id in self._active_jobs:
+                result[job_id] = self._active_jobs[job_id]
+            else:
+                missing.append(job_id)
+
+        fetched = await asyncio.gather(*(self._fetch_job(job_id) for job_id in missing))
+        for job_id, job in zip(missing, fetched, strict=True):
+            if job is not None:
+                result[job_id] = job
+        for job_id, job in result.items():
+            if job_id in self._uploads:
+                result[job_id] = job.model_copy(update={"upload_progress": self._uploads[job_id]})
+        return result
+
+    async def get(self, job_id: int) -> JobAttributes | None:
+        return (await self.get_many([job_id])).get(job_id)
+
+    async def watch(self, job_id: int, heartbeat_interval: float) -> AsyncIterator[JobAttributes | None]:
+        """
+        Yields the job attributes every time the job state, its reasons, printer state reasons or upload progress
+        change, and `None`
+        if nothing has changed for `heartbeat_interval` seconds. Ends when the job reaches a terminal state.
+
+        Wakes up on job events, or every `refresh_interval` if the event bus is not live.
+        """
+        last_seen = None
+        last_yielded_at = time.monotonic()
+        while True:
+            job = await self.get(job_id)
+            if job is None:
+                return
+            seen = (job.job_state, job.job_state_reasons, job.printer_state_reasons, job.upload_progress)
+            if seen != last_seen:
+                last_seen = seen
+                last_yielded_at = time.monotonic()
+                yield job
+            elif time.monotonic() - last_yielded_at >= heartbeat_interval:
+                last_yielded_at = time.monotonic()
+                yield None
+            if job.job_state.is_terminal:
+                return
+            if self._events_live:
+                timeout = max(0.0, last_yielded_at + heartbeat_interval - time.monotonic())
+            else:
+                timeout = self._refresh_interval
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except TimeoutError:
+                pass
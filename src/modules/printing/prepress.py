@@ -0,0 +1,204 @@
+__all__ = ["Prepress", "PrepressFailedError", "PrepressResult"]
+
+import asyncio
+import hashlib
+import math
+import os
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from src.api.logging_ import logger
+from src.modules.converting.cache import ConversionCache
+from src.modules.documents.entity_models import DocumentMetadata
+from src.modules.documents.repository import DocumentReadError, documents_repository
+from src.modules.documents.transforms import extract_pages, impose, optimize
+from src.modules.documents.workers import MuPDFError, WorkerCrashedError, WorkerPool
+from src.modules.printing.entity_models import OptimizationMetrics, PrintingOptions, PrintLayout
+from src.modules.printing.tools.page_ranges import InvalidPageRangesError, format_page_ranges, parse_page_ranges
+from src.storages.mongo.tempfiles import TempFileSchema
+
+
+class PrepressFailedError(Exception):
+    """
+    The document cannot be prepared for printing: MuPDF has failed or crashed on it, or it has taken too long
+    """
+
+
+@dataclass
+class PrepressResult:
+    path: str
+    "The document to send to CUPS"
+    options: PrintingOptions
+    "Options to send to CUPS, without the ones which are already applied to the document"
+    temporary: bool
+    "Whether the document was made for this job and should be removed after submission"
+    sha256: str
+    "SHA-256 of the document"
+    pages: int
+    "Number of pages in the document, i.e. sheet sides to print per copy"
+
+
+@dataclass
+class _Plan:
+    pages: list[int]
+    "Pages of the source to print, starting from 1"
+    number_up: int
+    source_pages: int
+    "Number of pages in the source"
+
+
+class Prepress:
+    """
+    Applies printing options to the document before it is sent to CUPS, so that CUPS filters have less to parse.
+
+    Optionally, the document is first optimized for the resolution of the printer. Then page ranges are applied by
+    extracting the selected pages, and number-up is applied by imposing pages on sheets. The work is done in a pool of
+    worker processes, and derived documents are kept in the conversion cache by content hash of the source and the
+    options applied.
+    """
+
+    def __init__(
+        self, temp_dir: str, cache: ConversionCache | None, max_workers: int = 2, timeout: float | None = None
+    ):
+        """
+        :param timeout: deadline in seconds of a single step (optimization, extraction or imposition)
+        """
+        self.temp_dir = temp_dir
+        self.cache = cache
+        self.timeout = timeout
+        self.workers = WorkerPool(max_workers)
+        self.metrics = OptimizationMetrics()
+
+    async def _run_worker(self, fn: Callable, *args) -> None:
+        """
+        :raises PrepressFailedError: if the worker has failed, crashed or exceeded the deadline
+        """
+        try:
+            await self.workers.run(fn, *args, timeout=self.timeout)
+        except TimeoutError:
+            raise PrepressFailedError(f"{fn.__name__} has not finished in {self.timeout} seconds")
+        except (MuPDFError, WorkerCrashedError) as e:
+            raise PrepressFailedError(f"{fn.__name__} has failed: {e}")
+
+    async def _get_metadata(self, path: str, sha256: str | None = None) -> DocumentMetadata:
+        try:
+            return await documents_repository.get_metadata(path, sha256)
+        except DocumentReadError as e:
+            raise PrepressFailedError(str(e))
+
+    async def _plan(self, tempfile_: TempFileSchema, options: PrintingOptions) -> _Plan:
+        pages = tempfile_.pages
+        if pages is None:
+            pages = (await self._get_metadata(tempfile_.path, tempfile_.sha256)).pages
+        number_up = int(options.number_up or 1)
+        if not options.page_ranges:
+            return _Plan(list(range(1, pages + 1)), number_up, pages)
+
+        # CUPS applies page ranges to the sheets after number-up, so keep all pages of the selected sheets
+        sheets = parse_page_ranges(options.page_ranges, math.ceil(pages / number_up))
+        if not sheets:
+            raise InvalidPageRangesError(f"Page ranges {options.page_ranges!r} select no pages")
+        selected = [
+            page for sheet in sheets for page in range((sheet - 1) * number_up + 1, min(sheet * number_up, pages) + 1)
+        ]
+        return _Plan(selected, number_up, pages)
+
+    async def layout(self, tempfile_: TempFileSchema, options: PrintingOptions) -> PrintLayout:
+        """
+        Returns how many sheets the job takes, without making the document
+
+        :raises InvalidPageRangesError: if the page ranges cannot be parsed or select no pages
+        :raises PrepressFailedError: if the number of pages is not known and the document cannot be read
+        """
+        plan = await self._plan(tempfile_, options)
+        sheet_sides = math.ceil(len(plan.pages) / plan.number_up)
+        # Every copy starts on a new sheet of paper
+        sheets = math.ceil(sheet_sides / 2) if options.sides == "two-sided-long-edge" else sheet_sides
+        return PrintLayout(sheet_sides=sheet_sides, sheets=sheets * int(options.copies or 1))
+
+    async def prepare(
+        self, tempfile_: TempFileSchema, options: PrintingOptions, max_dpi: int | None = None
+    ) -> PrepressResult:
+        """
+        :param max_dpi: resolution of the printer, if set then the document is optimized for it first (see `optimize`)
+        :raises InvalidPageRangesError: if the page ranges cannot be parsed or select no pages
+        :raises PrepressFailedError: if the document cannot be read, or its pages cannot be extracted or imposed
+        """
+        plan = await self._plan(tempfile_, options)
+        options = options.model_copy(update={"page_ranges": None, "number_up": None})
+        source = PrepressResult(tempfile_.path, options, False, tempfile_.sha256, plan.source_pages)
+        if max_dpi:
+            source = await self._optimize(source, max_dpi)
+        if plan.number_up == 1 and len(plan.pages) == plan.source_pages:
+            return source
+
+        # Long lists of ranges do not fit into a file name
+        key = f".{plan.number_up}up-" + hashlib.sha256(format_page_ranges(plan.pages).encode()).hexdigest()[:16]
+        fd, outpath = tempfile.mkstemp(dir=self.temp_dir, suffix=".pdf")
+        os.close(fd)
+        try:
+            metadata = await self._make(source, plan, key, outpath)
+        except BaseException:
+            os.unlink(outpath)
+            raise
+        finally:
+            if source.temporary:
+                os.unlink(source.path)
+        return PrepressResult(outpath, options, True, metadata.sha256, metadata.pages)
+
+    async def _make(self, source: PrepressResult, plan: _Plan, key: str, outpath: str) -> DocumentMetadata:
+        if self.cache is not None:
+            metadata = await asyncio.to_thread(self.cache.get, source.sha256, key, outpath)
+            if metadata is not None:
+                return metadata
+
+        if plan.number_up == 1:
+            await self._run_worker(extract_pages, source.path, outpath, plan.pages)
+        else:
+            await self._run_worker(impose, source.path, outpath, plan.pages, plan.number_up)
+        logger.info(f"Prepared {len(plan.pages)} pages of {source.path}, {plan.number_up} per sheet")
+        metadata = await self._get_metadata(outpath)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, source.sha256, key, outpath, metadata)
+        return metadata
+
+    async def _optimize(self, source: PrepressResult, max_dpi: int) -> PrepressResult:
+        """
+        Returns the optimized copy of the document, or the document itself if the optimization fails
+        """
+        key = f".optimized-{max_dpi}dpi"
+        fd, outpath = tempfile.mkstemp(dir=self.temp_dir, suffix=".pdf")
+        os.close(fd)
+        self.metrics.count += 1
+        try:
+            metadata = None
+            if self.cache is not None:
+                metadata = await asyncio.to_thread(self.cache.get, source.sha256, key, outpath)
+            if metadata is not None:
+                self.metrics.cache_hits += 1
+            else:
+                start = time.monotonic()
+                await self._run_worker(optimize, source.path, outpath, max_dpi)
+                elapsed_ms = (time.monotonic() - start) * 1000
+                before, after = os.path.getsize(source.path), os.path.getsize(outpath)
+                self.metrics.bytes_before += before
+                self.metrics.bytes_after += after
+                self.metrics.total_ms += elapsed_ms
+                self.metrics.max_ms = max(self.metrics.max_ms, elapsed_ms)
+                logger.info(
+                    f"Optimized {source.path} for {max_dpi} dpi: {before} -> {after} bytes in {elapsed_ms:.0f} ms"
+                )
+                metadata = await documents_repository.get_metadata(outpath)
+                if self.cache is not None:
+                    await asyncio.to_thread(self.cache.put, source.sha256, key, outpath, metadata)
+        except Exception as e:
+            os.unlink(outpath)
+            self.metrics.errors += 1
+            logger.warning(f"Failed to optimize {source.path}, printing it as is: {e!r}")
+            return source
+        except BaseException:
+            os.unlink(outpath)
+            raise
+        return PrepressResult(outpath, source.options, True, metadata.sha256, metadata.pages)
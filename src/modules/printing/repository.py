@@ -2,77 +2,106 @@ __all__ = ["printing_repository"]
 
 import asyncio
 import os
-import pathlib
-import re
 import time
 from asyncio import Task
-from tempfile import _TemporaryFileWrapper
 
-import bs4
+import aiohttp
 import cups
 import httpx
 from cachetools import TTLCache
+from pyipp import IPP, IPPConnectionError, IPPError
+from pyipp.enums import IppOperation
 
-from src.api.dependencies import USER_AUTH
 from src.api.logging_ import logger
 from src.config import settings
 from src.config_schema import Printer
+from src.modules.converting.repository import converting_repository
+from src.modules.printing.cups_gateway import CupsGateway
 from src.modules.printing.entity_models import JobAttributes, PrinterStatus, PrintingOptions
+from src.modules.printing.job_events import CupsNotificationListener, JobEventBus
+from src.modules.printing.job_submitter import JobSubmitter
+from src.modules.printing.job_tracker import JobTracker
+from src.modules.printing.prepress import Prepress
+from src.modules.printing.tools.paper_status import parse_input_tray_percentage, parse_paper_percentage
+from src.modules.tempfiles.repository import tempfile_repository
+from src.storages.mongo.tempfiles import TempFile
+
+STATUS_MAX_AGE_WITHOUT_POLLER = 30.0
+"Maximum age in seconds of a printer status snapshot which is returned when the status poller is off"
 
 
 # noinspection PyMethodMayBeStatic
 class PrintingRepository:
-    server: cups.Connection
+    cups: CupsGateway
 
     def __init__(self, server: str | None, port: int | None, user: str | None, password: str | None):
-        # Settings should be set before calling cups.Connection()
-        if server is not None:
-            cups.setServer(server)
-        if port is not None:
-            cups.setPort(port)
-        if user is not None:
-            cups.setUser(user)
-        if password is not None:
-
-            def callback(prompt):
-                logger.info(prompt)
-                return password
-
-            cups.setPasswordCB(callback)
-
-        self.server = cups.Connection()
+        self.cups = CupsGateway(
+            server,
+            port,
+            user,
+            password,
+            max_workers=settings.api.cups_max_workers,
+            upload_workers=settings.api.cups_upload_workers,
+        )
+        self.job_events = JobEventBus()
+        self._notification_listener = CupsNotificationListener(
+            self.cups,
+            self.job_events,
+            settings.api.printers_list,
+            poll_interval=settings.api.cups_notifications_poll_interval,
+            lease_duration=settings.api.cups_notifications_lease_duration,
+        )
+        self.jobs = JobTracker(self.cups, self.job_events, refresh_interval=settings.api.job_status_refresh_interval)
+        self.submitter = JobSubmitter(self.cups, self.jobs, chunk_size=settings.api.cups_upload_chunk_size)
+        self.prepress = Prepress(
+            settings.api.temp_dir,
+            converting_repository.cache,
+            max_workers=settings.api.prepress_max_workers,
+            timeout=settings.api.prepress_timeout,
+        )
         # Cache printer paper status for 5 minutes
         self._printer_paper_status_cache = TTLCache(maxsize=100, ttl=5 * 60)
         # Cache printer toner status for 5 minutes
         self._printer_toner_status_cache = TTLCache(maxsize=100, ttl=5 * 60)
-
-        self.tempfiles: dict[tuple[str, str], tuple[_TemporaryFileWrapper[bytes], Task[None]]] = {}
-        self.tempfile_expiration_time = 6 * 60 * 60
-
-    def store_tempfile(self, innohassle_user_id, f):
-        self.tempfiles[(innohassle_user_id, pathlib.Path(f.name).name)] = (
-            f,
-            asyncio.create_task(self.wait_for_tempfile_expiration(innohassle_user_id, f)),
-        )
-
-    async def wait_for_tempfile_expiration(self, innohassle_user_id, f):
-        await asyncio.sleep(self.tempfile_expiration_time)
-        self.remove_tempfile(innohassle_user_id, pathlib.Path(f.name).name, True)
-
-    def remove_tempfile(self, innohassle_user_id, filename, expired=False):
-        if (innohassle_user_id, filename) in self.tempfiles:
-            self.tempfiles[(innohassle_user_id, filename)][0].close()
-            try:
-                os.unlink(self.get_tempfile_path(innohassle_user_id, filename))
-            except FileNotFoundError:
-                pass
-            if not expired:
-                self.tempfiles[(innohassle_user_id, filename)][1].cancel()
-            del self.tempfiles[(innohassle_user_id, filename)]
-            return True
-
-    def get_tempfile_path(self, innohassle_user_id, filename):
-        return self.tempfiles[(innohassle_user_id, filename)][0].name
+        # Long-lived HTTP clients for status probes, one per printer host
+        self._status_clients: dict[str, httpx.AsyncClient] = {}
+        # Shared session for IPP status probes
+        self._ipp_session: aiohttp.ClientSession | None = None
+        # Latest printer status by CUPS name, with the monotonic time it was taken at
+        self._printer_status_snapshots: dict[str, tuple[float, PrinterStatus]] = {}
+        self._status_poller: Task[None] | None = None
+
+    def start_status_poller(self):
+        if self._status_poller is None and settings.api.printer_status_poll_interval > 0:
+            self._status_poller = asyncio.create_task(self._poll_printers_status())
+
+    def start_job_events(self):
+        if settings.api.cups_notifications_poll_interval > 0:
+            self.jobs.start()
+            self._notification_listener.start()
+
+    async def _poll_printers_status(self):
+        while True:
+            await asyncio.gather(
+                *(self._refresh_printer_status(printer) for printer in settings.api.printers_list),
+                return_exceptions=True,
+            )
+            await asyncio.sleep(settings.api.printer_status_poll_interval)
+
+    async def close(self):
+        if self._status_poller is not None:
+            self._status_poller.cancel()
+            self._status_poller = None
+        for client in self._status_clients.values():
+            await client.aclose()
+        self._status_clients.clear()
+        if self._ipp_session is not None:
+            await self._ipp_session.close()
+            self._ipp_session = None
+        self.jobs.stop()
+        self.submitter.close()
+        await self._notification_listener.stop()
+        self.cups.close()
 
     def get_printer(self, cups_name: str) -> Printer | None:
         for elem in settings.api.printers_list:
@@ -80,20 +109,106 @@ class PrintingRepository:
                 return elem
         return None
 
-    async def get_printer_status(self, printer: Printer, use_cache: bool = True) -> PrinterStatus:
-        toner_percentage = None  # self._fetch_toner_status(printer, use_cache) - shows 0 for our printers
+    async def get_printer_status(self, printer: Printer, max_age: float | None = None) -> PrinterStatus:
+        """
+        Return the latest status snapshot of the printer. If there is no snapshot yet, or it is older than `max_age`
+        seconds, the printer is probed right away. Without `max_age`, snapshots kept fresh by the poller are returned
+        as is, and if the poller is off, they are considered outdated after `STATUS_MAX_AGE_WITHOUT_POLLER` seconds.
+        """
+        use_cache = max_age is None
+        if max_age is None and (self._status_poller is None or self._status_poller.done()):
+            max_age = STATUS_MAX_AGE_WITHOUT_POLLER
+        snapshot = self._printer_status_snapshots.get(printer.cups_name)
+        if snapshot is not None:
+            taken_at, status = snapshot
+            if max_age is None or time.monotonic() - taken_at <= max_age:
+                return status
+        return await self._refresh_printer_status(printer, use_cache=use_cache)
+
+    async def _refresh_printer_status(self, printer: Printer, use_cache: bool = True) -> PrinterStatus:
+        status = await self._probe_printer_status(printer, use_cache)
+        self._printer_status_snapshots[printer.cups_name] = (time.monotonic(), status)
+        return status
+
+    async def _probe_printer_status(self, printer: Printer, use_cache: bool = True) -> PrinterStatus:
+        if printer.status_backend == "ipp":
+            return await self._probe_printer_status_ipp(printer)
+        return await self._probe_printer_status_http(printer, use_cache)
+
+    async def _probe_printer_status_ipp(self, printer: Printer) -> PrinterStatus:
+        host, port = printer.ipp.rsplit(":", 1)
+        ipp = IPP(
+            host=host,
+            port=int(port),
+            base_path=printer.ipp_path,
+            request_timeout=self._get_status_timeout(printer),
+            session=self._get_ipp_session(),
+        )
+        try:
+            t1 = time.perf_counter()
+            response = await ipp.execute(
+                IppOperation.GET_PRINTER_ATTRIBUTES,
+                {
+                    "operation-attributes-tag": {
+                        "requested-attributes": ["printer-state", "marker-levels", "printer-input-tray"],
+                    },
+                },
+            )
+            t2 = time.perf_counter()
+        except IPPConnectionError as e:
+            logger.warning(f"Printer {printer.cups_name} is offline: {e}")
+            return PrinterStatus(  # only from cache
+                printer=printer,
+                offline=True,
+                toner_percentage=self._printer_toner_status_cache.get(printer.cups_name),
+                paper_percentage=self._printer_paper_status_cache.get(printer.ipp),
+            )
+        except IPPError as e:
+            logger.warning(f"Printer {printer.cups_name} IPP error: {e!r}")
+            return PrinterStatus(printer=printer, offline=False, toner_percentage=None, paper_percentage=None)
+
+        attributes = next(iter(response["printers"]), {})
+        logger.info(
+            f"Printer {printer.cups_name} (IPP Get-Printer-Attributes) fetch time: {(t2 - t1) * 1000:.0f}ms, "
+            f"printer-state: {attributes.get('printer-state')}"
+        )
+
+        toner_percentage = None
+        marker_levels = attributes.get("marker-levels")
+        if not isinstance(marker_levels, list):
+            marker_levels = [marker_levels] if marker_levels is not None else []
+        if marker_levels and marker_levels[0] >= 0:  # negative values mean that the level is unknown
+            toner_percentage = marker_levels[0]
+            self._printer_toner_status_cache[printer.cups_name] = toner_percentage
+
+        input_trays = attributes.get("printer-input-tray")
+        if not isinstance(input_trays, list):
+            input_trays = [input_trays] if input_trays is not None else []
+        paper_percentage = parse_input_tray_percentage(input_trays)
+        if paper_percentage is not None:
+            self._printer_paper_status_cache[printer.ipp] = paper_percentage
+
+        return PrinterStatus(
+            printer=printer,
+            offline=False,
+            toner_percentage=toner_percentage,
+            paper_percentage=paper_percentage,
+        )
+
+    async def _probe_printer_status_http(self, printer: Printer, use_cache: bool = True) -> PrinterStatus:
+        toner_percentage = None  # await self._fetch_toner_status(printer, use_cache) - shows 0 for our printers
         paper_percentage = None
 
-        async with httpx.AsyncClient() as client:
-            offline = await self._is_printer_offline(printer, client)
+        client = self._get_status_client(printer)
+        offline = await self._is_printer_offline(printer, client)
 
-            if offline:  # only from cache
-                paper_percentage = self._printer_paper_status_cache.get(printer.ipp)
-            else:  # otherwise fetch from printer, or from cache if ttl is not expired
-                try:
-                    paper_percentage = await self._fetch_paper_status(printer, client, use_cache)
-                except Exception as e:
-                    logger.warning(e)
+        if offline:  # only from cache
+            paper_percentage = self._printer_paper_status_cache.get(printer.ipp)
+        else:  # otherwise fetch from printer, or from cache if ttl is not expired
+            try:
+                paper_percentage = await self._fetch_paper_status(printer, client, use_cache)
+            except Exception as e:
+                logger.warning(e)
 
         return PrinterStatus(
             printer=printer,
@@ -102,7 +217,34 @@ class PrintingRepository:
             paper_percentage=paper_percentage,
         )
 
-    def _fetch_toner_status(self, printer: Printer, use_cache: bool = True) -> int | None:
+    def _get_status_client(self, printer: Printer) -> httpx.AsyncClient:
+        client = self._status_clients.get(printer.ipp)
+        if client is None or client.is_closed:
+            timeout = (
+                printer.status_timeout if printer.status_timeout is not None else settings.api.printer_status_timeout
+            )
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(timeout),
+                limits=httpx.Limits(
+                    max_connections=settings.api.printer_status_max_connections,
+                    max_keepalive_connections=settings.api.printer_status_max_connections,
+                    keepalive_expiry=settings.api.printer_status_keepalive_expiry,
+                ),
+            )
+            self._status_clients[printer.ipp] = client
+        return client
+
+    def _get_ipp_session(self) -> aiohttp.ClientSession:
+        if self._ipp_session is None or self._ipp_session.closed:
+            self._ipp_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit_per_host=settings.api.printer_status_max_connections,
+                    keepalive_timeout=settings.api.printer_status_keepalive_expiry,
+                )
+            )
+        return self._ipp_session
+
+    async def _fetch_toner_status(self, printer: Printer, use_cache: bool = True) -> int | None:
         # Check cache first
         cached_toner = self._printer_toner_status_cache.get(printer.cups_name)
         if cached_toner is not None and use_cache:
@@ -111,7 +253,9 @@ class PrintingRepository:
 
         try:
             t1 = time.perf_counter()
-            attributes = self.server.getPrinterAttributes(printer.cups_name, requested_attributes=["marker-levels"])
+            attributes = await self.cups.call(
+                "getPrinterAttributes", printer.cups_name, requested_attributes=["marker-levels"]
+            )
             t2 = time.perf_counter()
             logger.info(f"Printer {printer.cups_name} get attributes time: {(t2 - t1) * 1000:.0f}ms")
 
@@ -136,7 +280,8 @@ class PrintingRepository:
             else:
                 logger.warning(f"Printer {printer.cups_name} unexpected response: {response}")
                 return True
-        except (httpx.ConnectError, httpx.ReadTimeout, httpx.ConnectTimeout) as e:
+        except httpx.TransportError as e:
+            # Including PoolTimeout, when all connections to the printer are busy with earlier probes
             logger.warning(f"Printer {printer.cups_name} is offline: {type(e)}")
             return True
 
@@ -156,7 +301,7 @@ class PrintingRepository:
         )
         if response.status_code == httpx.codes.OK:
             t1 = time.perf_counter()
-            percentage = self._parse_paper_percentage(response.text)
+            percentage = parse_paper_percentage(response.text)
             t2 = time.perf_counter()
             logger.info(f"Printer {printer.cups_name} parse time: {(t2 - t1) * 1000:.0f}ms")
             if percentage is not None:
@@ -167,77 +312,40 @@ class PrintingRepository:
             logger.warning(f"Printer {printer.cups_name} response: {response}")
         return None
 
-    def _parse_paper_percentage(self, html: str) -> int | None:
-        soup = bs4.BeautifulSoup(html, "html.parser")
-        # Find "printer-input-tray"
-        printer_input_tray = soup.find("font", string="printer-input-tray:")
-        if printer_input_tray:
-            # find previous <br>
-            previous_br = printer_input_tray.find_previous("br")
-            if previous_br is None:
-                logger.warning("Previous_br is None")
-                return None
-            # find next <br>
-            next_br = printer_input_tray.find_next("br")
-            if next_br is None:
-                logger.warning("Next_br is None")
-                return None
-
-            # get all <font> between previous_br and next_br
-            font_elements = []
-            for element in previous_br.find_all_next():
-                if element == next_br:
-                    break
-                if isinstance(element, bs4.element.Tag) and element.name == "font":
-                    font_elements.append(element)
-
-            # Find Cassette tray and get its level and maxcapacity
-            for font in font_elements:
-                if "Cassette" in font.text:
-                    # Extract level and maxcapacity using regex
-                    level_match = re.search(r"level=(\d+)", font.text)
-                    maxcapacity_match = re.search(r"maxcapacity=(\d+)", font.text)
-
-                    if level_match and maxcapacity_match:
-                        level = int(level_match.group(1))
-                        maxcapacity = int(maxcapacity_match.group(1))
-
-                        if maxcapacity > 0:
-                            return int((level / maxcapacity) * 100)
-        return None
+    async def print_file(self, tempfile: TempFile, printer: Printer, options: PrintingOptions) -> int:
+        """
+        :raises InvalidPageRangesError: if the page ranges in the options are invalid
+        :raises PrepressFailedError: if the document cannot be prepared for printing
+        """
+        max_dpi = printer.resolution if settings.api.optimize_before_printing else None
+        prepared = await self.prepress.prepare(tempfile, options, max_dpi)
+        options_dict = prepared.options.model_dump(by_alias=True, exclude_none=True)
+
+        async def on_done(ok: bool):
+            if prepared.temporary:
+                os.unlink(prepared.path)
+            # Keep the file if CUPS has not received it, so that the user can try again
+            if ok:
+                await tempfile_repository.remove(tempfile.kind, tempfile.innohassle_user_id, tempfile.filename)
 
-    def print_file(
-        self, innohassle_user_id: USER_AUTH, filename: str, printer: Printer, options: PrintingOptions
-    ) -> int:
-        options_dict = options.model_dump(by_alias=True, exclude_none=True)
-        job_id = self.server.printFile(
-            printer.cups_name, self.get_tempfile_path(innohassle_user_id, filename), "job", options=options_dict
-        )
-        self.remove_tempfile(innohassle_user_id, filename)
+        try:
+            job_id = await self.submitter.submit(printer.cups_name, prepared.path, "job", options_dict, on_done)
+        except BaseException:
+            if prepared.temporary:
+                os.unlink(prepared.path)
+            raise
+        self.jobs.invalidate()
         return job_id
 
-    def get_job_status(self, job_id: int) -> JobAttributes:
-        attributes = self.server.getJobAttributes(
-            job_id,
-            requested_attributes=[
-                "job-state",
-                "job-state-reasons",
-                "job-state-message",
-                "job-printer-state-reasons",
-                "job-printer-state-message",
-            ],
-        )
+    async def get_job_status(self, job_id: int) -> JobAttributes | None:
+        return await self.jobs.get(job_id)
 
-        return JobAttributes(
-            job_state=attributes["job-state"],
-            job_state_reasons=JobAttributes.parse_job_state_reasons(attributes.get("job-state-reasons", "")),
-            job_state_message=attributes.get("job-state-message"),
-            printer_state_reasons=JobAttributes.parse_printer_state(attributes.get("job-printer-state-reasons", [])),
-            printer_state_message=attributes.get("job-printer-state-message"),
-        )
+    async def get_jobs_status(self, job_ids: list[int]) -> dict[int, JobAttributes]:
+        return await self.jobs.get_many(job_ids)
 
-    def cancel_job(self, job_id: int):
-        self.server.cancelJob(job_id, True)
+    async def cancel_job(self, job_id: int):
+        await self.cups.call("cancelJob", job_id, True)
+        self.jobs.invalidate()
 
 
 printing_repository: PrintingRepository = PrintingRepository(
@@ -1,54 +1,161 @@
 import asyncio
+import os
 import tempfile
 from pathlib import Path
 from typing import Any
 
-import PyPDF2
-from fastapi import APIRouter, Body, UploadFile
+from fastapi import APIRouter, Body, Query, UploadFile
 from fastapi.exceptions import HTTPException
-from starlette.responses import FileResponse
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response, StreamingResponse
 
 from src.api.dependencies import USER_AUTH
 from src.api.logging_ import logger
 from src.config import settings
 from src.config_schema import Printer
-from src.modules.converting.repository import converting_repository
-from src.modules.printing.entity_models import JobAttributes, PreparePrintingResponse, PrinterStatus, PrintingOptions
+from src.modules.converting.entity_models import ConversionMetrics
+from src.modules.converting.images import IMAGE_EXTENSIONS
+from src.modules.converting.pool import ConversionTimeoutError, ConverterPoolSaturatedError
+from src.modules.converting.repository import ConversionFailedError, converting_repository
+from src.modules.converting.text import TEXT_EXTENSIONS
+from src.modules.documents.repository import DocumentReadError, documents_repository
+from src.modules.printing.conversion_jobs import ConversionJobs
+from src.modules.printing.entity_models import (
+    ConversionJob,
+    CupsCallMetrics,
+    JobAttributes,
+    OptimizationMetrics,
+    PreparePrintingResponse,
+    PrinterStatus,
+    PrintingOptions,
+    PrintLayout,
+)
+from src.modules.printing.prepress import PrepressFailedError
 from src.modules.printing.repository import printing_repository
+from src.modules.printing.tools.page_ranges import InvalidPageRangesError
+from src.modules.tempfiles.entity_models import ExpiryStats, IngestedFile
+from src.modules.tempfiles.ingest import UploadTooLargeError, ingest_upload
+from src.modules.tempfiles.repository import tempfile_repository
+from src.modules.tempfiles.responses import tempfile_preview_response, tempfile_response
+from src.modules.tempfiles.scheduler import expiry_scheduler
+from src.storages.mongo.tempfiles import TempFileKind
 
 router = APIRouter(prefix="/print", tags=["Print"])
 
+JOB_EVENTS_HEARTBEAT_INTERVAL = 15
+"Send a comment to event streams if nothing has changed for this many seconds, to keep proxies happy"
 
-@router.get("/job_status")
+conversion_jobs = ConversionJobs(converting_repository.pool, ttl=60 * 60)
+
+
+@router.get("/job_status", responses={404: {"description": "No such job"}})
 async def job_status(job_id: int, _innohassle_user_id: USER_AUTH) -> JobAttributes:
     """
     Returns the status of a job
     """
-    status = printing_repository.get_job_status(job_id)
+    status = await printing_repository.get_job_status(job_id)
     logger.info(f"Job {job_id} status: {status}")
+    if status is None:
+        raise HTTPException(404, "No such job")
     return status
 
 
-@router.get("/get_file", responses={404: {"description": "No such file"}})
-def get_file(filename: str, innohassle_user_id: USER_AUTH) -> FileResponse:
-    if (innohassle_user_id, filename) in printing_repository.tempfiles:
-        return FileResponse(
-            printing_repository.get_tempfile_path(innohassle_user_id, filename),
-            headers={"Content-Disposition": f"attachment; filename={filename}"},
-        )
+@router.get("/jobs_status")
+async def jobs_status(_innohassle_user_id: USER_AUTH, job_ids: list[int] = Query()) -> dict[int, JobAttributes]:
+    """
+    Returns the statuses of several jobs at once, unknown jobs are omitted
+    """
+    return await printing_repository.get_jobs_status(job_ids)
+
+
+@router.get(
+    "/job_events",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"text/event-stream": {}}, "description": "Stream of `JobAttributes`"},
+        404: {"description": "No such job"},
+    },
+)
+async def job_events(job_id: int, _innohassle_user_id: USER_AUTH) -> StreamingResponse:
+    """
+    Server-Sent Events stream of the job status. The current `JobAttributes` are sent right away and then every time
+    the job state, its reasons or printer state reasons change. The stream ends when the job is completed, cancelled
+    or aborted
+    """
+    if await printing_repository.get_job_status(job_id) is None:
+        raise HTTPException(404, "No such job")
+
+    async def events():
+        async for job in printing_repository.jobs.watch(job_id, heartbeat_interval=JOB_EVENTS_HEARTBEAT_INTERVAL):
+            if job is None:
+                yield ": keep-alive\n\n"
+            else:
+                logger.info(f"Job {job_id} status: {job}")
+                yield f"data: {job.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get(
+    "/get_file",
+    responses={
+        200: {"content": {"application/pdf": {}}},
+        206: {"description": "Requested range of the file"},
+        304: {"description": "The file has not changed, see `ETag`"},
+        404: {"description": "No such file"},
+    },
+)
+async def get_file(filename: str, innohassle_user_id: USER_AUTH, request: Request) -> Response:
+    """
+    Returns the file. Supports `If-None-Match` with the `ETag` from a previous response, and `Range` requests
+    """
+    tempfile_ = await tempfile_repository.get(TempFileKind.PRINTING, innohassle_user_id, filename)
+    if tempfile_ is not None:
+        return tempfile_response(request, tempfile_)
     else:
         raise HTTPException(404, "No such file. It was removed from our servers due to expiration")
 
 
+@router.get(
+    "/preview",
+    responses={
+        200: {"content": {"image/jpeg": {}}, "description": "JPEG thumbnail"},
+        304: {"description": "The thumbnail has not changed, see `ETag`"},
+        404: {"description": "No such file or page"},
+        422: {"description": "The document cannot be rendered"},
+    },
+)
+async def get_preview(
+    filename: str,
+    innohassle_user_id: USER_AUTH,
+    request: Request,
+    page: int = 1,
+    size: int = Query(320, ge=16, le=1024),
+) -> Response:
+    """
+    Returns a JPEG thumbnail of the page which fits into `size`×`size` pixels, the first page by default.
+    Pages are numbered from 1, -1 is the last page.
+    """
+    tempfile_ = await tempfile_repository.get(TempFileKind.PRINTING, innohassle_user_id, filename)
+    if tempfile_ is None:
+        raise HTTPException(404, "No such file. It was removed from our servers due to expiration")
+    return await tempfile_preview_response(request, tempfile_, page, size)
+
+
 @router.get("/get_printers")
 def get_printers(_innohassle_user_id: USER_AUTH) -> list[Printer]:
     return settings.api.printers_list
 
 
 @router.get("/get_printers_status")
-async def get_printers_status(_innohassle_user_id: USER_AUTH) -> list[PrinterStatus]:
+async def get_printers_status(_innohassle_user_id: USER_AUTH, max_age: float | None = None) -> list[PrinterStatus]:
+    """
+    Returns the latest status of every printer. Pass `max_age` (in seconds) to probe printers whose status is older
+    """
     result: list[PrinterStatus] = await asyncio.gather(
-        *(printing_repository.get_printer_status(printer) for printer in settings.api.printers_list)
+        *(printing_repository.get_printer_status(printer, max_age) for printer in settings.api.printers_list)
     )
 
     for status in result:
@@ -57,48 +164,187 @@ async def get_printers_status(_innohassle_user_id: USER_AUTH) -> list[PrinterSta
 
 
 @router.get("/get_printer_status")
-async def get_printer_status(printer_cups_name: str, _innohassle_user_id: USER_AUTH) -> PrinterStatus:
+async def get_printer_status(
+    printer_cups_name: str, _innohassle_user_id: USER_AUTH, max_age: float | None = None
+) -> PrinterStatus:
+    """
+    Returns the latest status of the printer. Pass `max_age` (in seconds) to probe the printer if its status is older
+    """
     printer = printing_repository.get_printer(printer_cups_name)
     if not printer:
         raise HTTPException(400, "No such printer")
-    status = await printing_repository.get_printer_status(printer)
+    status = await printing_repository.get_printer_status(printer, max_age)
     logger.info(f"Printer {printer.cups_name} status: {status}")
     return status
 
 
-@router.post("/prepare", responses={400: {"description": "Unsupported format"}})
-async def prepare_printing(file: UploadFile, innohassle_user_id: USER_AUTH) -> PreparePrintingResponse:
-    """
-    Convert a file to PDF and return the path to the converted file
-    """
-
+async def _ingest(file: UploadFile) -> tuple[IngestedFile, str]:
     if not file.size:
         raise HTTPException(400, "Empty file")
     if not file.filename:
         raise HTTPException(400, "No filename")
     ext = file.filename[file.filename.rfind(".") :].lower()
+    if ext not in [".pdf", ".doc", ".docx", ".png", ".txt", ".jpg", ".md", ".bmp", ".xlsx", ".xls", ".odt", ".ods"]:
+        raise HTTPException(400, f"no support of the {ext} format")
+
+    try:
+        ingested = await ingest_upload(file, settings.api.temp_dir, ext, settings.api.max_upload_size)
+    except UploadTooLargeError as e:
+        raise HTTPException(413, f"File is larger than {e.max_size // (1024 * 1024)} MB")
+    return ingested, ext
+
+
+async def _prepare(
+    innohassle_user_id: str, ingested: IngestedFile, ext: str, ticket: object | None = None
+) -> PreparePrintingResponse:
     if ext == ".pdf":
-        f = tempfile.NamedTemporaryFile(dir=settings.api.temp_dir, suffix=".pdf")
-        f.write(await file.read())
-        printing_repository.store_tempfile(innohassle_user_id, f)
-        return PreparePrintingResponse(filename=Path(f.name).name, pages=len(PyPDF2.PdfReader(f).pages))
-    elif ext in [".doc", ".docx", ".png", ".txt", ".jpg", ".md", ".bmp", ".xlsx", ".xls", ".odt", ".ods"]:
-        with (
-            tempfile.NamedTemporaryFile(dir=settings.api.temp_dir, suffix=ext) as in_f,
-            tempfile.NamedTemporaryFile(dir=settings.api.temp_dir, suffix=".pdf", delete=False) as out_f,
-        ):
-            in_f.write(await file.read())
-            in_f.flush()
-            # Run conversion in a background thread
-            await asyncio.to_thread(converting_repository.any2pdf, in_f.name, out_f.name)
-            in_f.close()
-            printing_repository.store_tempfile(innohassle_user_id, out_f)
-            return PreparePrintingResponse(filename=Path(out_f.name).name, pages=len(PyPDF2.PdfReader(out_f).pages))
+        try:
+            metadata = await documents_repository.get_metadata(ingested.path, ingested.sha256)
+            if metadata.needs_password:
+                raise HTTPException(400, "password-protected PDF")
+            await tempfile_repository.store(
+                TempFileKind.PRINTING, innohassle_user_id, ingested.path, pages=metadata.pages, sha256=metadata.sha256
+            )
+        except DocumentReadError:
+            os.unlink(ingested.path)
+            raise HTTPException(422, "The document is corrupted or cannot be converted")
+        except BaseException:
+            # The ingested file becomes the temp file only once it is stored
+            os.unlink(ingested.path)
+            raise
+        return PreparePrintingResponse(filename=Path(ingested.path).name, pages=metadata.pages)
     else:
-        raise HTTPException(400, f"no support of the {ext} format")
+        fd, outpath = tempfile.mkstemp(dir=settings.api.temp_dir, suffix=".pdf")
+        os.close(fd)
+        try:
+            if ext in IMAGE_EXTENSIONS:
+                metadata = await converting_repository.convert_image(ingested.path, ext, outpath)
+            elif ext in TEXT_EXTENSIONS:
+                metadata = await converting_repository.convert_text(ingested.path, ext, outpath)
+            else:
+                metadata = await converting_repository.convert(ingested.path, ingested.sha256, ext, outpath, ticket)
+        except ConverterPoolSaturatedError as e:
+            os.unlink(outpath)
+            raise HTTPException(
+                503, "The server is overloaded, try again later", headers={"Retry-After": str(e.retry_after)}
+            )
+        except ConversionTimeoutError:
+            os.unlink(outpath)
+            raise HTTPException(504, "Conversion took too long, the document may be too complex")
+        except ConversionFailedError:
+            os.unlink(outpath)
+            raise HTTPException(422, "The document is corrupted or cannot be converted")
+        except ConnectionError:
+            os.unlink(outpath)
+            raise HTTPException(503, "The converter is unavailable, try again later", headers={"Retry-After": "10"})
+        except BaseException:
+            os.unlink(outpath)
+            raise
+        finally:
+            os.unlink(ingested.path)
+        await tempfile_repository.store(
+            TempFileKind.PRINTING, innohassle_user_id, outpath, pages=metadata.pages, sha256=metadata.sha256
+        )
+        return PreparePrintingResponse(filename=Path(outpath).name, pages=metadata.pages)
+
+
+@router.post(
+    "/prepare",
+    response_model=PreparePrintingResponse,
+    responses={
+        200: {
+            "content": {"application/pdf": {}},
+            "description": "With `inline`, the converted PDF with `X-Filename` and `X-Pages` headers",
+        },
+        400: {"description": "Unsupported format"},
+        413: {"description": "File is too large"},
+        422: {"description": "The document cannot be converted"},
+        503: {"description": "All converters are busy or unavailable, see `Retry-After`"},
+        504: {"description": "Conversion took too long"},
+    },
+)
+async def prepare_printing(file: UploadFile, innohassle_user_id: USER_AUTH, inline: bool = False) -> Response:
+    """
+    Convert a file to PDF and return the path to the converted file.
 
+    With `inline`, the converted PDF itself is returned, so that the client does not need to download it
+    from /print/get_file. The filename and the number of pages are in `X-Filename` and `X-Pages` headers then.
+    """
+    ingested, ext = await _ingest(file)
+    result = await _prepare(innohassle_user_id, ingested, ext)
+    if not inline:
+        return result
+    return FileResponse(
+        os.path.join(settings.api.temp_dir, result.filename),
+        media_type="application/pdf",
+        headers={"X-Filename": result.filename, "X-Pages": str(result.pages)},
+    )
 
-@router.post("/print", responses={404: {"description": "No such file"}, 400: {"description": "No such printer"}})
+
+@router.post(
+    "/prepare_async",
+    responses={400: {"description": "Unsupported format"}, 413: {"description": "File is too large"}},
+)
+async def prepare_printing_async(file: UploadFile, innohassle_user_id: USER_AUTH) -> ConversionJob:
+    """
+    Start converting a file to PDF in the background. Follow the job with /print/prepare_status
+    or /print/prepare_events, the result is the same as of /print/prepare.
+
+    Jobs are kept in the memory of the API worker which runs them, so with several workers the follow-up requests
+    should reach the same worker (e.g. with sticky sessions), otherwise they get 404.
+    """
+    ingested, ext = await _ingest(file)
+    return conversion_jobs.submit(
+        innohassle_user_id, lambda ticket: _prepare(innohassle_user_id, ingested, ext, ticket)
+    )
+
+
+@router.get("/prepare_status", responses={404: {"description": "No such conversion job"}})
+async def prepare_status(job_id: str, innohassle_user_id: USER_AUTH) -> ConversionJob:
+    """
+    Returns the state of a conversion job started with /print/prepare_async
+    """
+    job = conversion_jobs.get(innohassle_user_id, job_id)
+    if job is None:
+        raise HTTPException(404, "No such conversion job")
+    return job
+
+
+@router.get(
+    "/prepare_events",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"text/event-stream": {}}, "description": "Stream of `ConversionJob`"},
+        404: {"description": "No such conversion job"},
+    },
+)
+async def prepare_events(job_id: str, innohassle_user_id: USER_AUTH) -> StreamingResponse:
+    """
+    Server-Sent Events stream of a conversion job. The current `ConversionJob` is sent right away and then every time
+    its state or queue position changes. The stream ends when the job is done or failed
+    """
+    if conversion_jobs.get(innohassle_user_id, job_id) is None:
+        raise HTTPException(404, "No such conversion job")
+
+    async def events():
+        async for job in conversion_jobs.watch(
+            innohassle_user_id, job_id, poll_interval=1, heartbeat_interval=JOB_EVENTS_HEARTBEAT_INTERVAL
+        ):
+            yield ": keep-alive\n\n" if job is None else f"data: {job.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post(
+    "/print",
+    responses={
+        404: {"description": "No such file"},
+        400: {"description": "No such printer or invalid page ranges"},
+        422: {"description": "The document cannot be prepared for printing"},
+    },
+)
 async def actual_print(
     filename: str,
     printer_cups_name: str,
@@ -106,30 +352,108 @@ async def actual_print(
     printing_options: PrintingOptions = Body(PrintingOptions(), embed=True),
 ) -> int:
     """
-    Returns job identifier
+    Returns job identifier as soon as the job is created in CUPS. The document is sent to CUPS in the background,
+    see `upload_progress` in the job status.
     """
     logger.info(f"Printing options: {printing_options}")
 
-    if (innohassle_user_id, filename) in printing_repository.tempfiles:
+    tempfile_ = await tempfile_repository.get(TempFileKind.PRINTING, innohassle_user_id, filename)
+    if tempfile_ is not None:
         printer = printing_repository.get_printer(printer_cups_name)
         if not printer:
             raise HTTPException(400, "No such printer")
-        job_id = printing_repository.print_file(innohassle_user_id, filename, printer, printing_options)
+        try:
+            job_id = await printing_repository.print_file(tempfile_, printer, printing_options)
+        except InvalidPageRangesError as e:
+            raise HTTPException(400, str(e))
+        except PrepressFailedError as e:
+            logger.warning(f"Failed to prepare {tempfile_.path} for printing: {e}")
+            raise HTTPException(422, "The document cannot be prepared for printing")
         logger.info(f"Job {job_id} has started")
         return job_id
     else:
         raise HTTPException(404, "No such file. It was removed from our servers due to expiration")
 
 
+@router.post(
+    "/layout",
+    responses={
+        404: {"description": "No such file"},
+        400: {"description": "Invalid page ranges"},
+        422: {"description": "The document cannot be read"},
+    },
+)
+async def get_print_layout(
+    filename: str,
+    innohassle_user_id: USER_AUTH,
+    printing_options: PrintingOptions = Body(PrintingOptions(), embed=True),
+) -> PrintLayout:
+    """
+    Returns the exact number of sheets which /print/print would print with these options
+    """
+    tempfile_ = await tempfile_repository.get(TempFileKind.PRINTING, innohassle_user_id, filename)
+    if tempfile_ is None:
+        raise HTTPException(404, "No such file. It was removed from our servers due to expiration")
+    try:
+        return await printing_repository.prepress.layout(tempfile_, printing_options)
+    except InvalidPageRangesError as e:
+        raise HTTPException(400, str(e))
+    except PrepressFailedError as e:
+        logger.warning(f"Failed to read {tempfile_.path}: {e}")
+        raise HTTPException(422, "The document cannot be read")
+
+
+@router.post(
+    "/layout_preview",
+    responses={
+        200: {"content": {"image/jpeg": {}}, "description": "JPEG thumbnail"},
+        404: {"description": "No such file or sheet"},
+        400: {"description": "Invalid page ranges"},
+        422: {"description": "The document cannot be prepared for printing or rendered"},
+    },
+)
+async def get_print_layout_preview(
+    filename: str,
+    innohassle_user_id: USER_AUTH,
+    printing_options: PrintingOptions = Body(PrintingOptions(), embed=True),
+    sheet: int = 1,
+    size: int = Query(320, ge=16, le=1024),
+) -> Response:
+    """
+    Returns a JPEG thumbnail of a sheet side as /print/print would print it with these options, starting from 1
+    """
+    tempfile_ = await tempfile_repository.get(TempFileKind.PRINTING, innohassle_user_id, filename)
+    if tempfile_ is None:
+        raise HTTPException(404, "No such file. It was removed from our servers due to expiration")
+    try:
+        prepared = await printing_repository.prepress.prepare(tempfile_, printing_options)
+    except InvalidPageRangesError as e:
+        raise HTTPException(400, str(e))
+    except PrepressFailedError as e:
+        logger.warning(f"Failed to prepare {tempfile_.path} for printing: {e}")
+        raise HTTPException(422, "The document cannot be prepared for printing")
+    try:
+        if not 1 <= sheet <= prepared.pages:
+            raise HTTPException(404, "No such sheet")
+        thumbnail = await documents_repository.get_thumbnail(prepared.path, prepared.sha256, sheet - 1, size)
+    except DocumentReadError as e:
+        logger.warning(f"Failed to render a thumbnail of {prepared.path}: {e}")
+        raise HTTPException(422, "The document cannot be rendered")
+    finally:
+        if prepared.temporary:
+            os.unlink(prepared.path)
+    return Response(thumbnail, media_type="image/jpeg")
+
+
 @router.post("/cancel", responses={404: {"description": "No such file"}, 400: {"description": "No such printer"}})
 async def cancel_printing(job_id: int, _innohassle_user_id: USER_AUTH) -> None:
     logger.info(f"Job {job_id} cancelled")
-    printing_repository.cancel_job(job_id)
+    await printing_repository.cancel_job(job_id)
 
 
 @router.post("/cancel_preparation", responses={404: {"description": "No such file"}})
 async def cancel_preparation(filename: str, innohassle_user_id: USER_AUTH) -> None:
-    if not printing_repository.remove_tempfile(innohassle_user_id, filename):
+    if not await tempfile_repository.remove(TempFileKind.PRINTING, innohassle_user_id, filename):
         raise HTTPException(404, "No such file. It was removed from our servers due to expiration")
 
 
@@ -138,8 +462,7 @@ async def get_printer_attributes(
     _innohassle_user_id: USER_AUTH,
     printer_cups_name: str,
 ) -> dict[str, Any]:
-    cups_server = printing_repository.server
-    return cups_server.getPrinterAttributes(printer_cups_name)
+    return await printing_repository.cups.call("getPrinterAttributes", printer_cups_name)
 
 
 @router.post("/debug/createJob")
@@ -148,11 +471,10 @@ async def create_job(
     printer: str,
     file_upload_file: UploadFile,
 ) -> int:
-    cups_server = printing_repository.server
     with tempfile.NamedTemporaryFile(dir=settings.api.temp_dir, suffix=".pdf") as f:
         f.write(await file_upload_file.read())
         f.flush()
-        job_id = cups_server.createJob(printer, f.name, {})
+        job_id = await printing_repository.cups.call("createJob", printer, f.name, {}, retry=False)
         logger.info(f"Job {job_id} has started")
         return job_id
 
@@ -162,5 +484,36 @@ async def get_job_attributes(
     _innohassle_user_id: USER_AUTH,
     job_id: int,
 ) -> dict[str, Any]:
-    cups_server = printing_repository.server
-    return cups_server.getJobAttributes(job_id)
+    return await printing_repository.cups.call("getJobAttributes", job_id)
+
+
+@router.get("/debug/cups_metrics")
+async def get_cups_metrics(_innohassle_user_id: USER_AUTH) -> dict[str, CupsCallMetrics]:
+    """
+    Returns latency metrics of calls to CUPS by method name
+    """
+    return printing_repository.cups.metrics
+
+
+@router.get("/debug/converter_metrics")
+async def get_converter_metrics(_innohassle_user_id: USER_AUTH) -> dict[str, ConversionMetrics]:
+    """
+    Returns metrics of conversions to PDF by file extension, including timeouts
+    """
+    return converting_repository.metrics
+
+
+@router.get("/debug/prepress_metrics")
+async def get_prepress_metrics(_innohassle_user_id: USER_AUTH) -> OptimizationMetrics:
+    """
+    Returns metrics of optimizations of documents before printing: sizes before and after, timing and cache hits
+    """
+    return printing_repository.prepress.metrics
+
+
+@router.get("/debug/tempfiles_stats")
+async def get_tempfiles_stats(_innohassle_user_id: USER_AUTH) -> ExpiryStats:
+    """
+    Returns the number of tempfiles and scan jobs waiting for expiration, and the size of the files on disk
+    """
+    return expiry_scheduler.stats()
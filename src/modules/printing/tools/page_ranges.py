@@ -0,0 +1,42 @@
+__all__ = ["InvalidPageRangesError", "format_page_ranges", "parse_page_ranges"]
+
+import re
+
+_RANGE = re.compile(r"^\s*(\d+)\s*(?:-\s*(\d*)\s*)?$")
+
+
+class InvalidPageRangesError(ValueError):
+    pass
+
+
+def parse_page_ranges(page_ranges: str, pages: int) -> list[int]:
+    """
+    Returns the pages selected by IPP page ranges like "1-3,5,7-", starting from 1, in ascending order
+    and without duplicates, the same way as CUPS prints them. Pages beyond the end of the document are ignored.
+
+    :raises InvalidPageRangesError: if the page ranges cannot be parsed
+    """
+    selected = set()
+    for part in page_ranges.split(","):
+        match = _RANGE.match(part)
+        if match is None:
+            raise InvalidPageRangesError(f"Invalid page range: {part!r}")
+        start = int(match[1])
+        end = start if match[2] is None else int(match[2]) if match[2] else pages
+        if start < 1 or end < start:
+            raise InvalidPageRangesError(f"Invalid page range: {part!r}")
+        selected.update(range(start, min(end, pages) + 1))
+    return sorted(selected)
+
+
+def format_page_ranges(pages: list[int]) -> str:
+    """
+    Inverse of `parse_page_ranges`: [1, 2, 3, 5] -> "1-3,5"
+    """
+    ranges = []
+    for page in pages:
+        if ranges and ranges[-1][1] == page - 1:
+            ranges[-1][1] = page
+        else:
+            ranges.append([page, page])
+    return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
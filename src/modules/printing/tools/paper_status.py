@@ -0,0 +1,61 @@
+__all__ = ["parse_input_tray_percentage", "parse_paper_percentage"]
+
+import re
+from collections.abc import Iterable
+from html import unescape
+
+from src.api.logging_ import logger
+
+_INPUT_TRAY_LABEL = re.compile(r"<font\b[^>]*>printer-input-tray:</font\s*>", re.IGNORECASE)
+_BR = re.compile(r"<br\b", re.IGNORECASE)
+_FONT = re.compile(r"<font\b[^>]*>(.*?)</font\s*>", re.IGNORECASE | re.DOTALL)
+_TAG = re.compile(r"<[^>]*>")
+_LEVEL = re.compile(r"level=(\d+)")
+_MAXCAPACITY = re.compile(r"maxcapacity=(\d+)")
+
+
+def parse_paper_percentage(html: str) -> int | None:
+    """
+    Extract the paper level of the Cassette tray from the printer status page.
+
+    The page lists IPP attributes as `<font>` elements separated by `<br>`, the line of "printer-input-tray:" contains
+    one `<font>` per tray, like "type=sheetFeedAutoRemovableTray;...;maxcapacity=500;level=250;...;name=Cassette 1;".
+    """
+    label = _INPUT_TRAY_LABEL.search(html)
+    if label is None:
+        return None
+
+    # find previous <br>
+    line_start = None
+    for line_start in _BR.finditer(html, 0, label.start()):
+        pass
+    if line_start is None:
+        logger.warning("Previous_br is None")
+        return None
+    # find next <br>
+    line_end = _BR.search(html, label.end())
+    if line_end is None:
+        logger.warning("Next_br is None")
+        return None
+
+    fonts = _FONT.finditer(html, line_start.end(), line_end.start())
+    return parse_input_tray_percentage(unescape(_TAG.sub("", font.group(1))) for font in fonts)
+
+
+def parse_input_tray_percentage(trays: Iterable[str]) -> int | None:
+    """
+    Extract the paper level of the Cassette tray from "printer-input-tray" values.
+    """
+    # Find Cassette tray and get its level and maxcapacity
+    for tray in trays:
+        if "Cassette" in tray:
+            level_match = _LEVEL.search(tray)
+            maxcapacity_match = _MAXCAPACITY.search(tray)
+
+            if level_match and maxcapacity_match:
+                level = int(level_match.group(1))
+                maxcapacity = int(maxcapacity_match.group(1))
+
+                if maxcapacity > 0:
+                    return int((level / maxcapacity) * 100)
+    return None
@@ -1,8 +1,4 @@
-import asyncio
-import os
-import pathlib
-from asyncio import Task
-from tempfile import _TemporaryFileWrapper
+import functools
 
 import httpx
 
@@ -11,6 +7,7 @@ from src.api.logging_ import logger
 from src.config import settings
 from src.config_schema import Scanner
 from src.modules.scanning.entity_models import ScannerStatus, ScanningOptions
+from src.modules.tempfiles.scheduler import expiry_scheduler
 
 SCAN_OPTIONS_TEMPLATE = """
 <?xml version="1.0" encoding="UTF-8"?>
@@ -39,55 +36,25 @@ SCAN_OPTIONS_TEMPLATE = """
 
 class ScanningRepository:
     def __init__(self):
-        self.tempfiles: dict[tuple[str, str], tuple[_TemporaryFileWrapper[bytes], Task[None]]] = {}
-        self.job_options: dict[tuple[str, str], tuple[ScanningOptions, Task[None]]] = {}
-        self.tempfile_expiration_time = 6 * 60 * 60
-
-    def get_tempfile_path(self, innohassle_user_id, filename):
-        return self.tempfiles[(innohassle_user_id, filename)][0].name
+        self.job_options: dict[tuple[str, str], ScanningOptions] = {}
+        self.job_options_expiration_time = 6 * 60 * 60
 
     def store_job_options(self, innohassle_user_id: USER_AUTH, job_id: str, scanning_options: ScanningOptions):
-        self.job_options[(innohassle_user_id, job_id)] = (
-            scanning_options,
-            asyncio.create_task(self.wait_for_job_expiration(innohassle_user_id, job_id)),
+        self.job_options[(innohassle_user_id, job_id)] = scanning_options
+        expiry_scheduler.schedule(
+            ("scanning_job", innohassle_user_id, job_id),
+            self.job_options_expiration_time,
+            functools.partial(self.retrieve_job_options, innohassle_user_id, job_id),
         )
 
-    async def wait_for_job_expiration(self, innohassle_user_id: USER_AUTH, job_id: str):
-        await asyncio.sleep(self.tempfile_expiration_time)
-        self.retrieve_job_options(innohassle_user_id, job_id, expired=True)
-
-    def retrieve_job_options(self, innohassle_user_id: USER_AUTH, job_id: str, expired=False):
+    def retrieve_job_options(self, innohassle_user_id: USER_AUTH, job_id: str) -> ScanningOptions | None:
+        """
+        Returns and forgets the options of the job. Options are kept in memory, so they are known only to the worker
+        which has started the job
+        """
         if (innohassle_user_id, job_id) in self.job_options:
-            if not expired:
-                self.job_options[(innohassle_user_id, job_id)][1].cancel()
-            job_options = self.job_options[(innohassle_user_id, job_id)][0]
-            del self.job_options[(innohassle_user_id, job_id)]
-            return job_options
-
-    def store_tempfile(self, innohassle_user_id: USER_AUTH, f: _TemporaryFileWrapper):
-        self.tempfiles[(innohassle_user_id, pathlib.Path(f.name).name)] = (
-            f,
-            asyncio.create_task(self.wait_for_tempfile_expiration(innohassle_user_id, f)),
-        )
-
-    async def wait_for_tempfile_expiration(self, innohassle_user_id: USER_AUTH, f: _TemporaryFileWrapper):
-        await asyncio.sleep(self.tempfile_expiration_time)
-        self.remove_tempfile(innohassle_user_id, pathlib.Path(f.name).name, expired=True)
-
-    def retrieve_tempfile(self, innohassle_user_id: USER_AUTH, filename: str):
-        return self.tempfiles[(innohassle_user_id, filename)][0]
-
-    def remove_tempfile(self, innohassle_user_id: USER_AUTH, filename: str, expired=False):
-        if (innohassle_user_id, filename) in self.tempfiles:
-            self.tempfiles[(innohassle_user_id, filename)][0].close()
-            try:
-                os.unlink(self.get_tempfile_path(innohassle_user_id, filename))
-            except FileNotFoundError:
-                pass
-            if not expired:
-                self.tempfiles[(innohassle_user_id, filename)][1].cancel()
-            del self.tempfiles[(innohassle_user_id, filename)]
-            return True
+            expiry_scheduler.cancel(("scanning_job", innohassle_user_id, job_id))
+            return self.job_options.pop((innohassle_user_id, job_id))
 
     def get_scanner(self, scanner_name: str) -> Scanner | None:
         for elem in settings.api.scanners_list:
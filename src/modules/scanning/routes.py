@@ -2,17 +2,21 @@ import asyncio
 import tempfile
 from pathlib import Path
 
-import PyPDF2
-from fastapi import APIRouter, Body, HTTPException
-from starlette.responses import FileResponse, Response
+from fastapi import APIRouter, Body, HTTPException, Query
+from starlette.requests import Request
+from starlette.responses import Response
 
 from src.api.dependencies import USER_AUTH
 from src.config import settings
 from src.config_schema import Scanner
+from src.modules.documents.repository import documents_repository
 from src.modules.scanning.entity_models import ScannerStatus, ScanningOptions, ScanningResult
 from src.modules.scanning.repository import scanning_repository
 from src.modules.scanning.tools.auto_crop import autocrop_pdf_bytes
-from src.modules.scanning.tools.document_merger import merge_documents
+from src.modules.scanning.tools.document_merger import merge_documents, remove_last_page
+from src.modules.tempfiles.repository import tempfile_repository
+from src.modules.tempfiles.responses import tempfile_preview_response, tempfile_response
+from src.storages.mongo.tempfiles import TempFileKind
 
 router = APIRouter(prefix="/scan", tags=["Scan"])
 
@@ -22,17 +26,52 @@ async def get_scanners(_innohassle_user_id: USER_AUTH) -> list[Scanner]:
     return settings.api.scanners_list
 
 
-@router.get("/get_file", responses={404: {"description": "No such file"}})
-def get_file(filename: str, innohassle_user_id: USER_AUTH) -> FileResponse:
-    if (innohassle_user_id, filename) in scanning_repository.tempfiles:
-        return FileResponse(
-            scanning_repository.get_tempfile_path(innohassle_user_id, filename),
-            headers={"Content-Disposition": f"attachment; filename={filename}"},
-        )
+@router.get(
+    "/get_file",
+    responses={
+        200: {"content": {"application/pdf": {}}},
+        206: {"description": "Requested range of the file"},
+        304: {"description": "The file has not changed, see `ETag`"},
+        404: {"description": "No such file"},
+    },
+)
+async def get_file(filename: str, innohassle_user_id: USER_AUTH, request: Request) -> Response:
+    """
+    Returns the file. Supports `If-None-Match` with the `ETag` from a previous response, and `Range` requests
+    """
+    tempfile_ = await tempfile_repository.get(TempFileKind.SCANNING, innohassle_user_id, filename)
+    if tempfile_ is not None:
+        return tempfile_response(request, tempfile_)
     else:
         raise HTTPException(404, "No such file. It was removed from our servers due to expiration")
 
 
+@router.get(
+    "/preview",
+    responses={
+        200: {"content": {"image/jpeg": {}}, "description": "JPEG thumbnail"},
+        304: {"description": "The thumbnail has not changed, see `ETag`"},
+        404: {"description": "No such file or page"},
+        422: {"description": "The document cannot be rendered"},
+    },
+)
+async def get_preview(
+    filename: str,
+    innohassle_user_id: USER_AUTH,
+    request: Request,
+    page: int = -1,
+    size: int = Query(320, ge=16, le=1024),
+) -> Response:
+    """
+    Returns a JPEG thumbnail of the page which fits into `size`×`size` pixels, the last scanned page by default.
+    Pages are numbered from 1, -1 is the last page.
+    """
+    tempfile_ = await tempfile_repository.get(TempFileKind.SCANNING, innohassle_user_id, filename)
+    if tempfile_ is None:
+        raise HTTPException(404, "No such file. It was removed from our servers due to expiration")
+    return await tempfile_preview_response(request, tempfile_, page, size)
+
+
 @router.post("/manual/start_scan")
 async def manual_start_scan(
     innohassle_user_id: USER_AUTH,
@@ -68,30 +107,37 @@ async def manual_wait_and_merge(
     job_id: str,
     prev_filename: str | None = None,
 ) -> ScanningResult | None:
-    if prev_filename and (innohassle_user_id, prev_filename) not in scanning_repository.tempfiles:
-        raise HTTPException(404, "No such scan")
+    prev_tempfile = None
+    if prev_filename:
+        prev_tempfile = await tempfile_repository.get(TempFileKind.SCANNING, innohassle_user_id, prev_filename)
+        if prev_tempfile is None:
+            raise HTTPException(404, "No such scan")
 
     scanner = scanning_repository.get_scanner(scanner_name)
     if not scanner:
         raise HTTPException(404, "No such scanner")
+    scanning_options = scanning_repository.retrieve_job_options(innohassle_user_id, job_id)
+    if scanning_options is None:
+        # E.g. the job was started by another worker, or its options have expired
+        raise HTTPException(404, "No such scan job")
 
     document = await scanning_repository.fetch_scan_one(scanner, job_id)
     if not document:
         raise HTTPException(404, "The scan document was not found")
-    if scanning_repository.retrieve_job_options(innohassle_user_id, job_id).crop == "true":
+    if scanning_options.crop == "true":
         document = autocrop_pdf_bytes(document)
 
-    if prev_filename:
-        tempfile_f = scanning_repository.retrieve_tempfile(innohassle_user_id, prev_filename)
-        out_f = await asyncio.to_thread(merge_documents, document, tempfile_f)
-        scanning_repository.remove_tempfile(innohassle_user_id, prev_filename)
-        scanning_repository.store_tempfile(innohassle_user_id, out_f)
+    if prev_tempfile:
+        out_f = await asyncio.to_thread(merge_documents, document, prev_tempfile.path)
+        await tempfile_repository.remove(TempFileKind.SCANNING, innohassle_user_id, prev_tempfile.filename)
     else:
         with tempfile.NamedTemporaryFile(dir=settings.api.temp_dir, suffix=".pdf", delete=False) as out_f:
             out_f.write(document)
-            out_f.flush()
-            scanning_repository.store_tempfile(innohassle_user_id, out_f)
-    return ScanningResult(filename=Path(out_f.name).name, page_count=len(PyPDF2.PdfReader(out_f.name).pages))
+    metadata = await documents_repository.get_metadata(out_f.name)
+    await tempfile_repository.store(
+        TempFileKind.SCANNING, innohassle_user_id, out_f.name, pages=metadata.pages, sha256=metadata.sha256
+    )
+    return ScanningResult(filename=Path(out_f.name).name, page_count=metadata.pages)
 
 
 @router.post("/manual/remove_last_page")
@@ -99,19 +145,17 @@ async def manual_remove_last_page(
     filename: str,
     innohassle_user_id: USER_AUTH,
 ) -> ScanningResult:
-    if (innohassle_user_id, filename) not in scanning_repository.tempfiles:
+    tempfile_ = await tempfile_repository.get(TempFileKind.SCANNING, innohassle_user_id, filename)
+    if tempfile_ is None:
         raise HTTPException(404, "No such scan")
 
-    tempfile_f = scanning_repository.retrieve_tempfile(innohassle_user_id, filename)
-    infile = PyPDF2.PdfReader(tempfile_f.name)
-    with tempfile.NamedTemporaryFile(dir=settings.api.temp_dir, suffix=".pdf", delete=False) as out_f:
-        outfile = PyPDF2.PdfWriter(out_f)
-        for page in infile.pages[:-1]:
-            outfile.add_page(page)
-        outfile.write(out_f)
-        scanning_repository.store_tempfile(innohassle_user_id, out_f)
-    scanning_repository.remove_tempfile(innohassle_user_id, filename)
-    return ScanningResult(filename=Path(out_f.name).name, page_count=len(PyPDF2.PdfReader(out_f.name).pages))
+    out_f = await asyncio.to_thread(remove_last_page, tempfile_.path)
+    metadata = await documents_repository.get_metadata(out_f.name)
+    await tempfile_repository.store(
+        TempFileKind.SCANNING, innohassle_user_id, out_f.name, pages=metadata.pages, sha256=metadata.sha256
+    )
+    await tempfile_repository.remove(TempFileKind.SCANNING, innohassle_user_id, filename)
+    return ScanningResult(filename=Path(out_f.name).name, page_count=metadata.pages)
 
 
 @router.post("/manual/delete_file")
@@ -119,11 +163,9 @@ async def manual_delete_file(
     filename: str,
     innohassle_user_id: USER_AUTH,
 ):
-    if (innohassle_user_id, filename) not in scanning_repository.tempfiles:
+    if not await tempfile_repository.remove(TempFileKind.SCANNING, innohassle_user_id, filename):
         raise HTTPException(404, "No such scan")
 
-    scanning_repository.remove_tempfile(innohassle_user_id, filename)
-
 
 @router.get("/debug/get_scanner_capabilities")
 async def get_scanner_capabilities_debug(
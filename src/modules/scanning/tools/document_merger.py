@@ -6,15 +6,29 @@ import PyPDF2
 from src.config import settings
 
 
-def merge_documents(document: bytes, tempfile_f):
+def merge_documents(document: bytes, path: str):
     """
-    Merge documents tempfile_f and document to out_f using PyPDF2
+    Merge documents at path and document to out_f using PyPDF2
     """
 
     with tempfile.NamedTemporaryFile(dir=settings.api.temp_dir, suffix=".pdf", delete=False) as out_f:
         merger = PyPDF2.PdfMerger()
-        merger.append(tempfile_f.name)
+        merger.append(path)
         merger.append(BytesIO(document))
         merger.write(out_f.name)
         merger.close()
         return out_f
+
+
+def remove_last_page(path: str):
+    """
+    Copy the document at path without its last page to out_f using PyPDF2
+    """
+
+    infile = PyPDF2.PdfReader(path)
+    with tempfile.NamedTemporaryFile(dir=settings.api.temp_dir, suffix=".pdf", delete=False) as out_f:
+        outfile = PyPDF2.PdfWriter(out_f)
+        for page in infile.pages[:-1]:
+            outfile.add_page(page)
+        outfile.write(out_f)
+        return out_f
@@ -0,0 +1,17 @@
+from src.pydantic_base import BaseSchema
+
+
+class ExpiryStats(BaseSchema):
+    entries: int
+    "Number of entries waiting for expiration"
+    bytes_on_disk: int
+    "Total size of the files behind the entries, in bytes"
+
+
+class IngestedFile(BaseSchema):
+    path: str
+    "Path of the file in the temp directory"
+    size: int
+    "Size of the file in bytes"
+    sha256: str
+    "SHA-256 of the content, hex encoded"
@@ -0,0 +1,55 @@
+__all__ = ["UploadTooLargeError", "ingest_upload"]
+
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO
+
+from fastapi import UploadFile
+
+from src.modules.tempfiles.entity_models import IngestedFile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    def __init__(self, max_size: int):
+        super().__init__(f"File is larger than {max_size} bytes")
+        self.max_size = max_size
+
+
+def _copy_to_file(src: BinaryIO, dst_path: str, max_size: int) -> tuple[int, str]:
+    digest = hashlib.sha256()
+    size = 0
+    with open(dst_path, "wb") as dst:
+        while chunk := src.read(CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLargeError(max_size)
+            digest.update(chunk)
+            dst.write(chunk)
+    return size, digest.hexdigest()
+
+
+async def ingest_upload(upload: UploadFile, temp_dir: str, suffix: str, max_size: int) -> IngestedFile:
+    """
+    Copy the uploaded file to `temp_dir` chunk by chunk in a worker thread, computing SHA-256 on the way.
+
+    The multipart parser has already spooled the upload to an anonymous temporary file (or memory, if it is small),
+    which cannot be renamed, so it is copied without reading it into memory as a whole.
+
+    :raises UploadTooLargeError: if the file is larger than `max_size`, nothing is left on disk then
+    """
+    if upload.size is not None and upload.size > max_size:
+        raise UploadTooLargeError(max_size)
+
+    fd, path = tempfile.mkstemp(dir=temp_dir, suffix=suffix)
+    os.close(fd)
+    try:
+        await upload.seek(0)
+        size, sha256 = await asyncio.to_thread(_copy_to_file, upload.file, path, max_size)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return IngestedFile(path=path, size=size, sha256=sha256)
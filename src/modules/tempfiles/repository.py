@@ -0,0 +1,159 @@
+__all__ = ["TempfileRepository", "hash_file", "tempfile_repository"]
+
+import asyncio
+import datetime
+import hashlib
+import os
+import pathlib
+
+from src.api.logging_ import logger
+from src.config import settings
+from src.modules.tempfiles.scheduler import expiry_scheduler
+from src.storages.mongo.tempfiles import TempFile, TempFileKind
+
+
+def hash_file(path: str) -> tuple[int, str]:
+    """
+    Returns size and SHA-256 of the file
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+class TempfileRepository:
+    """
+    Registry of user files in the temp directory, kept in MongoDB so that every API worker sees the same files
+    and they survive restarts. Each worker schedules the removal of files it knows about, and periodically removes
+    expired files of all workers, e.g. of a worker which has exited. The removal itself is atomic, so a file is unlinked
+    by exactly one worker.
+    """
+
+    def __init__(self, temp_dir: str, expiration_time: float):
+        self.temp_dir = temp_dir
+        self.expiration_time = expiration_time
+        self._sweeper: asyncio.Task[None] | None = None
+
+    async def store(
+        self,
+        kind: TempFileKind,
+        innohassle_user_id: str,
+        path: str,
+        pages: int | None = None,
+        sha256: str | None = None,
+    ) -> TempFile:
+        """
+        Register a file which is already written to the temp directory
+        """
+        if sha256 is None:
+            size, sha256 = await asyncio.to_thread(hash_file, path)
+        else:
+            size = os.path.getsize(path)
+        tempfile = TempFile(
+            kind=kind,
+            innohassle_user_id=innohassle_user_id,
+            filename=pathlib.Path(path).name,
+            path=os.path.abspath(path),
+            size=size,
+            pages=pages,
+            sha256=sha256,
+            expires_at=datetime.datetime.now(datetime.UTC) + datetime.timedelta(seconds=self.expiration_time),
+        )
+        await tempfile.insert()
+        self._schedule_expiration(tempfile)
+        return tempfile
+
+    async def get(self, kind: TempFileKind, innohassle_user_id: str, filename: str) -> TempFile | None:
+        return await TempFile.find_one(
+            TempFile.kind == kind,
+            TempFile.innohassle_user_id == innohassle_user_id,
+            TempFile.filename == filename,
+            TempFile.expires_at > datetime.datetime.now(datetime.UTC),
+        )
+
+    async def remove(self, kind: TempFileKind, innohassle_user_id: str, filename: str) -> bool:
+        """
+        Unregister and delete the file. Returns False if there is no such file (e.g. it was removed by another worker)
+        """
+        tempfile = await TempFile.find_one(
+            TempFile.kind == kind,
+            TempFile.innohassle_user_id == innohassle_user_id,
+            TempFile.filename == filename,
+        )
+        if tempfile is None:
+            return False
+        return await self._delete(tempfile)
+
+    async def _delete(self, tempfile: TempFile) -> bool:
+        expiry_scheduler.cancel(self._expiration_key(tempfile))
+        result = await tempfile.delete()
+        if result is None or result.deleted_count == 0:
+            return False
+        try:
+            os.unlink(tempfile.path)
+        except FileNotFoundError:
+            pass
+        return True
+
+    def _expiration_key(self, tempfile: TempFile):
+        return "tempfile", tempfile.kind, tempfile.innohassle_user_id, tempfile.filename
+
+    def _schedule_expiration(self, tempfile: TempFile):
+        delay = (tempfile.expires_at - datetime.datetime.now(datetime.UTC)).total_seconds()
+        expiry_scheduler.schedule(
+            self._expiration_key(tempfile), max(0.0, delay), lambda: self._delete(tempfile), size=tempfile.size
+        )
+
+    async def remove_expired(self) -> int:
+        """
+        Delete expired files of all workers. Returns the number of deleted files
+        """
+        removed = 0
+        async for tempfile in TempFile.find(TempFile.expires_at <= datetime.datetime.now(datetime.UTC)):
+            if await self._delete(tempfile):
+                removed += 1
+        return removed
+
+    def start_sweeper(self, interval: float):
+        if self._sweeper is None and interval > 0:
+            self._sweeper = asyncio.create_task(self._sweep(interval))
+
+    async def _sweep(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                removed = await self.remove_expired()
+            except Exception as e:
+                logger.warning(f"Failed to remove expired files: {e!r}")
+            else:
+                if removed:
+                    logger.info(f"Removed {removed} expired files")
+
+    def stop_sweeper(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    async def restore(self):
+        """
+        Schedule the expiration of registered files and delete files in the temp directory which are not registered,
+        e.g. left after a crash. Called on startup of every worker.
+        """
+        registered = set()
+        async for tempfile in TempFile.find_all():
+            registered.add(tempfile.path)
+            self._schedule_expiration(tempfile)
+
+        for path in pathlib.Path(self.temp_dir).iterdir():
+            if path.is_file() and path.name != ".gitkeep" and str(path.absolute()) not in registered:
+                # Other workers may be writing the file right now, so leave recently modified files alone
+                if datetime.datetime.now().timestamp() - path.stat().st_mtime > self.expiration_time:
+                    logger.info(f"Removing unregistered file {path}")
+                    path.unlink(missing_ok=True)
+
+
+tempfile_repository: TempfileRepository = TempfileRepository(settings.api.temp_dir, expiration_time=6 * 60 * 60)
@@ -0,0 +1,60 @@
+__all__ = ["tempfile_preview_response", "tempfile_response"]
+
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+from src.api.logging_ import logger
+from src.modules.documents.repository import DocumentReadError, documents_repository
+from src.storages.mongo.tempfiles import TempFileSchema
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as required for If-None-Match
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def tempfile_response(request: Request, tempfile: TempFileSchema) -> Response:
+    """
+    Send the file with a strong ETag made of its SHA-256. Returns 304 if the client already has this content.
+
+    Range requests (and If-Range) are served by `FileResponse`, which also hands the file to the server for
+    zero-copy transfer when the server supports the ASGI pathsend extension.
+    """
+    etag = f'"{tempfile.sha256}"'
+    # Files are never modified in place, but the client should still check that the file has not expired
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(
+        tempfile.path,
+        headers={**headers, "Content-Disposition": f"attachment; filename={tempfile.filename}"},
+    )
+
+
+async def tempfile_preview_response(request: Request, tempfile: TempFileSchema, page: int, size: int) -> Response:
+    """
+    Send a JPEG thumbnail of the page of the file, see `tempfile_response` for caching
+
+    :param page: number of the page starting from 1, or -1 for the last page
+    """
+    if page == 0:
+        raise HTTPException(400, "Pages are numbered from 1")
+    etag = f'"{tempfile.sha256}-{page}-{size}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    try:
+        thumbnail = await documents_repository.get_thumbnail(
+            tempfile.path, tempfile.sha256, page - 1 if page > 0 else page, size
+        )
+    except IndexError:
+        raise HTTPException(404, "No such page")
+    except DocumentReadError as e:
+        logger.warning(f"Failed to render a thumbnail of {tempfile.path}: {e}")
+        raise HTTPException(422, "The document cannot be rendered")
+    return Response(thumbnail, media_type="image/jpeg", headers=headers)
@@ -0,0 +1,126 @@
+__all__ = ["ExpiryScheduler", "expiry_scheduler"]
+
+import asyncio
+import heapq
+import inspect
+import itertools
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass, field
+from typing import Any
+
+from src.api.logging_ import logger
+from src.modules.tempfiles.entity_models import ExpiryStats
+
+
+@dataclass(order=True)
+class _Entry:
+    deadline: float
+    seq: int
+    key: Hashable = field(compare=False)
+    callback: Callable[[], Any] = field(compare=False)
+    size: int = field(compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+
+class ExpiryScheduler:
+    """
+    Calls a callback when its entry expires. All entries are kept in a min-heap by deadline and are served by
+    a single background task, which sleeps until the nearest deadline.
+
+    Scheduling is O(log n). Cancelled entries are only marked and are dropped when they reach the top of the heap,
+    or all at once when they make up more than a half of the heap.
+    """
+
+    def __init__(self):
+        self._heap: list[_Entry] = []
+        self._entries: dict[Hashable, _Entry] = {}
+        self._seq = itertools.count()
+        self._bytes_on_disk = 0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        # Tasks of async callbacks which are still running
+        self._callback_tasks: set[asyncio.Task] = set()
+
+    def schedule(self, key: Hashable, delay: float, callback: Callable[[], Any], size: int = 0):
+        """
+        Call `callback` after `delay` seconds, unless the entry is cancelled. Replaces an entry with the same key.
+        If the callback returns an awaitable, it is run as a task.
+
+        :param size: size of the file behind the entry, for the statistics
+        """
+        self.cancel(key)
+        loop = asyncio.get_running_loop()
+        entry = _Entry(loop.time() + delay, next(self._seq), key, callback, size)
+        self._entries[key] = entry
+        self._bytes_on_disk += size
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()  # the nearest deadline has changed
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def cancel(self, key: Hashable) -> bool:
+        """
+        Forget the entry without calling its callback. Returns False if there is no such entry
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry.cancelled = True
+        self._bytes_on_disk -= entry.size
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [e for e in self._heap if not e.cancelled]
+            heapq.heapify(self._heap)
+        return True
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> ExpiryStats:
+        return ExpiryStats(entries=len(self._entries), bytes_on_disk=self._bytes_on_disk)
+
+    def _pop_expired(self, now: float) -> list[_Entry]:
+        expired = []
+        while self._heap and (self._heap[0].cancelled or self._heap[0].deadline <= now):
+            entry = heapq.heappop(self._heap)
+            if not entry.cancelled:
+                del self._entries[entry.key]
+                self._bytes_on_disk -= entry.size
+                expired.append(entry)
+        return expired
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            for entry in self._pop_expired(loop.time()):
+                try:
+                    result = entry.callback()
+                    if inspect.isawaitable(result):
+                        task = asyncio.ensure_future(result)
+                        self._callback_tasks.add(task)
+                        task.add_done_callback(self._callback_done)
+                except Exception as e:
+                    logger.error(f"Failed to expire {entry.key}: {e}", exc_info=True)
+
+            self._wakeup.clear()
+            timeout = self._heap[0].deadline - loop.time() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except TimeoutError:
+                pass
+
+    def _callback_done(self, task: asyncio.Task):
+        self._callback_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Failed to expire an entry: {task.exception()}", exc_info=task.exception())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+expiry_scheduler: ExpiryScheduler = ExpiryScheduler()
@@ -2,9 +2,10 @@ from typing import cast
 
 from beanie import Document, View
 
+from src.storages.mongo.tempfiles import TempFile
 from src.storages.mongo.users import User
 
 document_models = cast(
     list[type[Document] | type[View] | str],
-    [User],
+    [User, TempFile],
 )
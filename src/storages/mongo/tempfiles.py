@@ -0,0 +1,41 @@
+__all__ = ["TempFile", "TempFileKind"]
+
+import datetime
+from enum import StrEnum
+
+from pymongo import ASCENDING, IndexModel
+
+from src.pydantic_base import BaseSchema
+from src.storages.mongo.__base__ import CustomDocument
+
+
+class TempFileKind(StrEnum):
+    PRINTING = "printing"
+    SCANNING = "scanning"
+
+
+class TempFileSchema(BaseSchema):
+    kind: TempFileKind
+    "Module the file belongs to"
+    innohassle_user_id: str
+    "Owner of the file"
+    filename: str
+    "Name of the file, it is shown to the user"
+    path: str
+    "Absolute path of the file in the temp directory"
+    size: int
+    "Size of the file in bytes"
+    pages: int | None = None
+    "Number of pages, if the file is a PDF"
+    sha256: str
+    "SHA-256 of the content, hex encoded"
+    expires_at: datetime.datetime
+    "The file is removed after this time"
+
+
+class TempFile(TempFileSchema, CustomDocument):
+    class Settings:
+        indexes = [
+            IndexModel([("kind", ASCENDING), ("innohassle_user_id", ASCENDING), ("filename", ASCENDING)], unique=True),
+            IndexModel("expires_at"),
+        ]
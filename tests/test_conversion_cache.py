@@ -0,0 +1,55 @@
+import os
+import time
+
+from src.modules.converting.cache import ConversionCache
+from src.modules.documents.entity_models import DocumentMetadata
+
+
+def make_metadata(pages: int) -> DocumentMetadata:
+    return DocumentMetadata(sha256="pdf", pages=pages, page_sizes=[], encrypted=False, needs_password=False)
+
+
+def write(path, size: int) -> str:
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_miss_then_hit(tmp_path):
+    cache = ConversionCache(str(tmp_path / "cache"), max_bytes=1000)
+    out = str(tmp_path / "out.pdf")
+    assert cache.get("a", ".docx", out) is None
+
+    cache.put("a", ".docx", write(tmp_path / "converted.pdf", 10), make_metadata(3))
+
+    assert cache.get("a", ".docx", out) == make_metadata(3)
+    assert open(out, "rb").read() == b"x" * 10
+    # The extension is a part of the key
+    assert cache.get("a", ".doc", out) is None
+
+
+def test_cached_pdf_outlives_the_original(tmp_path):
+    cache = ConversionCache(str(tmp_path / "cache"), max_bytes=1000)
+    converted = write(tmp_path / "converted.pdf", 10)
+    cache.put("a", ".docx", converted, make_metadata(1))
+    os.unlink(converted)
+
+    assert cache.get("a", ".docx", str(tmp_path / "out.pdf")) is not None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ConversionCache(str(tmp_path / "cache"), max_bytes=25)
+    out = str(tmp_path / "out.pdf")
+    cache.put("a", ".docx", write(tmp_path / "a.pdf", 10), make_metadata(1))
+    cache.put("b", ".docx", write(tmp_path / "b.pdf", 10), make_metadata(1))
+    past = time.time() - 100
+    os.utime(tmp_path / "cache" / "a.docx.pdf", (past, past))
+    os.utime(tmp_path / "cache" / "b.docx.pdf", (past - 10, past - 10))
+    # "b" is older, but a hit makes it the most recently used
+    assert cache.get("b", ".docx", out) is not None
+
+    cache.put("c", ".docx", write(tmp_path / "c.pdf", 10), make_metadata(1))
+
+    assert cache.get("a", ".docx", out) is None
+    assert cache.get("b", ".docx", out) is not None
+    assert cache.get("c", ".docx", out) is not None
+    assert not (tmp_path / "cache" / "a.docx.json").exists()
@@ -0,0 +1,56 @@
+import asyncio
+
+from fastapi import HTTPException
+
+from src.modules.printing.conversion_jobs import ConversionJobs
+from src.modules.printing.entity_models import ConversionJobStateEnum, PreparePrintingResponse
+
+
+class FakePool:
+    def __init__(self):
+        self.queue: list[object] = []
+
+    def queue_position(self, ticket):
+        return self.queue.index(ticket) + 1 if ticket in self.queue else None
+
+
+def test_job_goes_through_queue_to_done():
+    pool = FakePool()
+    jobs = ConversionJobs(pool, ttl=60)  # type: ignore[arg-type]
+
+    async def prepare(ticket):
+        pool.queue.append(ticket)
+        await asyncio.sleep(0.05)
+        pool.queue.remove(ticket)
+        await asyncio.sleep(0.05)
+        return PreparePrintingResponse(filename="a.pdf", pages=2)
+
+    async def main():
+        job = jobs.submit("user", prepare)
+        return [e async for e in jobs.watch("user", job.job_id, poll_interval=0.01, heartbeat_interval=60)]
+
+    events = asyncio.run(main())
+    assert [(e.state, e.queue_position) for e in events] == [
+        (ConversionJobStateEnum.converting, None),
+        (ConversionJobStateEnum.queued, 1),
+        (ConversionJobStateEnum.converting, None),
+        (ConversionJobStateEnum.done, None),
+    ]
+    assert events[-1].result == PreparePrintingResponse(filename="a.pdf", pages=2)
+
+
+def test_failed_job_keeps_http_error():
+    jobs = ConversionJobs(FakePool(), ttl=60)  # type: ignore[arg-type]
+
+    async def prepare(ticket):
+        raise HTTPException(503, "The server is overloaded, try again later")
+
+    async def main():
+        job = jobs.submit("user", prepare)
+        await asyncio.sleep(0)
+        return jobs.get("user", job.job_id), jobs.get("another user", job.job_id)
+
+    job, foreign = asyncio.run(main())
+    assert job.state == ConversionJobStateEnum.failed
+    assert (job.error_code, job.error) == (503, "The server is overloaded, try again later")
+    assert foreign is None
@@ -0,0 +1,211 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.modules.converting.pool import (
+    ConversionTimeoutError,
+    ConverterPool,
+    ConverterPoolSaturatedError,
+    UnoserverEndpoint,
+)
+
+
+class FakeClient:
+    def __init__(self, duration: float = 0.05, error: Exception | None = None):
+        self.duration = duration
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def convert(self, inpath, outpath):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.duration)
+        if self.error is not None:
+            raise self.error
+
+
+def make_pool(clients, max_queue=10, max_wait=5.0) -> ConverterPool:
+    endpoints = []
+    for i, client in enumerate(clients):
+        endpoint = UnoserverEndpoint("127.0.0.1", 2003 + i)
+        endpoint.client = client
+        endpoints.append(endpoint)
+    return ConverterPool(
+        endpoints,
+        max_concurrency=1,
+        max_queue=max_queue,
+        max_wait=max_wait,
+        health_check_interval=0,
+        health_check_timeout=1,
+        quarantine_time=60,
+    )
+
+
+def test_spreads_conversions_over_endpoints():
+    clients = [FakeClient(), FakeClient()]
+    pool = make_pool(clients)
+
+    async def main():
+        await asyncio.gather(*(pool.convert("in", "out.pdf") for _ in range(6)))
+
+    asyncio.run(main())
+    pool.close()
+    assert [client.calls for client in clients] == [3, 3]
+    assert all(endpoint.outstanding == 0 for endpoint in pool.endpoints)
+
+
+def test_rejects_when_queue_is_full():
+    pool = make_pool([FakeClient(duration=0.2)], max_queue=1)
+
+    async def main():
+        return await asyncio.gather(*(pool.convert("in", "out.pdf") for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    pool.close()
+    # One is converting, one is waiting in the queue, the third is rejected
+    assert results[:2] == [None, None]
+    assert isinstance(results[2], ConverterPoolSaturatedError)
+    assert results[2].retry_after >= 1
+
+
+def test_rejects_after_max_wait():
+    pool = make_pool([FakeClient(duration=0.3)], max_wait=0.05)
+
+    async def main():
+        return await asyncio.gather(*(pool.convert("in", "out.pdf") for _ in range(2)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    pool.close()
+    assert results[0] is None
+    assert isinstance(results[1], ConverterPoolSaturatedError)
+
+
+def test_unavailable_endpoint_is_taken_out_of_rotation():
+    broken, working = FakeClient(duration=0, error=ConnectionRefusedError()), FakeClient(duration=0)
+    pool = make_pool([broken, working])
+
+    async def main():
+        with pytest.raises(ConnectionError):
+            await pool.convert("in", "out.pdf")
+        for _ in range(3):
+            await pool.convert("in", "out.pdf")
+
+    asyncio.run(main())
+    pool.close()
+    assert not pool.endpoints[0].healthy
+    assert (broken.calls, working.calls) == (1, 3)
+
+
+def test_health_check_brings_endpoint_back():
+    pool = make_pool([FakeClient()])
+    endpoint = pool.endpoints[0]
+    endpoint.healthy = False
+    endpoint.ping = lambda timeout: None
+
+    asyncio.run(pool._check_health(endpoint))
+    pool.close()
+    assert endpoint.healthy
+
+
+def test_busy_endpoint_is_not_pinged():
+    pool = make_pool([FakeClient()])
+    endpoint = pool.endpoints[0]
+    endpoint.outstanding = 1
+
+    def ping(timeout):
+        raise TimeoutError
+
+    endpoint.ping = ping
+    asyncio.run(pool._check_health(endpoint))
+    pool.close()
+    assert endpoint.healthy
+
+
+def test_unavailable_endpoint_recovers_without_health_checks(monkeypatch):
+    monkeypatch.setattr("src.modules.converting.pool.RECOVERY_INTERVAL", 0.01)
+    client = FakeClient(duration=0, error=ConnectionRefusedError())
+    pool = make_pool([client])
+    endpoint = pool.endpoints[0]
+    endpoint.ping = lambda timeout: None
+
+    async def main():
+        with pytest.raises(ConnectionError):
+            await pool.convert("in", "out.pdf")
+        assert not endpoint.healthy
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+    pool.close()
+    assert endpoint.healthy
+
+
+def test_queue_position():
+    pool = make_pool([FakeClient(duration=0.2)])
+    first, second = object(), object()
+
+    async def main():
+        tasks = [asyncio.create_task(pool.convert("in", "out.pdf", ticket)) for ticket in (object(), first, second)]
+        await asyncio.sleep(0.05)
+        positions = pool.queue_position(first), pool.queue_position(second)
+        await asyncio.gather(*tasks)
+        return positions
+
+    assert asyncio.run(main()) == (1, 2)
+    assert pool.queue_position(first) is None
+    pool.close()
+
+
+def test_queue_is_served_first():
+    pool = make_pool([FakeClient()])
+    endpoint = pool.endpoints[0]
+    served = []
+
+    async def acquire(ticket):
+        await pool._acquire(ticket)
+        served.append(ticket)
+
+    async def main():
+        endpoint.outstanding = 1
+        waiting = asyncio.create_task(acquire("waiting"))
+        await asyncio.sleep(0.01)
+        # The slot is freed, but the waiting request has not been woken up yet when a new one arrives
+        endpoint.outstanding = 0
+        arrived = asyncio.create_task(acquire("arrived"))
+        await asyncio.sleep(0.01)
+        assert served == [] and pool.queue_position("arrived") == 2
+
+        await pool._notify_released()
+        await asyncio.sleep(0.01)
+        assert served == ["waiting"]
+        endpoint.outstanding = 0
+        await pool._notify_released()
+        await asyncio.gather(waiting, arrived)
+
+    asyncio.run(main())
+    pool.close()
+    assert served == ["waiting", "arrived"]
+
+
+def test_timed_out_endpoint_is_quarantined(tmp_path):
+    stuck, working = FakeClient(duration=0.3), FakeClient(duration=0)
+    pool = make_pool([stuck, working])
+    outpath = str(tmp_path / "out.pdf")
+
+    async def main():
+        with pytest.raises(ConversionTimeoutError):
+            await pool.convert("in", outpath, timeout=0.05)
+        # The stuck conversion still holds its slot
+        assert pool.endpoints[0].outstanding == 1
+        for _ in range(3):
+            await pool.convert("in", outpath, timeout=0.05)
+        await asyncio.sleep(0.4)
+
+    asyncio.run(main())
+    pool.close()
+    assert (stuck.calls, working.calls) == (1, 3)
+    assert pool.endpoints[0].outstanding == 0
+    # The quarantine ends as soon as the stuck conversion finishes
+    assert pool.endpoints[0].quarantined_until == 0
@@ -0,0 +1,111 @@
+import asyncio
+import os
+
+import pymupdf
+import pytest
+
+from src.modules.documents.repository import (
+    DocumentReadError,
+    DocumentsRepository,
+    read_pdf_metadata,
+    render_thumbnail,
+)
+from src.modules.tempfiles.repository import hash_file
+
+
+def make_pdf(path, page_sizes, password=None):
+    doc = pymupdf.open()
+    for width, height in page_sizes:
+        doc.new_page(width=width, height=height)
+    if password:
+        doc.save(path, encryption=pymupdf.PDF_ENCRYPT_AES_256, user_pw=password, owner_pw=password)
+    else:
+        doc.save(path)
+    doc.close()
+
+
+def test_read_pdf_metadata(tmp_path):
+    path = str(tmp_path / "a.pdf")
+    make_pdf(path, [(595, 842), (842, 595), (595, 842)])
+
+    metadata = read_pdf_metadata(path, "hash")
+
+    assert metadata.sha256 == "hash"
+    assert metadata.pages == 3
+    assert metadata.page_sizes == [(595, 842), (842, 595), (595, 842)]
+    assert not metadata.encrypted
+    assert not metadata.needs_password
+
+
+def test_read_pdf_metadata_password(tmp_path):
+    path = str(tmp_path / "a.pdf")
+    make_pdf(path, [(595, 842)], password="secret")
+
+    metadata = read_pdf_metadata(path, "hash")
+
+    assert metadata.encrypted
+    assert metadata.needs_password
+    assert metadata.page_sizes == []
+
+
+def test_metadata_of_corrupted_document(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"%PDF-1.7\n" + os.urandom(1000))
+    repository = DocumentsRepository()
+
+    with pytest.raises(DocumentReadError):
+        asyncio.run(repository.get_metadata(str(path), "hash"))
+
+
+def test_metadata_is_cached_by_hash(tmp_path):
+    first, second = str(tmp_path / "a.pdf"), str(tmp_path / "b.pdf")
+    make_pdf(first, [(595, 842)])
+    make_pdf(second, [(595, 842)] * 2)
+    repository = DocumentsRepository()
+
+    async def main():
+        metadata = await repository.get_metadata(first)
+        # Another file with the same hash is not read again
+        cached = await repository.get_metadata(second, metadata.sha256)
+        return metadata, cached
+
+    metadata, cached = asyncio.run(main())
+    assert metadata.sha256 == hash_file(first)[1]
+    assert metadata.pages == 1
+    assert cached is metadata
+
+
+def test_render_thumbnail(tmp_path):
+    path = str(tmp_path / "a.pdf")
+    make_pdf(path, [(595, 842), (842, 595)])
+
+    first = pymupdf.Pixmap(render_thumbnail(path, 0, 320))
+    last = pymupdf.Pixmap(render_thumbnail(path, -1, 320))
+
+    assert first.height == 320 and abs(first.width - 226) <= 1
+    assert last.width == 320 and abs(last.height - 226) <= 1
+    with pytest.raises(IndexError):
+        render_thumbnail(path, 2, 320)
+
+
+def test_thumbnail_is_cached_by_hash(tmp_path):
+    path = str(tmp_path / "a.pdf")
+    make_pdf(path, [(595, 842)])
+    repository = DocumentsRepository()
+
+    async def main():
+        thumbnail = await repository.get_thumbnail(path, "hash")
+        os.unlink(path)  # the cached thumbnail does not need the file
+        return thumbnail, await repository.get_thumbnail(path, "hash")
+
+    thumbnail, cached = asyncio.run(main())
+    assert cached is thumbnail
+
+
+def test_thumbnail_of_corrupted_document(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"%PDF-1.7\n" + os.urandom(1000))
+    repository = DocumentsRepository()
+
+    with pytest.raises(DocumentReadError):
+        asyncio.run(repository.get_thumbnail(str(path), "hash"))
@@ -0,0 +1,112 @@
+import asyncio
+
+from src.modules.tempfiles.scheduler import ExpiryScheduler
+
+
+def test_expires_in_deadline_order():
+    async def main():
+        scheduler = ExpiryScheduler()
+        expired = []
+        scheduler.schedule("b", 0.05, lambda: expired.append("b"))
+        scheduler.schedule("a", 0.01, lambda: expired.append("a"))
+        scheduler.schedule("c", 0.09, lambda: expired.append("c"))
+        await asyncio.sleep(0.15)
+        await scheduler.stop()
+        return expired, len(scheduler)
+
+    assert asyncio.run(main()) == (["a", "b", "c"], 0)
+
+
+def test_earlier_entry_wakes_up_the_scheduler():
+    async def main():
+        scheduler = ExpiryScheduler()
+        expired = []
+        scheduler.schedule("late", 60, lambda: expired.append("late"))
+        await asyncio.sleep(0)
+        scheduler.schedule("early", 0.01, lambda: expired.append("early"))
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return expired
+
+    assert asyncio.run(main()) == ["early"]
+
+
+def test_cancel():
+    async def main():
+        scheduler = ExpiryScheduler()
+        expired = []
+        scheduler.schedule("a", 0.01, lambda: expired.append("a"), size=10)
+        scheduler.schedule("b", 0.01, lambda: expired.append("b"), size=20)
+        assert scheduler.cancel("a")
+        assert not scheduler.cancel("a")
+        stats = scheduler.stats()
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return expired, stats
+
+    expired, stats = asyncio.run(main())
+    assert expired == ["b"]
+    assert (stats.entries, stats.bytes_on_disk) == (1, 20)
+
+
+def test_reschedule_replaces_entry():
+    async def main():
+        scheduler = ExpiryScheduler()
+        expired = []
+        scheduler.schedule("a", 0.01, lambda: expired.append(1), size=10)
+        scheduler.schedule("a", 60, lambda: expired.append(2), size=30)
+        await asyncio.sleep(0.05)
+        stats = scheduler.stats()
+        await scheduler.stop()
+        return expired, stats
+
+    expired, stats = asyncio.run(main())
+    assert expired == []
+    assert (stats.entries, stats.bytes_on_disk) == (1, 30)
+
+
+def test_callback_error_does_not_stop_scheduler():
+    def fail():
+        raise ValueError
+
+    async def main():
+        scheduler = ExpiryScheduler()
+        expired = []
+        scheduler.schedule("a", 0.01, fail)
+        scheduler.schedule("b", 0.02, lambda: expired.append("b"))
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return expired
+
+    assert asyncio.run(main()) == ["b"]
+
+
+def test_heap_is_compacted_after_many_cancels():
+    async def main():
+        scheduler = ExpiryScheduler()
+        for i in range(1000):
+            scheduler.schedule(i, 60, lambda: None)
+        for i in range(990):
+            scheduler.cancel(i)
+        heap_size = len(scheduler._heap)
+        await scheduler.stop()
+        return heap_size
+
+    assert asyncio.run(main()) < 100
+
+
+def test_async_callback():
+    async def main():
+        scheduler = ExpiryScheduler()
+        expired = []
+
+        async def callback():
+            await asyncio.sleep(0)
+            expired.append("a")
+
+        scheduler.schedule("a", 0.01, callback)
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return expired
+
+    assert asyncio.run(main()) == ["a"]
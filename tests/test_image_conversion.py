@@ -0,0 +1,74 @@
+import asyncio
+import struct
+
+import pymupdf
+import pytest
+
+from src.modules.converting.images import A4, image_to_pdf
+from src.modules.converting.pool import ConverterPool, UnoserverEndpoint
+from src.modules.converting.repository import ConversionFailedError, Converting
+
+
+def make_jpeg(width: int, height: int, orientation: int = 1) -> bytes:
+    pixmap = pymupdf.Pixmap(pymupdf.csRGB, pymupdf.IRect(0, 0, width, height), False)
+    pixmap.clear_with(200)
+    data = pixmap.tobytes("jpg")
+    # Minimal EXIF segment with a single Orientation tag
+    tiff = b"MM\x00\x2a\x00\x00\x00\x08" + struct.pack(">HHHIHH", 1, 0x0112, 3, 1, orientation, 0) + b"\x00" * 4
+    app1 = b"Exif\x00\x00" + tiff
+    return data[:2] + b"\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1 + data[2:]
+
+
+def read_page(path) -> tuple[pymupdf.Rect, dict]:
+    with pymupdf.open(path) as doc:
+        assert doc.page_count == 1
+        page = doc[0]
+        return page.rect, page.get_image_info()[0]
+
+
+def test_landscape_image_on_landscape_page(tmp_path):
+    (tmp_path / "in.jpg").write_bytes(make_jpeg(400, 200))
+    image_to_pdf(str(tmp_path / "in.jpg"), str(tmp_path / "out.pdf"))
+
+    rect, image = read_page(tmp_path / "out.pdf")
+    assert (rect.width, rect.height) == (A4.height, A4.width)
+    x0, y0, x1, y1 = image["bbox"]
+    # Fits the width, centered vertically
+    assert x0 > 0 and x1 < rect.width
+    assert abs((y0 + y1) / 2 - rect.height / 2) < 1
+    assert abs((x1 - x0) / (y1 - y0) - 2) < 0.01
+
+
+def test_exif_orientation(tmp_path):
+    # Orientation 6: stored landscape, displayed rotated by 90 degrees
+    (tmp_path / "in.jpg").write_bytes(make_jpeg(400, 200, orientation=6))
+    image_to_pdf(str(tmp_path / "in.jpg"), str(tmp_path / "out.pdf"))
+
+    rect, image = read_page(tmp_path / "out.pdf")
+    assert rect == A4
+    x0, y0, x1, y1 = image["bbox"]
+    assert abs((y1 - y0) / (x1 - x0) - 2) < 0.01
+
+
+def test_downsampling(tmp_path):
+    pixmap = pymupdf.Pixmap(pymupdf.csRGB, pymupdf.IRect(0, 0, 3000, 2000), True)
+    pixmap.clear_with(100)
+    pixmap.save(tmp_path / "in.png")
+
+    image_to_pdf(str(tmp_path / "in.png"), str(tmp_path / "original.pdf"))
+    image_to_pdf(str(tmp_path / "in.png"), str(tmp_path / "small.pdf"), max_dpi=100)
+
+    _, original = read_page(tmp_path / "original.pdf")
+    assert (original["width"], original["height"]) == (3000, 2000)
+    _, small = read_page(tmp_path / "small.pdf")
+    x0, _, x1, _ = small["bbox"]
+    assert abs(small["width"] - (x1 - x0) / 72 * 100) <= 1
+
+
+def test_corrupted_image(tmp_path):
+    (tmp_path / "in.png").write_bytes(b"\x89PNG\r\n\x1a\nbroken")
+    converting = Converting(ConverterPool([UnoserverEndpoint("127.0.0.1", 2003)], 1, 1, 1, 0, 1), cache=None)
+
+    with pytest.raises(ConversionFailedError):
+        asyncio.run(converting.convert_image(str(tmp_path / "in.png"), ".png", str(tmp_path / "out.pdf")))
+    assert converting.metrics[".png"].errors == 1
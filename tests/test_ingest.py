@@ -0,0 +1,39 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import UploadFile
+
+from src.modules.tempfiles.ingest import CHUNK_SIZE, UploadTooLargeError, ingest_upload
+
+
+def make_upload(content: bytes, size: int | None = None) -> UploadFile:
+    return UploadFile(io.BytesIO(content), size=len(content) if size is None else size, filename="file.pdf")
+
+
+def test_ingest_copies_and_hashes(tmp_path):
+    content = os.urandom(CHUNK_SIZE * 2 + 123)
+    ingested = asyncio.run(ingest_upload(make_upload(content), str(tmp_path), ".pdf", max_size=len(content)))
+
+    assert ingested.path.endswith(".pdf")
+    assert os.path.dirname(ingested.path) == str(tmp_path)
+    assert ingested.size == len(content)
+    assert ingested.sha256 == hashlib.sha256(content).hexdigest()
+    with open(ingested.path, "rb") as f:
+        assert f.read() == content
+
+
+def test_ingest_rejects_declared_size(tmp_path):
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(ingest_upload(make_upload(b"x" * 11), str(tmp_path), ".pdf", max_size=10))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_ingest_rejects_actual_size(tmp_path):
+    # The declared size may be missing or wrong, the limit is enforced while copying too
+    content = b"x" * (CHUNK_SIZE + 1)
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(ingest_upload(make_upload(content, size=1), str(tmp_path), ".pdf", max_size=CHUNK_SIZE))
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,222 @@
+import asyncio
+
+import cups
+
+from src.config_schema import Printer
+from src.modules.printing.entity_models import JobAttributes, JobEvent, JobStateEnum
+from src.modules.printing.job_events import CupsNotificationListener, JobEventBus
+from src.modules.printing.job_tracker import JobTracker
+
+
+class FakeCups:
+    """
+    Stands in for `CupsGateway`, methods of `cups.Connection` are looked up on this object
+    """
+
+    def __init__(self, printers: list[str]):
+        self.printers = printers
+        self.subscriptions: dict[int, str] = {}
+        self.next_subscription_id = 1
+        self.notifications: list[dict] = []
+        self.jobs: dict[int, dict] = {}
+        self.calls: list[str] = []
+        # Awaited after the snapshot of jobs is taken and before it is returned
+        self.while_getting_jobs = None
+
+    async def call(self, method: str, *args, retry: bool = True, **kwargs):
+        self.calls.append(method)
+        result = getattr(self, method)(*args, **kwargs)
+        if method == "getJobs" and self.while_getting_jobs is not None:
+            await self.while_getting_jobs()
+        return result
+
+    def getJobs(self, which_jobs: str, requested_attributes: list[str]) -> dict[int, dict]:
+        return {job_id: dict(attributes) for job_id, attributes in self.jobs.items()}
+
+    def createSubscription(self, uri: str, events: list[str], lease_duration: int) -> int:
+        printer = uri.rsplit("/", 1)[1]
+        if printer not in self.printers:
+            raise cups.IPPError(cups.IPP_NOT_FOUND, "The printer or class does not exist.")
+        subscription_id = self.next_subscription_id
+        self.next_subscription_id += 1
+        self.subscriptions[subscription_id] = printer
+        return subscription_id
+
+    def cancelSubscription(self, subscription_id: int):
+        del self.subscriptions[subscription_id]
+
+    def getNotifications(self, subscription_ids: list[int], sequence_numbers: list[int]) -> dict:
+        events, self.notifications = self.notifications, []
+        return {"events": events}
+
+
+def make_printers(*names: str) -> list[Printer]:
+    return [Printer(display_name=name, cups_name=name, ipp="127.0.0.1:631") for name in names]
+
+
+def test_skips_printers_unknown_to_cups():
+    async def main():
+        gateway = FakeCups(["first", "third"])
+        bus = JobEventBus()
+        listener = CupsNotificationListener(
+            gateway, bus, make_printers("first", "second", "third"), poll_interval=0.01, lease_duration=60
+        )
+        listener.start()
+        await asyncio.sleep(0.1)
+        subscribed = sorted(gateway.subscriptions.values())
+        live = bus.is_live
+        await listener.stop()
+        return gateway, subscribed, live
+
+    gateway, subscribed, live = asyncio.run(main())
+
+    assert subscribed == ["first", "third"]
+    assert live
+    # The unknown printer is asked about only once
+    assert gateway.calls.count("createSubscription") == 3
+    assert gateway.subscriptions == {}
+
+
+def test_failed_subscription_does_not_leak():
+    class FailingCups(FakeCups):
+        def createSubscription(self, uri: str, events: list[str], lease_duration: int) -> int:
+            if uri.endswith("/second"):
+                raise cups.IPPError(cups.IPP_INTERNAL_ERROR, "Internal error")
+            return super().createSubscription(uri, events, lease_duration)
+
+    async def main():
+        gateway = FailingCups(["first", "second"])
+        bus = JobEventBus()
+        listener = CupsNotificationListener(
+            gateway, bus, make_printers("first", "second"), poll_interval=0.01, lease_duration=60
+        )
+        listener.start()
+        await asyncio.sleep(0.2)
+        subscriptions = dict(gateway.subscriptions)
+        attempts = gateway.calls.count("createSubscription")
+        live = bus.is_live
+        await listener.stop()
+        return subscriptions, attempts, live
+
+    subscriptions, attempts, live = asyncio.run(main())
+
+    # Subscriptions created before the failure are cancelled
+    assert subscriptions == {}
+    assert not live
+    # Retries back off after 0.02, 0.04, 0.08... seconds, without the backoff there would be about 20 of them
+    assert 2 * 2 <= attempts <= 2 * 6
+
+
+def make_event(job_id: int, job_state: JobStateEnum) -> JobEvent:
+    return JobEvent(
+        event="job-state-changed",
+        job_id=job_id,
+        printer="first",
+        job=JobAttributes.from_cups_notification({"job-state": job_state, "job-state-reasons": "none"}),
+    )
+
+
+def test_event_during_refresh_keeps_its_state():
+    async def main():
+        gateway = FakeCups(["first"])
+        gateway.jobs = {1: {"job-state": JobStateEnum.pending, "job-state-reasons": "none"}}
+        bus = JobEventBus()
+        tracker = JobTracker(gateway, bus, refresh_interval=60)
+        tracker.start()
+        bus.set_live(True)
+        await asyncio.sleep(0)  # let the tracker subscribe to the bus
+
+        async def job_starts():
+            # The job starts after CUPS has taken the snapshot, but the event is applied before the snapshot
+            bus.publish(make_event(1, JobStateEnum.processing))
+            await asyncio.sleep(0)
+
+        gateway.while_getting_jobs = job_starts
+        job = await tracker.get(1)
+        tracker.stop()
+        return job
+
+    job = asyncio.run(main())
+
+    assert job.job_state == JobStateEnum.processing
+
+
+def test_polls_when_events_are_not_live():
+    async def main():
+        gateway = FakeCups(["first"])
+        gateway.jobs = {1: {"job-state": JobStateEnum.pending, "job-state-reasons": "none"}}
+        bus = JobEventBus()
+        tracker = JobTracker(gateway, bus, refresh_interval=0.05)
+        tracker.start()
+        bus.set_live(True)
+        states = [(await tracker.get(1)).job_state]
+
+        # While the events are live, the table is not refreshed by time
+        gateway.jobs[1]["job-state"] = JobStateEnum.processing
+        await asyncio.sleep(0.1)
+        states.append((await tracker.get(1)).job_state)
+
+        # Once the source of events is gone, the table is refreshed every `refresh_interval`
+        bus.set_live(False)
+        states.append((await tracker.get(1)).job_state)
+        gateway.jobs[1]["job-state"] = JobStateEnum.processing_stopped
+        states.append((await tracker.get(1)).job_state)
+        await asyncio.sleep(0.1)
+        states.append((await tracker.get(1)).job_state)
+        tracker.stop()
+        return states, gateway.calls.count("getJobs")
+
+    states, refreshes = asyncio.run(main())
+
+    assert states == [
+        JobStateEnum.pending,
+        JobStateEnum.pending,
+        JobStateEnum.processing,
+        JobStateEnum.processing,
+        JobStateEnum.processing_stopped,
+    ]
+    assert refreshes == 3
+
+
+def test_sequence_gap_refreshes_jobs():
+    def notification(sequence_number: int, job_state: JobStateEnum) -> dict:
+        return {
+            "notify-subscription-id": 1,
+            "notify-sequence-number": sequence_number,
+            "notify-subscribed-event": "job-state-changed",
+            "notify-job-id": 1,
+            "job-state": job_state,
+            "job-state-reasons": "none",
+        }
+
+    async def main():
+        gateway = FakeCups(["first"])
+        gateway.jobs = {1: {"job-state": JobStateEnum.pending, "job-state-reasons": "none"}}
+        bus = JobEventBus()
+        tracker = JobTracker(gateway, bus, refresh_interval=60)
+        listener = CupsNotificationListener(gateway, bus, make_printers("first"), poll_interval=0.01, lease_duration=60)
+        tracker.start()
+        listener.start()
+        await asyncio.sleep(0.05)
+        states = [(await tracker.get(1)).job_state]
+
+        gateway.notifications = [notification(1, JobStateEnum.processing)]
+        await asyncio.sleep(0.05)
+        states.append((await tracker.get(1)).job_state)
+        refreshes = [gateway.calls.count("getJobs")]
+
+        # Events 2-3 are lost, CUPS knows the state from them
+        gateway.jobs[1]["job-state"] = JobStateEnum.processing_stopped
+        gateway.notifications = [notification(4, JobStateEnum.processing)]
+        await asyncio.sleep(0.05)
+        states.append((await tracker.get(1)).job_state)
+        refreshes.append(gateway.calls.count("getJobs"))
+
+        await listener.stop()
+        tracker.stop()
+        return states, refreshes
+
+    states, refreshes = asyncio.run(main())
+
+    assert states == [JobStateEnum.pending, JobStateEnum.processing, JobStateEnum.processing_stopped]
+    assert refreshes == [1, 2]
@@ -0,0 +1,120 @@
+import asyncio
+
+import cups
+
+from src.modules.printing.job_submitter import JobSubmitter
+
+
+class FakeConnection:
+    def __init__(self, fail_after_chunks: int | None = None):
+        self.fail_after_chunks = fail_after_chunks
+        self.received = b""
+        self.chunks = 0
+        self.finished = False
+
+    def startDocument(self, printer: str, job_id: int, name: str, format_: str, last_document: int) -> int:
+        return cups.HTTP_CONTINUE
+
+    def writeRequestData(self, chunk: bytes, length: int) -> int:
+        if self.fail_after_chunks is not None and self.chunks >= self.fail_after_chunks:
+            return cups.HTTP_ERROR
+        self.received += chunk[:length]
+        self.chunks += 1
+        return cups.HTTP_CONTINUE
+
+    def finishDocument(self, printer: str) -> int:
+        self.finished = True
+        return cups.IPP_OK
+
+
+class FakeCups:
+    """
+    Stands in for `CupsGateway`: calls go to this object, functions given to `run` get the fake connection
+    """
+
+    def __init__(self, connection: FakeConnection):
+        self.connection = connection
+        self.calls: list[tuple[str, tuple, bool]] = []
+
+    async def call(self, method: str, *args, retry: bool = True, **kwargs):
+        self.calls.append((method, args, retry))
+        if method == "createJob":
+            return 7
+        return None
+
+    async def run(self, name: str, fn, *args, retry: bool = True, upload: bool = False, **kwargs):
+        self.calls.append((name, (), retry))
+        return await asyncio.to_thread(fn, self.connection, *args, **kwargs)
+
+
+class FakeTracker:
+    def __init__(self):
+        self.progress: list[float | None] = []
+        self.invalidated = False
+
+    def set_upload_progress(self, job_id: int, progress: float | None):
+        self.progress.append(progress)
+
+    def invalidate(self):
+        self.invalidated = True
+
+
+def submit(tmp_path, connection: FakeConnection, chunk_size: int = 256):
+    path = tmp_path / "document.pdf"
+    path.write_bytes(bytes(range(256)) * 4)
+    gateway, tracker = FakeCups(connection), FakeTracker()
+    submitter = JobSubmitter(gateway, tracker, chunk_size=chunk_size)
+    done: list[bool] = []
+
+    async def main():
+        finished = asyncio.Event()
+
+        async def on_done(ok: bool):
+            done.append(ok)
+            if ok:
+                path.unlink()
+            finished.set()
+
+        job_id = await submitter.submit("printer", str(path), "job", {"copies": "1"}, on_done)
+        await finished.wait()
+        return job_id
+
+    job_id = asyncio.run(main())
+    return job_id, path, gateway, tracker, done
+
+
+def test_upload(tmp_path):
+    connection = FakeConnection()
+
+    job_id, path, gateway, tracker, done = submit(tmp_path, connection)
+
+    assert job_id == 7
+    # Neither the job nor the document may be sent twice
+    assert gateway.calls == [
+        ("createJob", ("printer", "job", {"copies": "1"}), False),
+        ("writeRequestData", (), False),
+    ]
+    assert connection.received == bytes(range(256)) * 4
+    assert connection.finished
+    assert done == [True]
+    assert not path.exists()
+    assert tracker.invalidated
+
+
+def test_failed_upload_cancels_job(tmp_path):
+    connection = FakeConnection(fail_after_chunks=2)
+
+    job_id, path, gateway, tracker, done = submit(tmp_path, connection)
+
+    assert ("cancelJob", (job_id, False), True) in gateway.calls
+    assert not connection.finished
+    assert done == [False]
+    # The file is kept, so that the user can try again
+    assert path.exists()
+    assert tracker.progress[-1] is None
+
+
+def test_upload_progress(tmp_path):
+    job_id, path, gateway, tracker, done = submit(tmp_path, FakeConnection(), chunk_size=256)
+
+    assert tracker.progress == [0.0, 0.25, 0.5, 0.75, 1.0, None]
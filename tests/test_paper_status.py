@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import pytest
+
+from src.modules.printing.tools.paper_status import parse_input_tray_percentage, parse_paper_percentage
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+@pytest.mark.parametrize(
+    "fixture,expected",
+    [
+        ("printer_status_cassette.html", 50),  # first Cassette tray is half full
+        ("printer_status_cassette_empty.html", 0),  # Cassette tray is empty
+        ("printer_status_no_cassette.html", None),  # Cassette tray reports no capacity
+        ("printer_status_no_input_tray.html", None),  # no printer-input-tray attribute
+    ],
+)
+def test_parse_paper_percentage(fixture, expected):
+    html = (FIXTURES / fixture).read_text()
+    assert parse_paper_percentage(html) == expected
+
+
+def test_parse_paper_percentage_edge_cases():
+    # Empty page
+    assert parse_paper_percentage("") is None
+
+    # No <br> before the printer-input-tray line
+    assert (
+        parse_paper_percentage(
+            "<font>printer-input-tray:</font><font>maxcapacity=10;level=5;name=Cassette 1;</font><br>"
+        )
+        is None
+    )
+
+    # No <br> after the printer-input-tray line
+    assert (
+        parse_paper_percentage(
+            "<br><font>printer-input-tray:</font><font>maxcapacity=10;level=5;name=Cassette 1;</font>"
+        )
+        is None
+    )
+
+    # Trays on the next line are ignored
+    html = "<br><font>printer-input-tray:</font><br><font>maxcapacity=10;level=5;name=Cassette 1;</font><br>"
+    assert parse_paper_percentage(html) is None
+
+
+@pytest.mark.parametrize(
+    "trays,expected",
+    [
+        (["type=sheetFeedAutoRemovableTray;maxcapacity=500;level=250;status=0;name=Cassette 1;"], 50),
+        (
+            [
+                "type=sheetFeedManual;maxcapacity=100;level=100;status=0;name=Multi-purpose Tray;",
+                "type=sheetFeedAutoRemovableTray;maxcapacity=500;level=125;status=0;name=Cassette 1;",
+            ],
+            25,
+        ),  # non-Cassette trays are skipped
+        (["type=sheetFeedAutoRemovableTray;maxcapacity=-2;level=-2;status=0;name=Cassette 1;"], None),  # unknown
+        (["type=sheetFeedManual;maxcapacity=100;level=100;status=0;name=Multi-purpose Tray;"], None),
+        ([], None),
+    ],
+)
+def test_parse_input_tray_percentage(trays, expected):
+    assert parse_input_tray_percentage(trays) == expected
@@ -0,0 +1,188 @@
+import asyncio
+import datetime
+import os
+
+import pymupdf
+import pytest
+
+from src.modules.converting.cache import ConversionCache
+from src.modules.documents.transforms import impose
+from src.modules.printing.entity_models import PrintingOptions, PrintLayout
+from src.modules.printing.prepress import Prepress, PrepressFailedError
+from src.modules.printing.tools.page_ranges import InvalidPageRangesError, format_page_ranges, parse_page_ranges
+from src.storages.mongo.tempfiles import TempFileKind, TempFileSchema
+
+
+def test_parse_page_ranges():
+    assert parse_page_ranges("1-3,5", 10) == [1, 2, 3, 5]
+    assert parse_page_ranges("5, 1-2,2", 10) == [1, 2, 5]
+    assert parse_page_ranges("8-", 10) == [8, 9, 10]
+    assert parse_page_ranges("9-12,20", 10) == [9, 10]
+    for invalid in ("", "a", "0", "3-1", "1-2-3"):
+        with pytest.raises(InvalidPageRangesError):
+            parse_page_ranges(invalid, 10)
+
+
+def test_format_page_ranges():
+    assert format_page_ranges([1, 2, 3, 5, 7, 8]) == "1-3,5,7-8"
+    assert format_page_ranges([]) == ""
+
+
+def make_tempfile(tmp_path, pages: int) -> TempFileSchema:
+    path = tmp_path / "file.pdf"
+    with pymupdf.open() as doc:
+        for i in range(pages):
+            doc.new_page().insert_text((72, 72), f"page {i + 1}")
+        doc.save(path)
+    return TempFileSchema(
+        kind=TempFileKind.PRINTING,
+        innohassle_user_id="user",
+        filename="file.pdf",
+        path=str(path),
+        size=path.stat().st_size,
+        pages=pages,
+        sha256="source",
+        expires_at=datetime.datetime.now(datetime.UTC),
+    )
+
+
+def read_texts(path) -> list[str]:
+    with pymupdf.open(path) as doc:
+        return [page.get_text().strip() for page in doc]
+
+
+def test_extracts_selected_pages(tmp_path):
+    tempfile = make_tempfile(tmp_path, 10)
+    prepress = Prepress(str(tmp_path), ConversionCache(str(tmp_path / "cache"), max_bytes=10**9))
+
+    result = asyncio.run(
+        prepress.prepare(tempfile, PrintingOptions.model_validate({"page-ranges": "2-3,9", "copies": "2"}))
+    )
+
+    assert result.temporary
+    assert read_texts(result.path) == ["page 2", "page 3", "page 9"]
+    assert result.options == PrintingOptions(copies="2")
+
+    # The second time the document is taken from the cache
+    os.unlink(result.path)
+    os.rename(tempfile.path, tmp_path / "moved.pdf")
+    cached = asyncio.run(prepress.prepare(tempfile, PrintingOptions.model_validate({"page-ranges": "2-3,9"})))
+    assert read_texts(cached.path) == ["page 2", "page 3", "page 9"]
+
+
+def test_keeps_whole_sheets_with_number_up(tmp_path):
+    tempfile = make_tempfile(tmp_path, 10)
+    prepress = Prepress(str(tmp_path), cache=None)
+
+    # With 4 pages per sheet, the document has 3 sheets and the last one has 2 pages
+    result = asyncio.run(
+        prepress.prepare(tempfile, PrintingOptions.model_validate({"page-ranges": "1,3", "number-up": "4"}))
+    )
+
+    assert result.pages == 2
+    assert read_texts(result.path) == ["page 1\npage 2\npage 3\npage 4", "page 9\npage 10"]
+    assert result.options == PrintingOptions()
+
+
+def test_impose_grid(tmp_path):
+    make_tempfile(tmp_path, 3)
+    impose(str(tmp_path / "file.pdf"), str(tmp_path / "out.pdf"), [1, 2, 3], 2)
+
+    with pymupdf.open(tmp_path / "out.pdf") as doc:
+        assert doc.page_count == 2
+        sheet = doc[0]
+        assert sheet.rect.width > sheet.rect.height
+        # Left to right
+        first, second = (sheet.search_for(f"page {i}")[0] for i in (1, 2))
+        assert first.x1 < sheet.rect.width / 2 < second.x0
+
+
+@pytest.mark.parametrize(("number_up", "min_fill"), [(2, 0.95), (4, 0.95), (6, 0.7)])
+def test_impose_landscape_pages(tmp_path, number_up, min_fill):
+    with pymupdf.open() as doc:
+        for i in range(number_up):
+            doc.new_page(width=842, height=595).insert_text((72, 72), f"slide {i + 1}")
+        doc.save(tmp_path / "slides.pdf")
+    impose(str(tmp_path / "slides.pdf"), str(tmp_path / "out.pdf"), list(range(1, number_up + 1)), number_up)
+
+    with pymupdf.open(tmp_path / "out.pdf") as doc:
+        assert doc.page_count == 1
+        sheet = doc[0]
+        # Every page is placed as a form XObject, the bounding box is where it is on the sheet
+        placed = [pymupdf.Rect(bbox) for _, name, _, bbox in sheet.get_xobjects() if name.startswith("fzFrm")]
+        assert len(placed) == number_up
+        # Slides cover almost all of the sheet, instead of a half of it with the grid for portrait pages
+        assert sum(rect.get_area() for rect in placed) / sheet.rect.get_area() > min_fill
+
+
+def test_layout(tmp_path):
+    tempfile = make_tempfile(tmp_path, 10)
+    prepress = Prepress(str(tmp_path), cache=None)
+
+    def layout(**options):
+        return asyncio.run(prepress.layout(tempfile, PrintingOptions.model_validate(options)))
+
+    assert layout() == PrintLayout(sheet_sides=10, sheets=10)
+    assert layout(**{"number-up": "4"}) == PrintLayout(sheet_sides=3, sheets=3)
+    assert layout(**{"number-up": "4", "sides": "two-sided-long-edge", "copies": "2"}) == PrintLayout(
+        sheet_sides=3, sheets=4
+    )
+    assert layout(**{"page-ranges": "2-4,7"}) == PrintLayout(sheet_sides=4, sheets=4)
+
+
+def test_all_pages_selected(tmp_path):
+    tempfile = make_tempfile(tmp_path, 3)
+    prepress = Prepress(str(tmp_path), cache=None)
+
+    result = asyncio.run(prepress.prepare(tempfile, PrintingOptions.model_validate({"page-ranges": "1-5"})))
+
+    assert not result.temporary
+    assert result.path == tempfile.path
+    with pytest.raises(InvalidPageRangesError):
+        asyncio.run(prepress.prepare(tempfile, PrintingOptions.model_validate({"page-ranges": "4-5"})))
+
+
+def test_broken_document(tmp_path):
+    tempfile = make_tempfile(tmp_path, 3)
+    (tmp_path / "broken").mkdir()
+    broken = make_tempfile(tmp_path / "broken", 3)
+    with open(broken.path, "r+b") as f:
+        f.truncate(100)
+    prepress = Prepress(str(tmp_path), cache=None)
+
+    with pytest.raises(PrepressFailedError):
+        asyncio.run(prepress.prepare(broken, PrintingOptions.model_validate({"page-ranges": "1"})))
+
+    # The failure does not affect other jobs, and the temporary document is removed
+    result = asyncio.run(prepress.prepare(tempfile, PrintingOptions.model_validate({"page-ranges": "1"})))
+    assert read_texts(result.path) == ["page 1"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(["broken", "file.pdf", os.path.basename(result.path)])
+
+
+def test_optimizes_images_for_printer(tmp_path):
+    tempfile = make_tempfile(tmp_path, 2)
+    path = tmp_path / "file.pdf"
+    pixmap = pymupdf.Pixmap(pymupdf.csRGB, pymupdf.IRect(0, 0, 2400, 2400), False)
+    pixmap.clear_with(200)
+    with pymupdf.open() as doc:
+        # 2400 pixels on 4 inches is 600 dpi
+        doc.new_page().insert_image(pymupdf.Rect(72, 72, 360, 360), stream=pixmap.tobytes("jpg"))
+        doc.new_page().insert_text((72, 72), "page 2")
+        doc.save(path)
+    tempfile.size = path.stat().st_size
+    prepress = Prepress(str(tmp_path), ConversionCache(str(tmp_path / "cache"), max_bytes=10**9))
+
+    result = asyncio.run(prepress.prepare(tempfile, PrintingOptions.model_validate({"page-ranges": "1"}), max_dpi=300))
+
+    with pymupdf.open(result.path) as doc:
+        assert doc.page_count == 1
+        assert doc[0].get_image_info()[0]["width"] == 1200
+    assert prepress.metrics.count == 1
+    assert prepress.metrics.bytes_after < prepress.metrics.bytes_before == tempfile.size
+
+    # The intermediate optimized document is removed
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(["cache", "file.pdf", os.path.basename(result.path)])
+
+    optimized = asyncio.run(prepress.prepare(tempfile, PrintingOptions(), max_dpi=300))
+    assert optimized.temporary and optimized.pages == 2
+    assert prepress.metrics.cache_hits == 1
@@ -0,0 +1,76 @@
+import datetime
+
+import pymupdf
+from fastapi import FastAPI
+from starlette.requests import Request
+from starlette.testclient import TestClient
+
+from src.modules.tempfiles.responses import tempfile_preview_response, tempfile_response
+from src.storages.mongo.tempfiles import TempFileKind, TempFileSchema
+
+
+def make_client(tmp_path, content: bytes = b"0123456789") -> TestClient:
+    path = tmp_path / "file.pdf"
+    path.write_bytes(content)
+    tempfile = TempFileSchema(
+        kind=TempFileKind.PRINTING,
+        innohassle_user_id="user",
+        filename="file.pdf",
+        path=str(path),
+        size=10,
+        pages=1,
+        sha256="abc",
+        expires_at=datetime.datetime.now(datetime.UTC),
+    )
+    app = FastAPI()
+
+    @app.get("/get_file")
+    def get_file(request: Request):
+        return tempfile_response(request, tempfile)
+
+    @app.get("/preview")
+    async def preview(request: Request, page: int = 1):
+        return await tempfile_preview_response(request, tempfile, page, 64)
+
+    return TestClient(app)
+
+
+def test_etag_and_revalidation(tmp_path):
+    client = make_client(tmp_path)
+
+    response = client.get("/get_file")
+    assert response.status_code == 200
+    assert response.content == b"0123456789"
+    assert response.headers["ETag"] == '"abc"'
+
+    response = client.get("/get_file", headers={"If-None-Match": '"other", "abc"'})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get("/get_file", headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+
+
+def test_range(tmp_path):
+    client = make_client(tmp_path)
+
+    response = client.get("/get_file", headers={"Range": "bytes=2-4"})
+    assert response.status_code == 206
+    assert response.content == b"234"
+
+    # The range is ignored if the file has changed since the client got its ETag
+    response = client.get("/get_file", headers={"Range": "bytes=2-4", "If-Range": '"other"'})
+    assert response.status_code == 200
+
+
+def test_preview(tmp_path):
+    with pymupdf.open() as doc:
+        doc.new_page()
+        client = make_client(tmp_path, doc.tobytes())
+
+    response = client.get("/preview")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "image/jpeg"
+    assert client.get("/preview", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    assert client.get("/preview", params={"page": 2}).status_code == 404
+    assert client.get("/preview", params={"page": 0}).status_code == 400
@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import pymupdf
+import pytest
+
+from src.modules.converting.pool import ConversionTimeoutError, ConverterPool, UnoserverEndpoint
+from src.modules.converting.repository import Converting
+from src.modules.converting.text import MAX_WORD_LENGTH, _break_long_words_in_html, markdown_to_html, text_to_pdf
+
+
+def test_markdown_blocks():
+    html = markdown_to_html(
+        "# Title\n\nSome *italic* and **bold** with `a <b>`.\nSame paragraph.\n\n- one\n- two\n\n```\nx = 1\n```\n"
+    )
+    assert html.splitlines() == [
+        "<h1>Title</h1>",
+        "<p>Some <i>italic</i> and <b>bold</b> with <code>a &lt;b&gt;</code>. Same paragraph.</p>",
+        "<ul>",
+        "<li>one</li>",
+        "<li>two</li>",
+        "</ul>",
+        "<pre>x = 1</pre>",
+    ]
+
+
+def test_markdown_escapes_html():
+    assert markdown_to_html("<script>alert(1)</script>") == "<p>&lt;script&gt;alert(1)&lt;/script&gt;</p>"
+
+
+def test_text_keeps_lines(tmp_path):
+    (tmp_path / "in.txt").write_bytes("Привет\n    indented\n".encode("cp1251"))
+    text_to_pdf(str(tmp_path / "in.txt"), str(tmp_path / "out.pdf"), ".txt")
+
+    with pymupdf.open(tmp_path / "out.pdf") as doc:
+        assert doc.page_count == 1
+        assert doc[0].get_text().splitlines() == ["Привет", "    indented"]
+
+
+def test_long_text_spans_pages(tmp_path):
+    (tmp_path / "in.txt").write_text("line\n" * 500)
+    text_to_pdf(str(tmp_path / "in.txt"), str(tmp_path / "out.pdf"), ".txt", monospace=False)
+
+    with pymupdf.open(tmp_path / "out.pdf") as doc:
+        assert doc.page_count > 1
+        assert sum(page.get_text().count("line") for page in doc) == 500
+
+
+def test_pathological_line(tmp_path):
+    # A single unbreakable line of 200 KB took MuPDF almost a minute to lay out
+    (tmp_path / "in.txt").write_text("a" * 200_000)
+    t1 = time.monotonic()
+    text_to_pdf(str(tmp_path / "in.txt"), str(tmp_path / "out.pdf"), ".txt")
+    assert time.monotonic() - t1 < 5
+
+    with pymupdf.open(tmp_path / "out.pdf") as doc:
+        lines = [line for page in doc for line in page.get_text().splitlines()]
+    assert "".join(lines) == "a" * 200_000
+    assert max(map(len, lines)) <= MAX_WORD_LENGTH
+
+
+def test_markdown_long_link(tmp_path):
+    url = "https://example.com/" + "a" * 200
+    markdown = f"See [the {'b' * 200} page]({url}) {'c' * 79}&{'c' * 100}"
+
+    html = _break_long_words_in_html(markdown_to_html(markdown))
+    assert f'<a href="{url}">' in html
+    assert "c&amp;\nc" in html  # entities are not broken
+
+    (tmp_path / "in.md").write_text(markdown)
+    text_to_pdf(str(tmp_path / "in.md"), str(tmp_path / "out.pdf"), ".md")
+    with pymupdf.open(tmp_path / "out.pdf") as doc:
+        lines = doc[0].get_text().splitlines()
+    assert "".join(lines).replace(" ", "") == "Seethe" + "b" * 200 + "page" + "c" * 79 + "&" + "c" * 100
+    assert max(map(len, lines)) <= MAX_WORD_LENGTH
+
+
+def test_conversion_deadline(tmp_path):
+    (tmp_path / "in.txt").write_text("line\n" * 100_000)
+    converting = Converting(
+        ConverterPool([UnoserverEndpoint("127.0.0.1", 2003)], 1, 1, 1, 0, 1), cache=None, timeouts={".txt": 0.1}
+    )
+
+    with pytest.raises(ConversionTimeoutError):
+        asyncio.run(converting.convert_text(str(tmp_path / "in.txt"), ".txt", str(tmp_path / "out.pdf")))
+    assert converting.metrics[".txt"].timeouts == 1
@@ -0,0 +1,37 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from src.modules.converting.images import image_to_pdf
+from src.modules.documents.workers import MuPDFError, WorkerCrashedError, WorkerPool
+
+
+def test_returns_result():
+    assert asyncio.run(WorkerPool(1).run(divmod, 7, 2)) == (3, 1)
+
+
+def test_passes_mupdf_errors(tmp_path):
+    (tmp_path / "in.png").write_bytes(b"\x89PNG\r\n\x1a\nbroken")
+
+    with pytest.raises(MuPDFError):
+        asyncio.run(WorkerPool(1).run(image_to_pdf, str(tmp_path / "in.png"), str(tmp_path / "out.pdf")))
+
+
+def test_kills_worker_after_deadline():
+    t1 = time.monotonic()
+    with pytest.raises(TimeoutError):
+        asyncio.run(WorkerPool(1).run(time.sleep, 10, timeout=0.2))
+    assert time.monotonic() - t1 < 5
+
+
+def test_survives_crashed_worker():
+    pool = WorkerPool(1)
+
+    async def main():
+        with pytest.raises(WorkerCrashedError):
+            await pool.run(os._exit, 1)
+        return await pool.run(divmod, 7, 2)
+
+    assert asyncio.run(main()) == (3, 1)